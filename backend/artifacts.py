@@ -0,0 +1,216 @@
+# backend/artifacts.py
+"""
+Kho CV đã xử lý (chunk + embedding), khóa theo sha256 của file PDF.
+1 CV thường được chấm với nhiều JD trong thư viện: lần sau chỉ cần embed các dòng JD,
+bỏ qua pdfplumber + text splitter + MiniLM cho toàn bộ CV.
+Giống AnalysisCache: RAM (LRU) + database, lỗi DB chỉ log ra, không làm hỏng request phân tích.
+Kho dùng chung giữa các user nhưng cv_hash chỉ dùng lại được bởi user đã upload file đó
+(bảng CvArtifactOwner, xem add_owners / get_for_user).
+"""
+import os
+import uuid
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import delete
+from sqlmodel import Session, select, func
+
+from cache import LRUCache
+from core_logic import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_ID, get_embeddings, load_cv_splits
+from database import engine
+from models import CvArtifact, CvArtifactOwner
+
+CV_ARTIFACT_CACHE_SIZE = int(os.getenv("CV_ARTIFACT_CACHE_SIZE", "64"))                    # Số CV giữ trong RAM
+CV_ARTIFACT_MAX_BYTES = int(os.getenv("CV_ARTIFACT_MAX_BYTES", str(200 * 1024 * 1024)))   # Tổng dung lượng trong DB
+# float16 đủ cho vector đã chuẩn hóa (sai số cosine ~1e-3) và chỉ tốn 1/2 dung lượng
+CV_ARTIFACT_DTYPE = os.getenv("CV_ARTIFACT_DTYPE", "float16")
+
+
+def artifact_fingerprint() -> str:
+    raw = repr((EMBEDDING_ID, CHUNK_SIZE, CHUNK_OVERLAP))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CvArtifactData:
+    hash: str
+    filename: str
+    splits: List[Any]  # List[Document]
+    matrix: np.ndarray  # float32, (n_chunks, dim)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "cv_hash": self.hash,
+            "filename": self.filename,
+            "chunks": len(self.splits),
+            "dim": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+        }
+
+
+class CvArtifactStore:
+    def __init__(self, maxsize: int, max_bytes: int, dtype: str):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.fingerprint = artifact_fingerprint()
+        self.memory = LRUCache(maxsize=maxsize)
+        # user_id -> frozenset cv_hash đã xác nhận sở hữu, khỏi hỏi DB mỗi request
+        self.owners = LRUCache(maxsize=1024)
+        self.db_hits = 0
+        self.db_misses = 0
+
+    def get(self, cv_hash: str) -> Optional[CvArtifactData]:
+        artifact = self.memory.get(cv_hash)
+        if artifact is not None:
+            return artifact
+
+        try:
+            with Session(engine) as session:
+                row = session.get(CvArtifact, cv_hash)
+                if row is None or row.fingerprint != self.fingerprint:
+                    self.db_misses += 1
+                    return None
+                row.last_used_at = datetime.now()
+                session.add(row)
+                session.commit()
+                artifact = self._from_row(row)
+        except Exception as e:
+            print(f" [ARTIFACT] DB lookup warning: {e}")
+            return None
+
+        self.db_hits += 1
+        self.memory.set(cv_hash, artifact)
+        return artifact
+
+    def exists(self, cv_hash: str) -> bool:
+        return self.get(cv_hash) is not None
+
+    # --- Quyền dùng cv_hash theo user ---
+    def add_owners(self, user_id: uuid.UUID, cv_hashes: Iterable[str]):
+        """Ghi nhận user vừa upload các file này (gọi mỗi lần nhận được file PDF từ user)."""
+        known = self.owners.get(user_id) or frozenset()
+        new = set(cv_hashes) - known
+        if not new:
+            return
+        try:
+            with Session(engine) as session:
+                existing = set(session.exec(
+                    select(CvArtifactOwner.hash).where(CvArtifactOwner.user_id == user_id, CvArtifactOwner.hash.in_(new))
+                ).all())
+                session.add_all(CvArtifactOwner(hash=cv_hash, user_id=user_id) for cv_hash in new - existing)
+                session.commit()
+        except Exception as e:
+            # 2 request cùng user upload cùng file đua nhau (trùng khóa) cũng rơi vào đây: dòng đã có, không sao
+            print(f" [ARTIFACT] Owner write warning: {e}")
+        self.owners.set(user_id, known | new)
+
+    def is_owner(self, user_id: uuid.UUID, cv_hash: str) -> bool:
+        known = self.owners.get(user_id) or frozenset()
+        if cv_hash in known:
+            return True
+        try:
+            with Session(engine) as session:
+                found = session.get(CvArtifactOwner, (cv_hash, user_id)) is not None
+        except Exception as e:
+            print(f" [ARTIFACT] Owner lookup warning: {e}")
+            return False
+        if found:
+            self.owners.set(user_id, known | {cv_hash})
+        return found
+
+    def get_for_user(self, user_id: uuid.UUID, cv_hash: str) -> Optional[CvArtifactData]:
+        """Như get nhưng None nếu user chưa từng upload CV này (endpoint trả 404, không lộ CV của người khác)."""
+        if not self.is_owner(user_id, cv_hash):
+            return None
+        return self.get(cv_hash)
+
+    def forget_users(self, user_ids: Iterable[uuid.UUID]):
+        for user_id in user_ids:
+            self.owners.pop(user_id)
+
+    def put(self, cv_hash: str, filename: str, splits: Sequence[Any], matrix: Any) -> CvArtifactData:
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(len(splits), -1)
+        artifact = CvArtifactData(hash=cv_hash, filename=filename, splits=list(splits), matrix=matrix)
+        self.memory.set(cv_hash, artifact)
+
+        blob = np.ascontiguousarray(matrix.astype(self.dtype)).tobytes()
+        chunks = [{"text": d.page_content, "metadata": dict(d.metadata or {})} for d in splits]
+        size = len(blob) + sum(len(c["text"]) for c in chunks)
+        try:
+            with Session(engine) as session:
+                session.merge(CvArtifact(
+                    hash=cv_hash,
+                    fingerprint=self.fingerprint,
+                    filename=filename,
+                    chunks=chunks,
+                    embeddings=blob,
+                    dtype=self.dtype.name,
+                    dim=int(matrix.shape[1]),
+                    size_bytes=size,
+                ))
+                session.commit()
+                self._evict_db(session)
+        except Exception as e:
+            print(f" [ARTIFACT] DB write warning: {e}")
+        return artifact
+
+    def get_or_build(self, cv_hash: str, file_bytes: Optional[bytes], filename: str = "upload.pdf") -> Optional[CvArtifactData]:
+        """Lấy từ kho, chưa có thì parse + embed rồi lưu. None nếu không có trong kho và không có file. Raise IngestError."""
+        artifact = self.get(cv_hash)
+        if artifact is not None or file_bytes is None:
+            return artifact
+        splits = load_cv_splits(file_bytes, source=filename)
+        vectors = get_embeddings().embed_documents([d.page_content for d in splits])
+        return self.put(cv_hash, filename, splits, vectors)
+
+    def _from_row(self, row: CvArtifact) -> CvArtifactData:
+        from langchain_core.documents import Document
+
+        splits = [Document(page_content=c["text"], metadata=c.get("metadata") or {}) for c in row.chunks]
+        matrix = np.frombuffer(row.embeddings, dtype=np.dtype(row.dtype)).astype(np.float32)
+        return CvArtifactData(
+            hash=row.hash,
+            filename=row.filename,
+            splits=splits,
+            matrix=matrix.reshape(len(splits), row.dim),
+        )
+
+    def _evict_db(self, session: Session):
+        # Vượt tổng dung lượng -> xóa CV lâu không dùng nhất cho tới khi xuống dưới giới hạn
+        total = session.exec(select(func.coalesce(func.sum(CvArtifact.size_bytes), 0))).one()
+        if total <= self.max_bytes:
+            return
+        rows = session.exec(
+            select(CvArtifact.hash, CvArtifact.size_bytes).order_by(CvArtifact.last_used_at)
+        ).all()
+        evicted: List[str] = []
+        for cv_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append(cv_hash)
+            self.memory.pop(cv_hash)
+            total -= size
+        # DELETE theo khóa, không load blob embedding của các dòng bị xóa
+        session.execute(delete(CvArtifact).where(CvArtifact.hash.in_(evicted)))
+        session.execute(delete(CvArtifactOwner).where(CvArtifactOwner.hash.in_(evicted)))
+        session.commit()
+        print(f" [ARTIFACT] Evicted {len(evicted)} CV artifacts (now {total} bytes)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "owners": self.owners.stats(),
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "dtype": self.dtype.name,
+            "max_bytes": self.max_bytes,
+        }
+
+
+cv_artifact_store = CvArtifactStore(
+    maxsize=CV_ARTIFACT_CACHE_SIZE,
+    max_bytes=CV_ARTIFACT_MAX_BYTES,
+    dtype=CV_ARTIFACT_DTYPE,
+)
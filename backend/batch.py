@@ -0,0 +1,201 @@
+# backend/batch.py
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from core_logic import (
+    LOCAL_SCORING,
+    RETRIEVAL_MODE,
+    RETRIEVER_K,
+    build_cv_context,
+    ainvoke_with_backoff,
+    build_llm_chain,
+    finalize_llm_output,
+    get_embeddings,
+    load_cv_splits,
+    merge_local_scores,
+    message_text,
+)
+from scoring import parse_jd_requirements, score_requirements
+from cache import analysis_cache, hash_bytes, make_cache_key_for_hash
+from artifacts import cv_artifact_store
+from llm_scheduler import llm_scheduler
+
+# Cấu hình batch (chỉnh qua biến môi trường)
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_PARSE_WORKERS = int(os.getenv("BATCH_PARSE_WORKERS", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+_parse_pool = ThreadPoolExecutor(max_workers=BATCH_PARSE_WORKERS, thread_name_prefix="batch-parse")
+
+
+def _score_of(result: Dict[str, Any]) -> int:
+    try:
+        return int(result.get("matching_score", {}).get("percentage", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+async def run_batch_analysis(
+    files: List[Tuple[str, bytes]],
+    jd_text: str,
+    llm_concurrency: Optional[int] = None,
+    user_id: Any = "batch",
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Chấm N CV với cùng 1 JD, yield từng event ngay khi có kết quả:
+      {"type": "result", "index", "filename", "cached", "result"}
+      {"type": "error", "index", "filename", "error"}
+      {"type": "summary", "ranking": [...], ...}   <- luôn là event cuối cùng
+    Các bước:
+      1. CV đã có trong cache -> trả ngay.
+      2. CV đã có trong kho artifact -> dùng lại chunk + embedding; parse các PDF còn lại song song trên thread pool.
+      3. Embed toàn bộ chunk của các CV mới trong 1 lần embed_documents + embed JD đúng 1 lần.
+      4. Gọi Gemini song song nhưng giới hạn bởi semaphore, xếp hàng trong llm_scheduler dưới tên user_id
+         (RPM/TPM chung của server, 1 batch lớn không chiếm hết lượt của user khác).
+    """
+    from retriever import NumpyRetriever
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    results: Dict[int, Dict[str, Any]] = {}
+    failed: Dict[int, str] = {}
+
+    # 1. Cache
+    pending: List[Tuple[int, str, bytes, str, str]] = []
+    for index, (filename, data) in enumerate(files):
+        cv_hash = hash_bytes(data)
+        cache_key = make_cache_key_for_hash(cv_hash, jd_text)
+        cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached is not None:
+            results[index] = cached
+            yield {"type": "result", "index": index, "filename": filename, "cached": True, "result": cached}
+        else:
+            pending.append((index, filename, data, cache_key, cv_hash))
+
+    # 2. Kho artifact, rồi parse song song các CV mới
+    reused: Dict[int, Any] = {}
+    to_parse = []
+    for item in pending:
+        artifact = await asyncio.to_thread(cv_artifact_store.get, item[4])
+        if artifact is not None:
+            reused[item[0]] = artifact
+        else:
+            to_parse.append(item)
+    parsed = await asyncio.gather(
+        *(loop.run_in_executor(_parse_pool, load_cv_splits, data, filename) for _, filename, data, _, _ in to_parse),
+        return_exceptions=True,
+    )
+    fresh = []
+    for (index, filename, _, cache_key, cv_hash), splits in zip(to_parse, parsed):
+        if isinstance(splits, Exception):
+            failed[index] = str(splits) if isinstance(splits, ValueError) else f"Lỗi đọc PDF: {str(splits)}"
+            yield {"type": "error", "index": index, "filename": filename, "error": failed[index]}
+        else:
+            fresh.append((index, filename, cache_key, cv_hash, splits))
+
+    # 3. Embed 1 lần cho tất cả (chunk của mọi CV mới + các dòng JD cho local scoring / retrieval theo dòng)
+    requirements = parse_jd_requirements(jd_text) if (LOCAL_SCORING or RETRIEVAL_MODE == "multi") else []
+    ready = []
+    if fresh or reused:
+        embeddings = get_embeddings()
+        chunk_texts = [d.page_content for _, _, _, _, splits in fresh for d in splits]
+        all_texts = chunk_texts + [r.text for r in requirements]
+        try:
+            vectors, jd_vector = await loop.run_in_executor(
+                None,
+                lambda: (embeddings.embed_documents(all_texts), embeddings.embed_query(jd_text)),
+            )
+            line_vectors = vectors[len(chunk_texts):]
+            offset = 0
+            for index, filename, cache_key, cv_hash, splits in fresh:
+                cv_vectors = vectors[offset:offset + len(splits)]
+                offset += len(splits)
+                await asyncio.to_thread(cv_artifact_store.put, cv_hash, filename, splits, cv_vectors)
+                ready.append((index, filename, cache_key, splits, cv_vectors))
+            for index, filename, _, cache_key, _ in pending:
+                if index in reused:
+                    ready.append((index, filename, cache_key, reused[index].splits, reused[index].matrix))
+        except Exception as e:
+            for index, filename, _, _, _ in pending:
+                if index not in failed:
+                    failed[index] = f"Lỗi phân tích AI: {str(e)}"
+                    yield {"type": "error", "index": index, "filename": filename, "error": failed[index]}
+            ready = []
+
+    # 4. Fan-out LLM với giới hạn đồng thời
+    semaphore = asyncio.Semaphore(llm_concurrency or BATCH_LLM_CONCURRENCY)
+
+    def prepare(splits, cv_vectors):
+        # NumPy (retriever, scoring, chọn context) tốn CPU -> chạy trên thread, không chặn event loop
+        retriever = NumpyRetriever.from_documents(splits, embeddings, k=RETRIEVER_K, vectors=cv_vectors)
+        local_score = None
+        if LOCAL_SCORING:
+            local_score = score_requirements(
+                requirements, line_vectors, retriever.matrix, [d.page_content for d in splits]
+            )
+        cv_text = build_cv_context(retriever, jd_text, line_vectors, jd_vector=jd_vector, local_score=local_score)
+        return build_llm_chain(local_score), {"cv_text": cv_text, "jd_text": jd_text}, local_score
+
+    async def analyze_one(index, filename, cache_key, splits, cv_vectors):
+        # Mọi lỗi của 1 CV -> event "error" cho riêng CV đó, không làm hỏng cả stream NDJSON
+        try:
+            chain, chain_input, local_score = await asyncio.to_thread(prepare, splits, cv_vectors)
+            async with semaphore:
+                with llm_scheduler.request_scope(user_id):
+                    message = await ainvoke_with_backoff(chain, chain_input)
+                    # Sửa JSON + hỏi lại field thiếu là code sync (có thể gọi Gemini) -> chạy ngoài event loop
+                    result = await asyncio.to_thread(finalize_llm_output, message_text(message.content), chain_input, local_score)
+            result = merge_local_scores(result, local_score)
+            await asyncio.to_thread(analysis_cache.set, cache_key, result)
+        except Exception as e:
+            print(f" [BATCH] LỖI PHÂN TÍCH {filename}: {str(e)}")
+            return index, filename, {"error": f"Lỗi phân tích AI: {str(e)}"}
+        return index, filename, result
+
+    tasks = [
+        asyncio.ensure_future(analyze_one(index, filename, cache_key, splits, cv_vectors))
+        for index, filename, cache_key, splits, cv_vectors in ready
+    ]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, filename, result = await next_done
+            if "error" in result:
+                failed[index] = result["error"]
+                yield {"type": "error", "index": index, "filename": filename, "error": result["error"]}
+            else:
+                results[index] = result
+                yield {"type": "result", "index": index, "filename": filename, "cached": False, "result": result}
+    finally:
+        # Client ngắt kết nối giữa chừng -> hủy các lời gọi Gemini còn lại
+        for task in tasks:
+            task.cancel()
+
+    # 5. Tổng kết + xếp hạng
+    names = {i: name for i, (name, _) in enumerate(files)}
+    ranking = sorted(
+        (
+            {
+                "index": i,
+                "filename": names[i],
+                "name": r.get("personal_info", {}).get("name"),
+                "percentage": _score_of(r),
+            }
+            for i, r in results.items()
+        ),
+        key=lambda item: item["percentage"],
+        reverse=True,
+    )
+    for rank, item in enumerate(ranking, start=1):
+        item["rank"] = rank
+    yield {
+        "type": "summary",
+        "total": len(files),
+        "succeeded": len(results),
+        "failed": len(failed),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "ranking": ranking,
+    }
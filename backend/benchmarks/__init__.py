@@ -0,0 +1,5 @@
+# backend/benchmarks
+# Chạy từ thư mục backend/, ví dụ: python -m benchmarks.bench_retriever
+# - bench_analysis: analyze_cv_logic() với LLM/embedding giả (fakes.py) và CV PDF sinh sẵn (fixtures.py)
+# - load_test: uvicorn + SQLite, hỗn hợp analyze/list/patch
+# Kết quả JSON nằm ở benchmarks/results/, so sánh bằng: python -m benchmarks.report compare a.json b.json
@@ -0,0 +1,135 @@
+# backend/benchmarks/bench_analysis.py
+"""
+Benchmark analyze_cv_logic() offline: Gemini/MiniLM được thay bằng backend giả (fakes.py),
+CV là PDF sinh tại chỗ (fixtures.py), database là SQLite tạm -> kết quả lặp lại được giữa các máy.
+
+Đo theo từng cỡ CV: latency end-to-end (p50/p95), thời gian từng stage (histogram dss_stage_seconds
+của metrics.py), throughput với N thread song song, peak RSS của process.
+--mode cold: mỗi lượt 1 CV mới (parse + embed lại), warm: cùng 1 CV (lấy từ kho artifact).
+--quota-rpm giả lập quota 429 của Gemini; --rpm-limit / --tpm-limit / --llm-concurrency cấu hình llm_scheduler
+-> so sánh số lỗi 429 và thời gian chờ hàng đợi khi có / không có admission control.
+
+    cd backend
+    python -m benchmarks.bench_analysis --runs 20 --concurrency 4 --llm-latency 0.5
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+# Phải đặt trước khi import database (qua artifacts) để không đụng DB thật
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='dss_bench_'), 'bench.db')}")
+
+import metrics
+import models  # noqa: F401 - đăng ký bảng cho create_db_and_tables()
+from core_logic import analyze_cv_logic
+from database import create_db_and_tables
+from llm_scheduler import TokenBucket, llm_scheduler
+
+from benchmarks.fakes import install_fakes
+from benchmarks.fixtures import CV_SIZES, JD_FIXTURES, make_cv_pdf
+from benchmarks.report import peak_rss_mb, save_results, summarize
+
+
+def _stage_totals() -> Dict[str, Any]:
+    return {dict(key).get("stage"): value for key, value in metrics.STAGE_SECONDS.totals().items()}
+
+
+def _stage_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for stage, (total, count) in sorted(after.items()):
+        prev_total, prev_count = before.get(stage, (0.0, 0))
+        n = count - prev_count
+        if n:
+            out[stage] = {"count": n, "mean_ms": round((total - prev_total) / n * 1000, 3)}
+    return out
+
+
+def run_size(size: str, runs: int, concurrency: int, mode: str, stream: bool, seed_offset: int) -> Dict[str, Any]:
+    jds = list(JD_FIXTURES.values())
+    warm_pdf = make_cv_pdf(size, seed=seed_offset)
+    pdfs = [warm_pdf if mode == "warm" else make_cv_pdf(size, seed=seed_offset + i) for i in range(runs)]
+    if mode == "warm":
+        analyze_cv_logic(warm_pdf, jds[0])  # Nạp artifact trước, không tính vào kết quả
+
+    def one(i: int) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {}
+        started = time.perf_counter()
+        result = analyze_cv_logic(
+            pdfs[i], jds[i % len(jds)], source=f"bench_{size}.pdf", stats=stats,
+            on_partial=(lambda partial: None) if stream else None,
+        )
+        return {"seconds": time.perf_counter() - started, "error": result.get("error"), "stats": stats}
+
+    before = _stage_totals()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(runs)))
+    wall = time.perf_counter() - wall_started
+
+    errors = [o["error"] for o in outcomes if o["error"]]
+    first_chunk = [o["stats"]["llm"]["time_to_first_chunk"] for o in outcomes if o["stats"].get("llm")]
+    return {
+        "pages": CV_SIZES[size],
+        "runs": runs,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "latency": summarize([o["seconds"] for o in outcomes if not o["error"]]),
+        "time_to_first_chunk": summarize([t for t in first_chunk if t is not None]),
+        "stages": _stage_delta(before, _stage_totals()),
+        "throughput_per_s": round(runs / wall, 3) if wall else None,
+        "wall_s": round(wall, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark cho analyze_cv_logic")
+    parser.add_argument("--sizes", default=",".join(CV_SIZES), help="Cỡ CV, cách nhau bởi dấu phẩy")
+    parser.add_argument("--runs", type=int, default=10, help="Số lượt mỗi cỡ CV")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--mode", choices=("cold", "warm"), default="cold")
+    parser.add_argument("--stream", action="store_true", help="Đi đường stream (on_partial) như job queue")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Giây cho 1 lần gọi LLM giả")
+    parser.add_argument("--first-chunk-latency", type=float, default=0.3)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Giây cho mỗi text khi embed giả")
+    parser.add_argument("--quota-rpm", type=int, default=0, help="LLM giả trả 429 khi quá N request/phút (0 = tắt)")
+    parser.add_argument("--rpm-limit", type=int, help="Ghi đè LLM_RPM_LIMIT của llm_scheduler")
+    parser.add_argument("--tpm-limit", type=int, help="Ghi đè LLM_TPM_LIMIT của llm_scheduler")
+    parser.add_argument("--llm-concurrency", type=int, help="Ghi đè LLM_MAX_CONCURRENCY của llm_scheduler")
+    parser.add_argument("--out", help="File JSON kết quả (mặc định benchmarks/results/analysis-<time>.json)")
+    args = parser.parse_args()
+
+    fake_llm = install_fakes(args.llm_latency, args.first_chunk_latency, args.embed_latency, quota_rpm=args.quota_rpm)
+    if args.rpm_limit is not None:
+        llm_scheduler.rpm = TokenBucket(args.rpm_limit)
+    if args.tpm_limit is not None:
+        llm_scheduler.tpm = TokenBucket(args.tpm_limit)
+    if args.llm_concurrency is not None:
+        llm_scheduler.max_concurrency = args.llm_concurrency
+    create_db_and_tables()
+
+    sizes: List[str] = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    # seed khác nhau cho mỗi cỡ và mỗi lần chạy -> mode cold không bao giờ trúng kho artifact
+    seed_base = int(time.time()) % 100000 * 1000
+    for n, size in enumerate(sizes):
+        results[size] = run_size(size, args.runs, args.concurrency, args.mode, args.stream, seed_base + n * args.runs)
+        print(
+            f" [BENCH] {size}: p50 {results[size]['latency'].get('p50_ms')} ms, "
+            f"p95 {results[size]['latency'].get('p95_ms')} ms, {results[size]['throughput_per_s']}/s"
+        )
+
+    save_results("analysis", {
+        "config": vars(args),
+        "sizes": results,
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_queue_wait": {dict(key).get("outcome"): value for key, value in metrics.LLM_QUEUE_WAIT_SECONDS.totals().items()},
+        "upstream_quota_errors": fake_llm.quota_errors,
+        "peak_rss_mb": peak_rss_mb(),
+    }, out=args.out)
+
+
+if __name__ == "__main__":
+    main()
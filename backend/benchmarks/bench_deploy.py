@@ -0,0 +1,305 @@
+# backend/benchmarks/bench_deploy.py
+"""
+So sánh các chế độ triển khai trên cùng 1 máy: 1 process uvicorn (baseline, như CMD mặc định của Dockerfile)
+với gunicorn nhiều worker (WEB_CONCURRENCY, gunicorn.conf.py) và/hoặc CPU process pool (CPU_WORKERS, cpu_pool.py).
+
+Mỗi cấu hình là 1 server thật trong process con (Gemini giả qua benchmarks.fake_server, SQLite tạm riêng).
+N client song song upload CV mới (PDF sinh tại chỗ, không trúng cache / kho artifact) rồi poll job tới khi xong;
+đồng thời 1 client gọi GET /api/jds liên tục để xem request nhẹ bị chậm thế nào khi CPU bận.
+Đo: số phân tích xong / giây, latency analyze + /api/jds (p50/p95), mã lỗi, RSS và PSS của cả cây process
+(PSS chia đều page dùng chung giữa các process -> thấy được phần model dùng chung nhờ preload + copy-on-write).
+
+    cd backend
+    python -m benchmarks.bench_deploy --configs 1x0,4x0,1x4,2x2 --clients 8 --duration 30
+
+"WxC": W = WEB_CONCURRENCY (1 = uvicorn thẳng, >1 = gunicorn), C = CPU_WORKERS.
+--real-embeddings: dùng model embedding thật theo EMBEDDING_BACKEND (cần model trong cache HF_HOME)
+thay cho HashingEmbeddings -> đo được cả phần embedding mà cpu_pool tách ra.
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+from benchmarks.fixtures import JD_FIXTURES, make_cv_pdf
+from benchmarks.report import save_results, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CV_MIX = ["short", "medium", "medium", "long"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_configs(spec: str) -> List[Tuple[int, int]]:
+    configs = []
+    for part in spec.split(","):
+        web, _, cpu = part.strip().partition("x")
+        configs.append((int(web), int(cpu or 0)))
+    return configs
+
+
+# --- Bộ nhớ cả cây process (Linux /proc) ---
+def _children(pid: int) -> List[int]:
+    out = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                out.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return out
+
+
+def tree_memory_mb(root: int) -> Dict[str, Any]:
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(_children(pid))
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return {"processes": len(pids), "rss_mb": round(rss / 1024, 1), "pss_mb": round(pss / 1024, 1)}
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 1.0):
+        super().__init__(name="memory-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak: Dict[str, Any] = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            sample = tree_memory_mb(self.pid)
+            if sample["pss_mb"] >= self.peak.get("pss_mb", 0):
+                self.peak = sample
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# --- Server ---
+def start_server(web: int, cpu: int, port: int, workdir: str, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'deploy.db')}",
+        "TEMP_DIR": os.path.join(workdir, "temp_uploads"),
+        "WEB_CONCURRENCY": str(web),
+        "CPU_WORKERS": str(cpu),
+        "RETENTION_INTERVAL": "0",
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_FAKE_EMBEDDINGS": "0" if args.real_embeddings else "1",
+    }
+    if web > 1:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+               "--log-level", "warning", "benchmarks.fake_server:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "benchmarks.fake_server:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def wait_ready(base: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{base}/", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def stop_server(proc: subprocess.Popen):
+    # start_new_session -> gửi tín hiệu cho cả nhóm (master gunicorn, worker, process con của cpu_pool)
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+# --- Tải ---
+class Client:
+    _seeds = itertools.count(10_000)
+
+    def __init__(self, base: str, poll_interval: float):
+        self.base = base
+        self.http = requests.Session()
+        self.http.headers["x-session-id"] = str(uuid.uuid4())
+        self.poll_interval = poll_interval
+
+    def analyze(self) -> str:
+        # CV mới mỗi lần: luôn phải parse + embed (không trúng cache kết quả hay kho artifact)
+        pdf = make_cv_pdf(random.choice(CV_MIX), seed=next(self._seeds))
+        r = self.http.post(
+            f"{self.base}/api/analyze",
+            files={"file": ("cv.pdf", pdf, "application/pdf")},
+            data={"jd_text": random.choice(list(JD_FIXTURES.values()))},
+        )
+        if r.status_code == 429:
+            time.sleep(float(r.headers.get("Retry-After", "1")))
+            return "429"
+        r.raise_for_status()
+        job = r.json()
+        while job["status"] not in ("done", "error"):
+            time.sleep(self.poll_interval)
+            job = self.poll(job["job_id"])
+        return job["status"]
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        # Kết nối mới mỗi lần poll (không dùng keep-alive của self.http): với nhiều worker gunicorn, poll rơi vào
+        # worker bất kỳ như sau load balancer thật -> đo luôn đường đọc job từ DB của worker không chạy job
+        r = requests.get(
+            f"{self.base}/api/analyze/{job_id}",
+            headers={"x-session-id": self.http.headers["x-session-id"], "Connection": "close"},
+        )
+        r.raise_for_status()
+        return r.json()
+
+
+def run_load(base: str, args) -> Dict[str, Any]:
+    for _ in range(args.warmup):
+        Client(base, args.poll_interval).analyze()  # Nạp model / pool / worker trước khi đo
+
+    clients = [Client(base, args.poll_interval) for _ in range(args.clients)]
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    light: List[float] = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def analyze_loop(client: Client):
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                outcome = client.analyze()
+            except Exception as e:
+                outcome = f"exception:{type(e).__name__}"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "done":
+                    latencies.append(time.perf_counter() - started)
+
+    def light_loop():
+        http = requests.Session()
+        http.headers["x-session-id"] = str(uuid.uuid4())
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            if http.get(f"{base}/api/jds", params={"limit": 20, "fields": "summary"}).ok:
+                light.append(time.perf_counter() - started)
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=analyze_loop, args=(c,), name=f"client-{i}") for i, c in enumerate(clients)]
+    threads.append(threading.Thread(target=light_loop, name="light"))
+    wall_started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_started
+    return {
+        "analyses_done": len(latencies),
+        "analyses_per_s": round(len(latencies) / wall, 3),
+        "analyze": summarize(latencies),
+        "light_get_jds": summarize(light),
+        "outcomes": dict(outcomes),
+        "wall_s": round(wall, 3),
+    }
+
+
+def run_config(web: int, cpu: int, args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="dss_deploy_")
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = start_server(web, cpu, port, workdir, args)
+    try:
+        wait_ready(base, proc, args.startup_timeout)
+        idle = tree_memory_mb(proc.pid)
+        sampler = MemorySampler(proc.pid)
+        sampler.start()
+        result = run_load(base, args)
+        sampler.stop()
+        result["memory"] = {"idle": idle, "peak": sampler.peak}
+        # Stats của 1 worker bất kỳ (mỗi worker gunicorn có job queue / pool riêng)
+        result["server_sample"] = requests.get(f"{base}/api/jobs/stats", timeout=5).json()
+        return result
+    except Exception as e:
+        with open(os.path.join(workdir, "server.log")) as f:
+            tail = f.read()[-2000:]
+        print(f" [BENCH] {web}x{cpu} failed: {e}\n{tail}")
+        return {"error": str(e)}
+    finally:
+        stop_server(proc)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark 1 process vs nhiều process (gunicorn / CPU pool)")
+    parser.add_argument("--configs", default=f"1x0,{cpus}x0,1x{cpus}", help="Danh sách WEB_CONCURRENCYxCPU_WORKERS")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Giây đo cho mỗi cấu hình")
+    parser.add_argument("--warmup", type=int, default=4, help="Số lượt analyze chạy trước khi đo")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--real-embeddings", action="store_true")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--out", help="File JSON kết quả (mặc định benchmarks/results/deploy-<time>.json)")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    baseline = None
+    for web, cpu in parse_configs(args.configs):
+        name = f"{web}x{cpu}"
+        print(f" [BENCH] {name}: WEB_CONCURRENCY={web}, CPU_WORKERS={cpu} ...")
+        r = results[name] = run_config(web, cpu, args)
+        if "error" in r:
+            continue
+        baseline = baseline or r["analyses_per_s"]
+        r["speedup"] = round(r["analyses_per_s"] / baseline, 2) if baseline else None
+        print(
+            f" [BENCH] {name}: {r['analyses_per_s']} analyses/s (x{r['speedup']}), analyze p50 {r['analyze'].get('p50_ms')} ms "
+            f"p95 {r['analyze'].get('p95_ms')} ms, GET /api/jds p95 {r['light_get_jds'].get('p95_ms')} ms, "
+            f"PSS peak {r['memory']['peak'].get('pss_mb')} MB ({r['memory']['peak'].get('processes')} processes), {r['outcomes']}"
+        )
+
+    save_results("deploy", {"config": vars(args), "results": results}, out=args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# backend/benchmarks/bench_embeddings.py
+"""
+So sánh các backend embedding (embedding_backends.py: hf / onnx / onnx-int8) trên chunk của CV mẫu
+(fixtures.py) + các dòng JD mẫu:
+- throughput embed_documents (text/giây) và latency embed_query (1 dòng JD),
+- thời gian nạp model, RSS sau khi nạp và peak RSS,
+- độ khớp với backend tham chiếu (mặc định hf): cosine từng vector và tỉ lệ trùng top-k chunk cho mỗi dòng JD.
+
+Mỗi backend chạy trong 1 process con riêng để RSS không bị cộng dồn (PyTorch + ONNX Runtime cùng process).
+
+    cd backend
+    python -m benchmarks.bench_embeddings --backends hf,onnx,onnx-int8 --batch-size 32 --threads 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.report import peak_rss_mb, save_results, summarize
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except OSError:
+        return peak_rss_mb()  # Không phải Linux: chỉ có peak
+
+
+def fixture_texts(cvs_per_size: int) -> Dict[str, List[str]]:
+    from core_logic import load_cv_splits
+    from scoring import parse_jd_requirements
+
+    from benchmarks.fixtures import CV_SIZES, JD_FIXTURES, make_cv_pdf
+
+    chunks = [
+        d.page_content
+        for size in CV_SIZES
+        for seed in range(cvs_per_size)
+        for d in load_cv_splits(make_cv_pdf(size, seed=seed), source=f"{size}-{seed}.pdf")
+    ]
+    queries = [r.text for jd in JD_FIXTURES.values() for r in parse_jd_requirements(jd)]
+    return {"chunks": chunks, "queries": queries}
+
+
+def run_worker(args):
+    """Process con: nạp 1 backend, embed toàn bộ text, ghi <prefix>.npy (chunk + query) và <prefix>.json."""
+    from embedding_backends import load_embeddings
+
+    with open(args.texts, encoding="utf-8") as f:
+        texts = json.load(f)
+    baseline_rss = _current_rss_mb()
+    started = time.perf_counter()
+    model = load_embeddings(MODEL_NAME, backend=args.worker, batch_size=args.batch_size, threads=args.threads)
+    model.embed_query("warm up")
+    load_seconds = time.perf_counter() - started
+    loaded_rss = _current_rss_mb()
+
+    chunks, queries = texts["chunks"], texts["queries"]
+    runs = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        vectors = model.embed_documents(chunks)
+        runs.append(time.perf_counter() - t0)
+    query_latency = []
+    query_vectors = []
+    for q in queries:
+        t0 = time.perf_counter()
+        query_vectors.append(model.embed_query(q))
+        query_latency.append(time.perf_counter() - t0)
+
+    np.save(args.worker_out + ".npy", np.asarray(vectors + query_vectors, dtype=np.float32))
+    best = min(runs)
+    model_path = getattr(model, "model_path", None)
+    with open(args.worker_out + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "load_s": round(load_seconds, 3),
+            "documents_per_s": round(len(chunks) / best, 1) if best else None,
+            "embed_documents": summarize(runs),
+            "embed_query": summarize(query_latency),
+            "model_mb": round(os.path.getsize(model_path) / (1024 * 1024), 1) if model_path else None,
+            "rss_baseline_mb": baseline_rss,
+            "rss_loaded_mb": loaded_rss,
+            "peak_rss_mb": peak_rss_mb(),
+        }, f)
+
+
+def agreement(reference: np.ndarray, candidate: np.ndarray, n_chunks: int, k: int) -> Dict[str, Any]:
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    # Điều thực sự quan trọng cho retrieval/scoring: mỗi dòng JD có lấy về cùng các chunk không
+    ref_top = np.argsort(-(reference[n_chunks:] @ reference[:n_chunks].T), axis=1)[:, :k]
+    cand_top = np.argsort(-(candidate[n_chunks:] @ candidate[:n_chunks].T), axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+    return {
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "cosine_min": round(float(cosine.min()), 6),
+        "cosine_p5": round(float(np.percentile(cosine, 5)), 6),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 4) if overlap else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các backend embedding")
+    parser.add_argument("--backends", default="hf,onnx,onnx-int8")
+    parser.add_argument("--reference", default="hf", help="Backend làm chuẩn khi tính cosine")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="0 = để thư viện tự chọn")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần embed toàn bộ chunk (lấy lần nhanh nhất)")
+    parser.add_argument("--cvs-per-size", type=int, default=3, help="Số CV mẫu mỗi cỡ (short/medium/long)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--out", help="File JSON kết quả (mặc định benchmarks/results/embeddings-<time>.json)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return run_worker(args)
+
+    texts = fixture_texts(args.cvs_per_size)
+    n_chunks = len(texts["chunks"])
+    print(f" [BENCH] {n_chunks} CV chunks, {len(texts['queries'])} JD lines")
+    workdir = tempfile.mkdtemp(prefix="dss_embed_")
+    texts_path = os.path.join(workdir, "texts.json")
+    with open(texts_path, "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False)
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    results: Dict[str, Dict[str, Any]] = {}
+    vectors: Dict[str, np.ndarray] = {}
+    for backend in backends:
+        prefix = os.path.join(workdir, backend)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embeddings", "--worker", backend, "--texts", texts_path,
+             "--worker-out", prefix, "--batch-size", str(args.batch_size), "--threads", str(args.threads),
+             "--repeat", str(args.repeat)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+            results[backend] = {"error": error}
+            print(f" [BENCH] {backend}: FAILED ({error})")
+            continue
+        with open(prefix + ".json", encoding="utf-8") as f:
+            results[backend] = json.load(f)
+        vectors[backend] = np.load(prefix + ".npy")
+        r = results[backend]
+        print(
+            f" [BENCH] {backend}: {r['documents_per_s']} docs/s, query p50 {r['embed_query'].get('p50_ms')} ms, "
+            f"load {r['load_s']}s, RSS {r['rss_loaded_mb']} MB (peak {r['peak_rss_mb']} MB)"
+        )
+
+    if args.reference in vectors:
+        for backend, matrix in vectors.items():
+            results[backend]["agreement"] = agreement(vectors[args.reference], matrix, n_chunks, args.top_k)
+            print(f" [BENCH] {backend} vs {args.reference}: {results[backend]['agreement']}")
+    else:
+        print(f" [BENCH] Reference backend {args.reference!r} unavailable, skipping agreement")
+
+    save_results("embeddings", {
+        "config": {k: v for k, v in vars(args).items() if k not in ("worker", "texts", "worker_out")},
+        "texts": {"chunks": n_chunks, "queries": len(texts["queries"])},
+        "backends": results,
+    }, out=args.out)
+
+
+if __name__ == "__main__":
+    main()
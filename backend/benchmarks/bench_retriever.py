@@ -0,0 +1,140 @@
+# backend/benchmarks/bench_retriever.py
+"""
+So sánh retriever NumPy in-process với đường Chroma cũ (tạo collection -> query top-k -> xóa collection).
+
+Embedding của chunk và query được tính sẵn 1 lần rồi phát lại, để benchmark chỉ đo chi phí
+dựng index + truy vấn + dọn dẹp, không bị nhiễu bởi thời gian chạy MiniLM.
+
+    cd backend
+    python -m benchmarks.bench_retriever --chunks 8 --repeat 50
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from core_logic import RETRIEVER_K, get_embeddings
+from retriever import NumpyRetriever
+
+SAMPLE_LINES = [
+    "Backend Developer with 3 years of experience building REST APIs in Python and FastAPI.",
+    "Designed PostgreSQL schemas, wrote complex SQL queries and tuned indexes for reporting.",
+    "Deployed services with Docker and GitHub Actions to AWS ECS, monitored with Grafana.",
+    "Built RAG pipelines using LangChain, sentence-transformers and Google Gemini.",
+    "Led a team of 4 engineers, ran code reviews and sprint planning in Agile/Scrum.",
+    "Bachelor of Computer Science, University of Information Technology (VNU-HCM).",
+    "Kỹ năng giao tiếp tốt, làm việc nhóm, tiếng Anh giao tiếp (IELTS 7.0).",
+    "Implemented Redis caching and Celery background jobs to cut API latency by 40%.",
+]
+JD_TEXT = "\n".join([
+    "3+ years of Python backend development",
+    "Experience with PostgreSQL and query optimization",
+    "Familiar with Docker, CI/CD",
+    "Nice to have: LLM / RAG experience",
+])
+
+
+class ReplayEmbeddings(Embeddings):
+    """Trả lại vector đã tính sẵn theo nội dung text (không tính lại model)."""
+
+    def __init__(self, table: Dict[str, List[float]]):
+        self.table = table
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.table[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.table[text]
+
+
+def make_docs(n_chunks: int) -> List[Document]:
+    docs = []
+    for i in range(n_chunks):
+        body = " ".join(SAMPLE_LINES[(i + j) % len(SAMPLE_LINES)] for j in range(6))
+        docs.append(Document(page_content=f"[chunk {i}] {body}", metadata={"page": i // 3}))
+    return docs
+
+
+def run_numpy(docs, embeddings) -> float:
+    start = time.perf_counter()
+    retriever = NumpyRetriever.from_documents(docs, embeddings, k=RETRIEVER_K)
+    retriever.invoke(JD_TEXT)
+    return time.perf_counter() - start
+
+
+def run_chroma(docs, embeddings, run_id: int) -> float:
+    from langchain_chroma import Chroma
+
+    start = time.perf_counter()
+    vectorstore = Chroma.from_documents(
+        documents=docs,
+        embedding=embeddings,
+        collection_name=f"bench_{run_id}",
+    )
+    vectorstore.as_retriever(search_kwargs={"k": RETRIEVER_K}).invoke(JD_TEXT)
+    vectorstore.delete_collection()
+    return time.perf_counter() - start
+
+
+def chroma_top_k(docs, embeddings) -> List[str]:
+    from langchain_chroma import Chroma
+
+    vectorstore = Chroma.from_documents(documents=docs, embedding=embeddings, collection_name="bench_check")
+    try:
+        return [d.page_content for d in vectorstore.similarity_search(JD_TEXT, k=RETRIEVER_K)]
+    finally:
+        vectorstore.delete_collection()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    docs = make_docs(args.chunks)
+    texts = [d.page_content for d in docs]
+    model = get_embeddings()
+    vectors = model.embed_documents(texts)
+    table = dict(zip(texts, vectors))
+    table[JD_TEXT] = model.embed_query(JD_TEXT)
+    embeddings = ReplayEmbeddings(table)
+
+    # Khởi động 1 lần để không tính chi phí import/khởi tạo client vào kết quả
+    run_numpy(docs, embeddings)
+    run_chroma(docs, embeddings, run_id=-1)
+
+    numpy_samples = [run_numpy(docs, embeddings) for _ in range(args.repeat)]
+    chroma_samples = [run_chroma(docs, embeddings, run_id=i) for i in range(args.repeat)]
+
+    # Kiểm tra 2 đường trả về cùng top-k
+    chroma_top = chroma_top_k(docs, embeddings)
+    numpy_top = [d.page_content for d in NumpyRetriever.from_documents(docs, embeddings, k=RETRIEVER_K).invoke(JD_TEXT)]
+
+    numpy_stats = summarize(numpy_samples)
+    chroma_stats = summarize(chroma_samples)
+    print(json.dumps({
+        "chunks": args.chunks,
+        "repeat": args.repeat,
+        "numpy": numpy_stats,
+        "chroma": chroma_stats,
+        "speedup_p50": round(chroma_stats["p50_ms"] / max(numpy_stats["p50_ms"], 1e-9), 1),
+        "same_top_k": numpy_top == chroma_top,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# backend/benchmarks/fake_server.py
+"""
+server.py với Gemini giả (fakes.py) để chạy bằng uvicorn / gunicorn thật trong process riêng (bench_deploy.py):
+    uvicorn benchmarks.fake_server:app
+    gunicorn -c gunicorn.conf.py benchmarks.fake_server:app
+Cấu hình qua biến môi trường: BENCH_LLM_LATENCY, BENCH_FIRST_CHUNK_LATENCY,
+BENCH_FAKE_EMBEDDINGS=0 để dùng model embedding thật (EMBEDDING_BACKEND, CPU_WORKERS như production).
+"""
+import os
+
+from benchmarks.fakes import install_fakes
+
+install_fakes(
+    llm_latency=float(os.getenv("BENCH_LLM_LATENCY", "0.5")),
+    first_chunk_latency=float(os.getenv("BENCH_FIRST_CHUNK_LATENCY", "0.2")),
+    embeddings=os.getenv("BENCH_FAKE_EMBEDDINGS", "1") == "1",
+)
+
+from server import app  # noqa: E402
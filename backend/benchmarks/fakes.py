@@ -0,0 +1,183 @@
+# backend/benchmarks/fakes.py
+"""
+Backend giả, chạy offline và cho kết quả lặp lại được, thay cho Gemini và MiniLM khi benchmark:
+- FakeChatModel: trả về 1 JSON JobMatchResult soạn sẵn, có độ trễ cấu hình được (cả khi stream).
+- HashingEmbeddings: "hashing trick" trên từ -> vector 384 chiều đã chuẩn hóa, không cần tải model.
+- quota_rpm: FakeChatModel trả lỗi 429 (FakeQuotaError) khi bị gọi quá N lần/phút, giống quota của Gemini,
+  để thử llm_scheduler mà không cần API key.
+
+install_fakes() gán thẳng vào singleton của core_logic, nên get_llm()/get_embeddings() ở mọi module
+(core_logic, batch, artifacts, jd_index) đều dùng bản giả.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import threading
+from collections import deque
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+import core_logic
+from context_builder import estimate_tokens
+
+# Trục radar lấy thẳng từ mẫu JSON trong prompt -> đổi trục ở core_logic thì bản giả đổi theo
+RADAR_AXES = re.findall(r'"([^"]+)": Integer', core_logic._JSON_SECTIONS["radar_chart"])
+_CANNED_SECTIONS = {
+    "personal_info": {"name": "Nguyen Van A", "position": "Backend Developer", "experience": "3 years"},
+    "matching_score": {"percentage": 72, "explanation": "Matched 5/7 requirements"},
+    "requirements_breakdown": {"must_have_ratio": "4/5", "nice_to_have_ratio": "1/2"},
+    "matched_keywords": ["Python", "FastAPI", "PostgreSQL", "Docker"],
+    "radar_chart": {axis: score for axis, score in zip(RADAR_AXES, (7, 7, 6, 8, 6))},
+    "radar_reasoning": {
+        axis: {"en": f"{axis} assessed from the CV.", "vi": f"Đánh giá {axis} dựa trên CV."} for axis in RADAR_AXES
+    },
+    "bilingual_content": {
+        "general_assessment": {"en": "Good fit for a backend role.", "vi": "Phù hợp với vị trí backend."},
+        "comparison_table": [
+            {"jd_requirement": "3+ years of Python", "cv_evidence": "3 years building FastAPI services", "status": "Matched"},
+            {"jd_requirement": "Kubernetes in production", "cv_evidence": "Not found", "status": "Not Matched"},
+        ],
+        "strengths": {"en": ["REST APIs", "SQL tuning"], "vi": ["REST API", "Tối ưu SQL"]},
+        "weaknesses_missing_skills": {"en": ["Kubernetes"], "vi": ["Kubernetes"]},
+        "interview_questions": {
+            "en": ["How do you design database indexes?"],
+            "vi": ["Bạn thiết kế index cho database như thế nào?"],
+        },
+    },
+}
+# Cùng thứ tự / tập field cấp 1 với mẫu JSON mà prompt yêu cầu Gemini trả về
+CANNED_RESULT = {name: _CANNED_SECTIONS[name] for name in core_logic._JSON_SECTIONS}
+CANNED_JSON = "```json\n" + json.dumps(CANNED_RESULT, ensure_ascii=False, indent=2) + "\n```"
+
+
+class FakeQuotaError(Exception):
+    """Giống lỗi 429 RESOURCE_EXHAUSTED của Gemini (is_transient_error nhận ra qua code)."""
+
+    code = 429
+
+
+class FakeChatModel(BaseChatModel):
+    """latency: tổng thời gian 1 lần gọi; first_chunk_latency: thời gian tới chunk đầu khi stream."""
+
+    response: str = CANNED_JSON
+    latency: float = 1.0
+    first_chunk_latency: float = 0.3
+    chunk_chars: int = 40
+    quota_rpm: int = 0  # 0 = không giới hạn
+    quota_errors: int = 0
+    _calls: deque = PrivateAttr(default_factory=deque)
+    _quota_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _check_quota(self):
+        if not self.quota_rpm:
+            return
+        now = time.monotonic()
+        with self._quota_lock:
+            while self._calls and now - self._calls[0] > 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.quota_rpm:
+                self.quota_errors += 1
+                raise FakeQuotaError(f"429 RESOURCE_EXHAUSTED: quota {self.quota_rpm} requests/minute exceeded")
+            self._calls.append(now)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-json-chat"
+
+    def _usage(self, messages: List[BaseMessage]) -> dict:
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(self.response)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._check_quota()
+        time.sleep(self.latency)
+        message = AIMessage(content=self.response, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._check_quota()
+        pieces = [self.response[i:i + self.chunk_chars] for i in range(0, len(self.response), self.chunk_chars)]
+        time.sleep(self.first_chunk_latency)
+        # Phần trễ còn lại chia đều giữa các chunk, giống tốc độ sinh token đều của Gemini
+        gap = max(self.latency - self.first_chunk_latency, 0.0) / max(len(pieces) - 1, 1)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(gap)
+            last = i == len(pieces) - 1
+            chunk = AIMessageChunk(content=piece, usage_metadata=self._usage(messages) if last else None)
+            if run_manager:
+                run_manager.on_llm_new_token(piece)
+            yield ChatGenerationChunk(message=chunk)
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """Mỗi từ (và cặp từ liền nhau) băm vào 1 chiều có dấu +-1; text chung từ -> cosine cao."""
+
+    def __init__(self, dim: int = 384, latency_per_text: float = 0.0):
+        self.dim = dim
+        self.latency_per_text = latency_per_text
+
+    def _bucket(self, token: str):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def _embed(self, text: str) -> List[float]:
+        words = _WORD_RE.findall(text.lower())
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            index, sign = self._bucket(token)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_per_text:
+            time.sleep(self.latency_per_text * len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def install_fakes(
+    llm_latency: float = 1.0,
+    first_chunk_latency: float = 0.3,
+    embed_latency_per_text: float = 0.0,
+    quota_rpm: int = 0,
+    embeddings: bool = True,
+) -> FakeChatModel:
+    """embeddings=False: giữ model embedding thật (theo EMBEDDING_BACKEND / CPU_WORKERS), chỉ thay Gemini."""
+    # analyze_cv_logic() kiểm tra key trước khi gọi get_llm(); LLM giả không dùng tới nó
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-benchmark-key")
+    core_logic._llm_instance = FakeChatModel(
+        latency=llm_latency, first_chunk_latency=min(first_chunk_latency, llm_latency), quota_rpm=quota_rpm
+    )
+    if embeddings:
+        core_logic._embedding_instance = HashingEmbeddings(latency_per_text=embed_latency_per_text)
+    return core_logic._llm_instance
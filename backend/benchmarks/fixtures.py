@@ -0,0 +1,161 @@
+# backend/benchmarks/fixtures.py
+"""
+CV PDF sinh tại chỗ (nhiều độ dài) + JD mẫu cho benchmark, không cần file nào trong repo.
+PDF được viết tay (font Helvetica chuẩn, chỉ ký tự ASCII) -> không thêm dependency như reportlab.
+
+Xuất ra đĩa để thử bằng tay:  python -m benchmarks.fixtures --out /tmp/cv_fixtures
+"""
+import argparse
+import os
+import random
+from typing import Dict, List
+
+# Số trang của từng cỡ CV
+CV_SIZES: Dict[str, int] = {"short": 1, "medium": 3, "long": 8}
+LINES_PER_PAGE = 40
+
+_SECTIONS = {
+    "SUMMARY": [
+        "Backend developer with {years} years of experience building REST APIs in Python.",
+        "Focused on data-heavy services, clean architecture and automated testing.",
+        "Comfortable owning features end to end, from schema design to monitoring.",
+    ],
+    "EXPERIENCE": [
+        "Built FastAPI and Django services handling {n}k requests per day.",
+        "Designed PostgreSQL schemas, wrote complex SQL queries and tuned indexes.",
+        "Introduced Redis caching and Celery background jobs, cutting latency by {p}%.",
+        "Deployed services with Docker and GitHub Actions to AWS ECS and Kubernetes.",
+        "Built RAG pipelines with LangChain, sentence-transformers and Google Gemini.",
+        "Led a team of {t} engineers, ran code reviews and sprint planning in Scrum.",
+        "Migrated a monolith to event-driven microservices using Kafka.",
+        "Wrote integration tests with pytest and raised coverage to {p}%.",
+        "Monitored production with Prometheus, Grafana and structured logging.",
+        "Worked with product owners to turn business requirements into user stories.",
+    ],
+    "EDUCATION": [
+        "Bachelor of Computer Science, University of Information Technology (VNU-HCM).",
+        "Coursework: databases, distributed systems, machine learning.",
+    ],
+    "SKILLS": [
+        "Python, FastAPI, Django, SQL, PostgreSQL, Redis, Docker, Kubernetes, AWS.",
+        "English: IELTS 7.0. Teamwork, communication, mentoring.",
+    ],
+}
+
+JD_FIXTURES: Dict[str, str] = {
+    "backend_python": "\n".join([
+        "3+ years of Python backend development",
+        "Experience with FastAPI or Django",
+        "Strong PostgreSQL and query optimization skills",
+        "Familiar with Docker, CI/CD",
+        "Nice to have: Kubernetes, AWS",
+        "Nice to have: LLM / RAG experience",
+    ]),
+    "data_engineer": "\n".join([
+        "Must have: 2+ years building data pipelines",
+        "Must have: SQL and Python",
+        "Experience with Kafka or other streaming platforms",
+        "Airflow or similar orchestration tools",
+        "Nice to have: Spark, dbt",
+    ]),
+    "frontend_react": "\n".join([
+        "3+ years of React and TypeScript",
+        "Experience with state management (Redux, Zustand)",
+        "Strong CSS and responsive design skills",
+        "Nice to have: Next.js, testing with Playwright",
+    ]),
+    "tech_lead_long": "\n".join([
+        "Yêu cầu: 5+ năm kinh nghiệm phát triển backend",
+        "Must have: Python hoặc Go",
+        "Must have: thiết kế hệ thống phân tán, microservices",
+        "Kinh nghiệm dẫn dắt nhóm 3-8 kỹ sư",
+        "Thành thạo PostgreSQL, Redis, message queue (Kafka/RabbitMQ)",
+        "Kinh nghiệm CI/CD, Docker, Kubernetes",
+        "Hiểu biết về observability: Prometheus, Grafana, tracing",
+        "Tiếng Anh giao tiếp tốt",
+        "Nice to have: AWS/GCP certification",
+        "Nice to have: kinh nghiệm với LLM, RAG",
+    ]),
+}
+
+
+def cv_lines(pages: int, seed: int = 0) -> List[str]:
+    """Nội dung CV ~LINES_PER_PAGE dòng mỗi trang; seed khác -> CV khác (hash khác, không trúng cache)."""
+    rng = random.Random(seed)
+    lines = [f"CANDIDATE {seed:05d}", f"Email: candidate{seed}@example.com", ""]
+    target = pages * LINES_PER_PAGE
+    while len(lines) < target:
+        for title, templates in _SECTIONS.items():
+            lines.append(title)
+            for template in rng.sample(templates, k=len(templates)):
+                lines.append("- " + template.format(
+                    years=rng.randint(1, 9), n=rng.randint(5, 500), p=rng.randint(10, 70), t=rng.randint(2, 8)
+                ))
+            lines.append("")
+    return lines[:target]
+
+
+def _pdf_escape(text: str) -> str:
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """PDF tối thiểu: mỗi trang 1 content stream, dòng cách nhau 18pt, font Helvetica 11pt."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # điền sau khi biết id của Pages
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 11 Tf", "18 TL", "50 800 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def make_cv_pdf(size: str = "medium", seed: int = 0) -> bytes:
+    pages = CV_SIZES[size]
+    lines = cv_lines(pages, seed)
+    return make_pdf([lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ghi CV PDF + JD mẫu ra thư mục")
+    parser.add_argument("--out", default="cv_fixtures")
+    parser.add_argument("--per-size", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for size in CV_SIZES:
+        for seed in range(args.per_size):
+            with open(os.path.join(args.out, f"cv_{size}_{seed}.pdf"), "wb") as f:
+                f.write(make_cv_pdf(size, seed))
+    for name, text in JD_FIXTURES.items():
+        with open(os.path.join(args.out, f"jd_{name}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+    print(f" [FIXTURES] Wrote {len(CV_SIZES) * args.per_size} CVs and {len(JD_FIXTURES)} JDs to {args.out}")
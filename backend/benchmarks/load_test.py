@@ -0,0 +1,203 @@
+# backend/benchmarks/load_test.py
+"""
+Load test server.py trên SQLite: uvicorn chạy trong cùng process (LLM/embedding giả từ fakes.py),
+N user ảo gửi song song hỗn hợp analyze (upload CV + poll job), list applications và patch application.
+
+Ghi lại latency từng loại request (p50/p95), số request/giây, mã lỗi, thống kê job queue + cache
+của server lúc kết thúc và peak RSS (server + client cùng process).
+
+    cd backend
+    python -m benchmarks.load_test --users 8 --duration 30 --mix analyze=1,list=6,patch=3
+"""
+import argparse
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+# Phải đặt trước khi import server/database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='dss_load_'), 'load.db')}")
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+
+import requests
+import uvicorn
+
+from benchmarks.fakes import install_fakes
+from benchmarks.fixtures import JD_FIXTURES, make_cv_pdf
+from benchmarks.report import peak_rss_mb, save_results, summarize
+
+STATUSES = ["new", "applied", "interview", "offer", "rejected"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    from server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Server did not start within 30s")
+        time.sleep(0.05)
+    return server
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - {"analyze", "list", "patch"}
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {sorted(unknown)}")
+    return mix
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, cvs: List[bytes], seed_apps: int, poll_interval: float):
+        self.base = base_url
+        self.http = requests.Session()
+        self.http.headers["x-session-id"] = str(uuid.uuid4())
+        self.cvs = cvs
+        self.poll_interval = poll_interval
+        self.app_ids: List[int] = []
+        for i in range(seed_apps):
+            r = self.http.post(f"{self.base}/api/applications", json={
+                "job_title": f"Backend Engineer {i}",
+                "company_name": f"Company {i % 7}",
+                "status": random.choice(STATUSES),
+                "match_score": random.randint(20, 95),
+                "analysis_result": {"matched_keywords": ["Python", "SQL"]},
+            })
+            r.raise_for_status()
+            self.app_ids.append(r.json()["id"])
+
+    def analyze(self) -> str:
+        r = self.http.post(
+            f"{self.base}/api/analyze",
+            files={"file": ("cv.pdf", random.choice(self.cvs), "application/pdf")},
+            data={"jd_text": random.choice(list(JD_FIXTURES.values()))},
+        )
+        if r.status_code == 429:
+            return "429"
+        r.raise_for_status()
+        job = r.json()
+        while job["status"] not in ("done", "error"):
+            time.sleep(self.poll_interval)
+            job = self.http.get(f"{self.base}/api/analyze/{job['job_id']}").json()
+        return f"{r.status_code}-{r.headers.get('X-Cache', '?').lower()}-{job['status']}"
+
+    def list(self) -> str:
+        r = self.http.get(f"{self.base}/api/applications", params={"limit": 20, "fields": "summary"})
+        return str(r.status_code)
+
+    def patch(self) -> str:
+        if not self.app_ids:
+            return "skipped"
+        r = self.http.patch(
+            f"{self.base}/api/applications/{random.choice(self.app_ids)}",
+            json={"status": random.choice(STATUSES)},
+        )
+        return str(r.status_code)
+
+
+def run_load(base_url: str, args, mix: Dict[str, int]) -> Dict[str, Any]:
+    cvs = [make_cv_pdf(size, seed=i) for i, size in enumerate(["short", "medium", "long"] * max(1, args.cv_pool // 3))]
+    users = [VirtualUser(base_url, cvs, args.seed_apps, args.poll_interval) for _ in range(args.users)]
+    ops, weights = zip(*mix.items())
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Counter] = defaultdict(Counter)
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(user: VirtualUser):
+        while time.perf_counter() < stop_at:
+            op = random.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                outcome = getattr(user, op)()
+            except Exception as e:
+                outcome = f"exception:{type(e).__name__}"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[op].append(elapsed)
+                outcomes[op][outcome] += 1
+
+    threads = [threading.Thread(target=worker, args=(u,), name=f"vu-{i}") for i, u in enumerate(users)]
+    wall_started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_started
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "operations": {
+            op: {**summarize(latencies[op]), "per_s": round(len(latencies[op]) / wall, 3), "outcomes": dict(outcomes[op])}
+            for op in ops
+        },
+        "requests": total,
+        "throughput_per_s": round(total / wall, 3),
+        "wall_s": round(wall, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test server.py (SQLite + LLM giả)")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Giây")
+    parser.add_argument("--mix", default="analyze=1,list=6,patch=3", help="Trọng số analyze/list/patch")
+    parser.add_argument("--seed-apps", type=int, default=50, help="Số application tạo sẵn cho mỗi user")
+    parser.add_argument("--cv-pool", type=int, default=9, help="Số CV khác nhau (ít -> nhiều cache hit)")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.3)
+    parser.add_argument("--url", help="Chạy với server có sẵn thay vì khởi động uvicorn trong process")
+    parser.add_argument("--out", help="File JSON kết quả (mặc định benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        install_fakes(args.llm_latency, args.first_chunk_latency)
+        port = _free_port()
+        server = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        results = run_load(base_url, args, mix)
+        results["server"] = {
+            "jobs": requests.get(f"{base_url}/api/jobs/stats").json(),
+            "cache": requests.get(f"{base_url}/api/cache/stats").json(),
+        }
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    for op, data in results["operations"].items():
+        print(f" [LOAD] {op}: {data.get('n', 0)} req, p50 {data.get('p50_ms')} ms, p95 {data.get('p95_ms')} ms, {data['outcomes']}")
+    print(f" [LOAD] Total {results['requests']} req in {results['wall_s']}s ({results['throughput_per_s']}/s)")
+    save_results("load", {
+        "config": vars(args),
+        **results,
+        "peak_rss_mb": peak_rss_mb() if server is not None else None,
+    }, out=args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# backend/benchmarks/report.py
+"""
+Tiện ích chung cho benchmark: thống kê latency, peak RSS, lưu kết quả JSON và so sánh 2 lần chạy.
+
+    python -m benchmarks.report compare benchmarks/results/analysis-old.json benchmarks/results/analysis-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """samples tính bằng giây -> mean/p50/p95/max tính bằng ms."""
+    if not samples:
+        return {"n": 0}
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # Linux trả ru_maxrss theo KB, macOS theo byte
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def save_results(name: str, data: Dict[str, Any], out: Optional[str] = None) -> str:
+    """Ghi {environment, ...data} ra results/<name>-<thời gian>.json (hoặc đường dẫn out)."""
+    path = out or os.path.join(RESULTS_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": name, "environment": environment(), **data}, f, indent=2, ensure_ascii=False)
+    print(f" [BENCH] Results saved to {path}")
+    return path
+
+
+def _flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = float(data)
+    return flat
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Mọi số có ở cả 2 file (trừ environment/config): giá trị cũ, mới và % thay đổi."""
+    old_flat = _flatten({k: v for k, v in old.items() if k not in ("environment", "config")})
+    new_flat = _flatten({k: v for k, v in new.items() if k not in ("environment", "config")})
+    rows = []
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[key], new_flat[key]
+        change = round((after - before) / before * 100, 1) if before else None
+        rows.append({"metric": key, "old": before, "new": after, "change_pct": change})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh 2 file kết quả benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--filter", default="", help="Chỉ in metric chứa chuỗi này (vd: p95_ms)")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old_data = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new_data = json.load(f)
+    for row in compare(old_data, new_data):
+        if args.filter in row["metric"]:
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            print(f"{row['metric']:<60} {row['old']:>12.3f} {row['new']:>12.3f} {change:>9}")
@@ -0,0 +1,200 @@
+# backend/cache.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlmodel import Session, select, func
+
+from core_logic import PROMPT_VERSION
+from database import engine
+from models import AnalysisCacheEntry
+
+# Cấu hình cache (có thể chỉnh qua biến môi trường trên Hugging Face)
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))          # Số entry trong RAM
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))  # Giây
+ANALYSIS_CACHE_DB_MAX_ROWS = int(os.getenv("ANALYSIS_CACHE_DB_MAX_ROWS", "5000"))
+
+
+class LRUCache:
+    """LRU cache thread-safe có TTL. Dùng OrderedDict: đầu = cũ nhất, cuối = mới dùng nhất."""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def normalize_jd_text(jd_text: str) -> str:
+    """Bỏ khoảng trắng thừa và dòng trống để JD chỉ khác nhau về format vẫn trúng cache."""
+    lines = (" ".join(line.split()) for line in (jd_text or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(file_bytes: bytes, jd_text: str) -> str:
+    return make_cache_key_for_hash(hash_bytes(file_bytes), jd_text)
+
+
+def make_cache_key_for_hash(cv_hash: str, jd_text: str) -> str:
+    """Như make_cache_key nhưng nhận sẵn sha256 của CV (phân tích theo cv_hash, không upload lại)."""
+    h = hashlib.sha256()
+    h.update(cv_hash.encode())
+    h.update(b"\0")
+    h.update(normalize_jd_text(jd_text).encode("utf-8"))
+    h.update(b"\0")
+    h.update(PROMPT_VERSION.encode())
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Cache 2 tầng cho kết quả phân tích:
+    1. RAM (LRU + TTL) -> trả về trong vài micro giây.
+    2. Database (bảng analysiscacheentry) -> sống sót qua restart của Space.
+    Lỗi ở tầng DB chỉ được log ra, không bao giờ làm hỏng request phân tích.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, db_max_rows: int):
+        self.ttl = ttl
+        self.db_max_rows = db_max_rows
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.db_hits = 0
+        self.db_misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        try:
+            with Session(engine) as session:
+                entry = session.get(AnalysisCacheEntry, key)
+                if entry is None:
+                    self.db_misses += 1
+                    return None
+                if entry.created_at < datetime.now() - timedelta(seconds=self.ttl):
+                    session.delete(entry)
+                    session.commit()
+                    self.db_misses += 1
+                    return None
+                entry.hits += 1
+                session.add(entry)
+                session.commit()
+                result = entry.result
+        except Exception as e:
+            print(f" [CACHE] DB lookup warning: {e}")
+            return None
+
+        self.db_hits += 1
+        self.memory.set(key, result)
+        return result
+
+    def set(self, key: str, result: Dict[str, Any]):
+        # Không bao giờ cache kết quả lỗi hoặc thiếu field (lần sau có thể Gemini trả đủ)
+        if not result or "error" in result or result.get("incomplete_sections"):
+            return
+        self.memory.set(key, result)
+
+        try:
+            with Session(engine) as session:
+                session.merge(AnalysisCacheEntry(key=key, result=result, created_at=datetime.now()))
+                session.commit()
+                self._evict_db(session)
+        except Exception as e:
+            print(f" [CACHE] DB write warning: {e}")
+
+    def _evict_db(self, session: Session):
+        # Xóa entry hết hạn, sau đó cắt bớt entry cũ nhất nếu vượt quá giới hạn số dòng
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        expired = session.exec(select(AnalysisCacheEntry).where(AnalysisCacheEntry.created_at < cutoff)).all()
+        for entry in expired:
+            session.delete(entry)
+        session.commit()
+
+        total = session.exec(select(func.count()).select_from(AnalysisCacheEntry)).one()
+        overflow = total - self.db_max_rows
+        if overflow > 0:
+            oldest = session.exec(
+                select(AnalysisCacheEntry)
+                .order_by(AnalysisCacheEntry.created_at)
+                .limit(overflow)
+            ).all()
+            for entry in oldest:
+                session.delete(entry)
+        session.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        hits = memory["hits"]
+        misses = self.db_misses
+        total = hits + self.db_hits + misses
+        return {
+            "memory": memory,
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "hit_rate": round((hits + self.db_hits) / total, 4) if total else 0.0,
+            "prompt_version": PROMPT_VERSION[:12],
+        }
+
+
+analysis_cache = AnalysisCache(
+    maxsize=ANALYSIS_CACHE_SIZE,
+    ttl=ANALYSIS_CACHE_TTL,
+    db_max_rows=ANALYSIS_CACHE_DB_MAX_ROWS,
+)
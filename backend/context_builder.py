@@ -0,0 +1,137 @@
+# backend/context_builder.py
+"""
+Dựng phần CV đưa vào prompt từ nhiều truy vấn (mỗi dòng JD 1 truy vấn) thay vì 1 truy vấn bằng cả JD.
+- Tất cả dòng JD đã được embed trong 1 lần embed_documents (dùng chung với scoring.py).
+- Mỗi dòng lấy top-k chunk, chọn xoay vòng (hạng 1 của mọi dòng trước, rồi hạng 2...) để dòng nào
+  cũng có bằng chứng, dừng khi chạm ngân sách token.
+- Chunk trùng bị bỏ; chunk liền kề (overlap do text splitter) được nối lại, cắt phần lặp.
+"""
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Cắt CV (ingest.py) + số chunk của chế độ "single" (core_logic re-export lại các hằng này)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+RETRIEVER_K = 5
+RETRIEVER_K_PER_LINE = int(os.getenv("RETRIEVER_K_PER_LINE", "2"))
+# Ước lượng token offline (không gọi API count_tokens của Gemini): ~4 ký tự / token
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+# Mặc định không vượt context cũ (RETRIEVER_K chunk đầy) -> bật "multi" không làm prompt dài hơn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")) or int(RETRIEVER_K * CHUNK_SIZE / CONTEXT_CHARS_PER_TOKEN)
+# Phần lặp ngắn hơn ngưỡng này coi như trùng ngẫu nhiên, không cắt
+_MIN_OVERLAP_CHARS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CONTEXT_CHARS_PER_TOKEN)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    chunk_indices: List[int]          # Chunk được chọn, theo thứ tự trong CV
+    tokens: int
+    budget: int
+    queries: int
+    skipped: int = 0                  # Chunk ứng viên bị bỏ vì vượt ngân sách
+    covered: List[bool] = field(default_factory=list)  # Dòng JD nào có ít nhất 1 chunk trong context
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "queries": self.queries,
+            "chunks": len(self.chunk_indices),
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "skipped": self.skipped,
+            "uncovered_lines": self.covered.count(False),
+        }
+
+
+def _overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """Độ dài đoạn cuối của left trùng với đoạn đầu của right (overlap của RecursiveCharacterTextSplitter)."""
+    upper = min(len(left), len(right), max_overlap)
+    for size in range(upper, _MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(chunk_texts: Sequence[str], indices: Sequence[int], max_overlap: int) -> str:
+    """Nối các chunk đã chọn theo thứ tự CV; 2 chunk liền kề thì bỏ phần overlap ở chunk sau."""
+    parts: List[str] = []
+    previous: Optional[int] = None
+    for i in sorted(set(indices)):
+        text = chunk_texts[i]
+        if previous is not None and i == previous + 1 and parts:
+            cut = _overlap_length(parts[-1], text, max_overlap)
+            if cut:
+                parts[-1] = parts[-1] + text[cut:]
+                previous = i
+                continue
+        parts.append(text)
+        previous = i
+    return "\n\n".join(parts)
+
+
+def build_context(
+    chunk_texts: Sequence[str],
+    chunk_matrix: Any,
+    query_vectors: Any,
+    max_overlap: int,
+    budget: Optional[int] = None,
+    k_per_line: Optional[int] = None,
+) -> PackedContext:
+    """
+    chunk_matrix: (n_chunks, dim), query_vectors: (n_queries, dim) - đã chuẩn hóa L2 nên cosine = tích vô hướng.
+    Trả về context đã gộp + số liệu để log (tokens, chunk nào được chọn, dòng JD nào không có bằng chứng).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    k_per_line = RETRIEVER_K_PER_LINE if k_per_line is None else k_per_line
+    n_queries = len(query_vectors)
+    if not len(chunk_texts) or not n_queries:
+        return PackedContext(text="", chunk_indices=[], tokens=0, budget=budget, queries=n_queries, covered=[False] * n_queries)
+    chunks = np.asarray(chunk_matrix, dtype=np.float32)
+    queries = np.asarray(query_vectors, dtype=np.float32).reshape(n_queries, -1)
+
+    # 1 phép nhân ma trận cho mọi dòng JD, rồi top-k theo từng hàng
+    sims = queries @ chunks.T
+    k = min(k_per_line, sims.shape[1])
+    ranked = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+
+    selected: List[int] = []
+    covered = [False] * n_queries
+    used = 0
+    skipped = 0
+    for rank in range(k):
+        for line in range(n_queries):
+            idx = int(ranked[line, rank])
+            if idx in selected:
+                covered[line] = True
+                continue
+            cost = estimate_tokens(chunk_texts[idx])
+            if used + cost > budget:
+                skipped += 1
+                continue
+            selected.append(idx)
+            used += cost
+            covered[line] = True
+
+    text = merge_chunks(chunk_texts, selected, max_overlap)
+    return PackedContext(
+        text=text,
+        chunk_indices=sorted(selected),
+        tokens=estimate_tokens(text),
+        budget=budget,
+        queries=n_queries,
+        skipped=skipped,
+        covered=covered,
+    )
+
+
+def context_fingerprint() -> str:
+    """Cấu hình dựng context, đưa vào PROMPT_VERSION (đổi ngân sách -> prompt khác -> cache khác)."""
+    return repr((CONTEXT_TOKEN_BUDGET, RETRIEVER_K_PER_LINE, CONTEXT_CHARS_PER_TOKEN))
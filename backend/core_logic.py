@@ -1,21 +1,28 @@
 # backend/core_logic.py
 import os
 import time
+import hashlib
+import json
+import random
+import asyncio
+import threading
 from dotenv import load_dotenv
-from typing import List, Dict, Union
+from typing import Callable, List, Dict, Optional, Union
 
 # --- Imports ---
-from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_chroma import Chroma
-
-from langchain_huggingface import HuggingFaceEmbeddings 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnablePassthrough
+# Các thư viện nặng (langchain_google_genai, langchain_huggingface/torch, retriever/numpy) được import
+# lười bên trong hàm để server lên (healthy trên /) trong < 1s; warm_up() nạp chúng ở background.
 from pydantic import BaseModel, Field
 
+import metrics
+from json_repair import JsonRepairError, ParsedJson, loads_partial, loads_tolerant, validate_sections
+from ingest import IngestError
+from scoring import LocalScore, parse_jd_requirements, score_requirements, scoring_fingerprint
+from context_builder import CHUNK_OVERLAP, CHUNK_SIZE, RETRIEVER_K, build_context, context_fingerprint, estimate_tokens
+from llm_scheduler import LlmAdmissionError, estimate_request_tokens, llm_scheduler
+from embedding_backends import EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, embedding_id, import_backend_modules, load_embeddings, onnx_files
+from cpu_pool import PooledEmbeddings, cpu_pool
+
 load_dotenv()
 
 # --- DATA MODELS ---
@@ -29,7 +36,9 @@ class JobMatchResult(BaseModel):
     radar_reasoning: Dict[str, Dict[str, str]] = Field(description="Reasoning in en and vi. Structure: {'Hard Skills': {'en': '...', 'vi': '...'}}")
     bilingual_content: Dict[str, Union[Dict, List]] = Field(description="Assessment content in EN and VI")
 
-CORE_PROMPT = """
+# Prompt được ghép từ các đoạn để CORE_PROMPT (LLM tự tính điểm) và NARRATIVE_PROMPT
+# (điểm tính local bởi scoring.py) dùng chung phần còn lại.
+_PROMPT_INTRO = """
 Bạn là một Trợ lý Tuyển dụng AI chuyên nghiệp (JobMatchr). Nhiệm vụ của bạn là phân tích CV (được cung cấp dưới dạng text) và Mô tả công việc (JD - mỗi dòng là một yêu cầu).
 
 **INPUT DATA:**
@@ -39,10 +48,14 @@ Bạn là một Trợ lý Tuyển dụng AI chuyên nghiệp (JobMatchr). Nhiệ
 **NHIỆM VỤ:**
 Hãy thực hiện các bước sau một cách logic:
 
-BƯỚC 1: TRÍCH XUẤT THÔNG TIN CÁ NHÂN
+"""
+
+_PROMPT_STEP1 = """BƯỚC 1: TRÍCH XUẤT THÔNG TIN CÁ NHÂN
 - Tìm Name, Position (Vị trí ứng tuyển/hiện tại), Experience (Tổng số năm kinh nghiệm - chỉ lấy số).
 
-BƯỚC 2: PHÂN TÍCH JD VÀ TÍNH ĐIỂM (QUY TẮC "1 ĐỀU")
+"""
+
+_PROMPT_STEP2 = """BƯỚC 2: PHÂN TÍCH JD VÀ TÍNH ĐIỂM (QUY TẮC "1 ĐỀU")
 - Tách JD thành các dòng riêng biệt. Tổng số dòng = Tổng yêu cầu (Total_Req).
 - Phân loại từng dòng thành "Bắt buộc" (Requirement) hoặc "Ưu tiên" (Nice-to-have) dựa trên từ khóa:
   * Tiếng Anh: "nice to have", "plus", "preferred", "advantage", "desired", "bonus", "optional", "willing to".
@@ -52,7 +65,9 @@ BƯỚC 2: PHÂN TÍCH JD VÀ TÍNH ĐIỂM (QUY TẮC "1 ĐỀU")
 - Keyword phát hiện: Trích xuất các từ khóa kỹ thuật (Hard skill) trùng khớp giữa CV và JD.
 - Công thức tính % chung: (Tổng số dòng Matched / Tổng số dòng JD) * 100.
 
-BƯỚC 3: ĐÁNH GIÁ SONG NGỮ (ANH & VIỆT)
+"""
+
+_PROMPT_STEPS_3_4 = """BƯỚC 3: ĐÁNH GIÁ SONG NGỮ (ANH & VIỆT)
 - Tạo nội dung đánh giá cho các mục: Đánh giá chung, Điểm mạnh, Điểm yếu (Missing skills), Câu hỏi phỏng vấn.
 - Nội dung Tiếng Anh viết trước, Tiếng Việt dịch sát nghĩa theo sau.
 
@@ -64,44 +79,51 @@ BƯỚC 4: CHẤM ĐIỂM RADAR (1-10) VÀ GIẢI THÍCH LÝ DO
 4. **Education (Học vấn):** 1-4 (Không liên quan), 5-7 (Đúng ngành), 8-10 (Bằng cấp cao/Chứng chỉ xịn).
 5. **Domain Knowledge (Hiểu biết ngành):** 1-4 (Chung chung), 5-7 (Hiểu quy trình), 8-10 (Am hiểu nghiệp vụ sâu).
 
-**OUTPUT FORMAT (BẮT BUỘC JSON):**
-Chỉ trả về 1 JSON duy nhất.
-LƯU Ý QUAN TRỌNG:
-1. Không dùng Markdown (```json ... ```). Trả về raw text.
-2. KHÔNG ĐƯỢC có dấu phẩy (,) ở cuối danh sách hoặc object cuối cùng. (NO TRAILING COMMAS).
-3. Đảm bảo cấu trúc ngoặc {{}} đóng mở chính xác. 
+"""
 
-Cấu trúc như sau:
+_PROMPT_OUTPUT_RULES = """**OUTPUT FORMAT (BẮT BUỘC JSON):**
+Chỉ trả về 1 JSON duy nhất, cấu trúc như sau:
 {{
-    "personal_info": {{
+"""
+
+# Mẫu JSON của từng field cấp 1 (dùng lại khi hỏi lại riêng các field bị thiếu, xem reask_sections)
+_JSON_SECTIONS = {
+    "personal_info": """    "personal_info": {{
         "name": "String",
         "position": "String (Single title only, e.g., 'Backend Developer')",
         "experience": "String (Single value only, e.g., '2 years')"
     }},
-    "matching_score": {{
+""",
+    # Các trường deterministic: scoring.py có thể tính thay LLM
+    "matching_score": """    "matching_score": {{
         "percentage": Integer,
         "explanation": "String (e.g., 'Matched 8/10 requirements')"
     }},
-    "requirements_breakdown": {{
+""",
+    "requirements_breakdown": """    "requirements_breakdown": {{
         "must_have_ratio": "String (e.g., '5/7')",
         "nice_to_have_ratio": "String (e.g., '3/3')"
     }},
-    "matched_keywords": ["String", "String", ...],
-    "radar_chart": {{
+""",
+    "matched_keywords": """    "matched_keywords": ["String", "String", ...],
+""",
+    "radar_chart": """    "radar_chart": {{
         "Hard Skills": Integer,
         "Soft Skills": Integer,
         "Experience": Integer,
         "Education": Integer,
         "Domain Knowledge": Integer
     }},
-    "radar_reasoning": {{
+""",
+    "radar_reasoning": """    "radar_reasoning": {{
         "Hard Skills": {{ "en": "English explanation...", "vi": "Giải thích tiếng Việt..." }},
         "Soft Skills": {{ "en": "...", "vi": "..." }},
         "Experience": {{ "en": "...", "vi": "..." }},
         "Education": {{ "en": "...", "vi": "..." }},
         "Domain Knowledge": {{ "en": "...", "vi": "..." }}
     }},
-    "bilingual_content": {{
+""",
+    "bilingual_content": """    "bilingual_content": {{
         "general_assessment": {{
             "en": "String",
             "vi": "String"
@@ -126,15 +148,96 @@ Cấu trúc như sau:
             "vi": ["String", "String"]
         }}
     }}
-}}
+""",
+}
+
+def _json_template(sections) -> str:
+    return "".join(_JSON_SECTIONS[name] for name in sections)
+
+_JSON_PERSONAL = _json_template(["personal_info"])
+_JSON_SCORING = _json_template(["matching_score", "requirements_breakdown", "matched_keywords"])
+_JSON_NARRATIVE = _json_template(["radar_chart", "radar_reasoning", "bilingual_content"]) + "}}\n"
+
+CORE_PROMPT = (
+    _PROMPT_INTRO + _PROMPT_STEP1 + _PROMPT_STEP2 + _PROMPT_STEPS_3_4
+    + _PROMPT_OUTPUT_RULES + _JSON_PERSONAL + _JSON_SCORING + _JSON_NARRATIVE
+)
+
+_PROMPT_LOCAL_STEP2 = """BƯỚC 2: KẾT QUẢ ĐỐI CHIẾU JD (HỆ THỐNG ĐÃ TÍNH SẴN - KHÔNG TÍNH LẠI)
+- Điểm %, tỷ lệ Bắt buộc/Ưu tiên và từ khóa trùng khớp đã được tính bằng thuật toán. KHÔNG đưa các trường đó vào JSON.
+- Trạng thái từng dòng JD bên dưới là kết quả cuối cùng: dùng đúng trạng thái này cho "comparison_table", chỉ bổ sung bằng chứng từ CV.
+{local_scoring}
+
+"""
+
+# LLM chỉ viết phần diễn giải (thông tin cá nhân, radar, nội dung song ngữ)
+NARRATIVE_PROMPT = (
+    _PROMPT_INTRO + _PROMPT_STEP1 + _PROMPT_LOCAL_STEP2 + _PROMPT_STEPS_3_4
+    + _PROMPT_OUTPUT_RULES + _JSON_PERSONAL + _JSON_NARRATIVE
+)
+
+# Hỏi lại riêng các field còn thiếu/sai sau khi đã sửa JSON local (không chạy lại cả pipeline)
+REASK_PROMPT_HEAD = """
+Bạn là một Trợ lý Tuyển dụng AI chuyên nghiệp (JobMatchr). Câu trả lời trước bị thiếu hoặc sai định dạng ở một số trường.
+Dựa trên CV và JD dưới đây, chỉ trả về 1 JSON gồm ĐÚNG các trường sau: {sections}.
+
+**INPUT DATA:**
+1. CV Text: {cv_text}
+2. JD Text: {jd_text}
+
+Cấu trúc như sau:
+{{
 """
 
+# --- MODEL SETTINGS ---
+# Mọi thay đổi ở đây (hoặc trong CORE_PROMPT) sẽ làm đổi PROMPT_VERSION -> cache cũ tự động bị bỏ qua
+LLM_MODEL = "gemini-flash-latest"
+LLM_TEMPERATURE = 0.2
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Model + biến thể số học (fp32 / int8) của backend embedding: đổi -> vector cũ trong artifact / JD index không dùng lại
+EMBEDDING_ID = embedding_id(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+# Bật: BƯỚC 2 (điểm %, tỷ lệ, từ khóa) tính local bằng scoring.py, LLM chỉ viết phần diễn giải
+LOCAL_SCORING = os.getenv("LOCAL_SCORING", "1") == "1"
+# Lỗi tạm thời của Gemini (429/5xx/timeout): thử lại tối đa N lần, chờ LLM_BACKOFF_BASE * 2^lần (có jitter)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Số vòng hỏi lại các field còn thiếu sau khi sửa JSON (0 = tắt)
+LLM_REASK_ROUNDS = int(os.getenv("LLM_REASK_ROUNDS", "1"))
+# "multi": truy vấn theo từng dòng JD + ngân sách token (context_builder.py); "single": top-k bằng cả JD như cũ
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "multi")
+
+def prompt_version() -> str:
+    """Fingerprint của prompt + cấu hình model, dùng làm một phần của cache key."""
+    settings = {
+        "prompt": NARRATIVE_PROMPT if LOCAL_SCORING else CORE_PROMPT,
+        "local_scoring": scoring_fingerprint() if LOCAL_SCORING else None,
+        "llm_model": LLM_MODEL,
+        "temperature": LLM_TEMPERATURE,
+        "embedding_model": EMBEDDING_ID,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "k": RETRIEVER_K,
+        "retrieval": context_fingerprint() if RETRIEVAL_MODE == "multi" else RETRIEVAL_MODE,
+    }
+    raw = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+PROMPT_VERSION = prompt_version()
+
 _llm_instance = None
 _embedding_instance = None
+_model_lock = threading.Lock()
 
 def get_llm():
     global _llm_instance
-    if _llm_instance is None:
+    if _llm_instance is not None:
+        return _llm_instance
+    with _model_lock:
+        if _llm_instance is not None:
+            return _llm_instance
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             print(" LỖI NGHIÊM TRỌNG: Không tìm thấy GOOGLE_API_KEY trong biến môi trường!")
@@ -143,77 +246,491 @@ def get_llm():
             
         # [FIX] Dùng gemini-1.5-flash để ổn định và thông minh hơn
         _llm_instance = ChatGoogleGenerativeAI(
-            model="gemini-flash-latest", 
-            temperature=0.2,
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
             google_api_key=api_key
         )
     return _llm_instance
 
 def get_embeddings():
     global _embedding_instance
-    if _embedding_instance is None:
-        # Dùng Hugging Face (CPU) để không cần Key Google ở bước này
-        _embedding_instance = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+    if _embedding_instance is not None:
+        return _embedding_instance
+    with _model_lock:
+        if _embedding_instance is not None:
+            return _embedding_instance
+        if cpu_pool.enabled:
+            # CPU_WORKERS > 0: model nằm trong các process con của cpu_pool, process này chỉ gửi text sang
+            _embedding_instance = PooledEmbeddings(cpu_pool, EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE)
+        else:
+            # hf (PyTorch) / onnx / onnx-int8 theo EMBEDDING_BACKEND, xem embedding_backends.py
+            _embedding_instance = load_embeddings(EMBEDDING_MODEL)
     return _embedding_instance
 
-def analyze_cv_logic(file_path: str, jd_text: str):
+def format_docs(docs):
+    return "\n\n".join(d.page_content for d in docs)
+
+def load_cv_splits(file_bytes: bytes, source: str = "upload", stats: Optional[dict] = None):
+    """Parse PDF từ bytes trong RAM và cắt chunk. Raise IngestError (ValueError) nếu PDF không hợp lệ."""
+    # CPU_WORKERS > 0 -> parse trong cpu_pool, không giữ GIL của process server
+    ingested = cpu_pool.ingest_pdf(file_bytes, source=source)
+    metrics.observe_stage("pdf_extract", ingested.total_seconds - ingested.split_seconds)
+    metrics.observe_stage("split", ingested.split_seconds)
+    if stats is not None:
+        stats["ingest"] = ingested.report()
+    return ingested.splits
+
+def build_llm_chain(local_score: Optional[LocalScore] = None):
+    """
+    prompt | llm, trả về message (text thô). Input: {"cv_text": ..., "jd_text": ...}.
+    JSON được đọc bằng finalize_llm_output() (sửa lỗi local + hỏi lại field thiếu) thay vì JsonOutputParser.
+    Có local_score -> dùng NARRATIVE_PROMPT (LLM không tự tính BƯỚC 2), ghép điểm lại bằng merge_local_scores().
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    if local_score is not None:
+        prompt = ChatPromptTemplate.from_template(NARRATIVE_PROMPT)
+        prompt = prompt.partial(local_scoring=local_score.prompt_summary())
+    else:
+        prompt = ChatPromptTemplate.from_template(CORE_PROMPT)
+    return prompt | get_llm()
+
+def message_text(content) -> str:
+    # Gemini có thể trả content dạng list các part thay vì str
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content or [])
+
+def record_llm_usage(message, stats: Optional[dict] = None):
+    """Số token Gemini báo về (usage_metadata) -> metrics + stats["llm_tokens"]."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    tokens = {direction: usage.get(f"{direction}_tokens") for direction in ("input", "output")}
+    for direction, count in tokens.items():
+        if count:
+            metrics.LLM_TOKENS.inc(count, direction=direction)
+    if stats is not None and usage:
+        stats["llm_tokens"] = tokens
+
+_TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "ReadTimeout", "ConnectTimeout", "ConnectError",
+}
+
+def is_transient_error(error: Exception) -> bool:
+    """Lỗi nên thử lại (quota, 5xx, timeout, mất kết nối). Lỗi prompt/API key thì không."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _TRANSIENT_ERROR_NAMES:
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    message = str(error)
+    return any(marker in message for marker in ("429", "503", "500 Internal", "RESOURCE_EXHAUSTED", "UNAVAILABLE"))
+
+def _backoff_delay(attempt: int) -> float:
+    return min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def _is_quota_error(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or code == 429
+        or any(marker in str(error) for marker in ("429", "RESOURCE_EXHAUSTED"))
+    )
+
+def _log_retry(error: Exception, attempt: int, delay: float):
+    metrics.LLM_RETRIES.inc(error=type(error).__name__)
+    if _is_quota_error(error):
+        # Hết quota là của cả server, không riêng request này -> dừng cấp phép cho mọi lời gọi khác
+        llm_scheduler.throttle(delay)
+    print(f" [LLM] Transient error ({type(error).__name__}: {error}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+
+def invoke_with_backoff(runnable, chain_input):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            with llm_scheduler.admit(chain_input) as ticket:
+                message = runnable.invoke(chain_input)
+                ticket.settle(message)
+            return message
+        except LlmAdmissionError:
+            raise
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not is_transient_error(e):
+                raise
+            delay = _backoff_delay(attempt)
+            _log_retry(e, attempt, delay)
+            time.sleep(delay)
+
+async def ainvoke_with_backoff(runnable, chain_input):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            ticket = await llm_scheduler.aacquire(estimate_request_tokens(chain_input))
+            with ticket:
+                message = await runnable.ainvoke(chain_input)
+                ticket.settle(message)
+            return message
+        except LlmAdmissionError:
+            raise
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not is_transient_error(e):
+                raise
+            delay = _backoff_delay(attempt)
+            _log_retry(e, attempt, delay)
+            await asyncio.sleep(delay)
+
+def reask_sections(sections: List[str], chain_input: dict) -> dict:
+    """Hỏi lại Gemini chỉ các field cấp 1 trong sections (prompt ngắn, output ngắn)."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    template = REASK_PROMPT_HEAD + _json_template(sections).rstrip().rstrip(",") + "\n}}\n"
+    prompt = ChatPromptTemplate.from_template(template).partial(sections=", ".join(sections))
+    with metrics.span("llm_reask"):
+        message = invoke_with_backoff(prompt | get_llm(), chain_input)
+    record_llm_usage(message)
+    parsed = loads_tolerant(message_text(message.content))
+    data = parsed.value if isinstance(parsed.value, dict) else {}
+    data.pop(parsed.truncated_key, None)
+    return data
+
+def finalize_llm_output(text: str, chain_input: dict, local_score: Optional[LocalScore] = None, stats: Optional[dict] = None) -> dict:
+    """
+    Text thô của LLM -> dict đã kiểm tra theo JobMatchResult:
+    1. Sửa JSON local (fence, dấu phẩy thừa, ngoặc thiếu, nháy chưa escape... - json_repair.py)
+    2. Field nào vẫn thiếu/sai -> hỏi lại riêng các field đó (tối đa LLM_REASK_ROUNDS vòng)
+    3. Vẫn thiếu -> trả kết quả kèm "incomplete_sections" (không cache), chỉ báo lỗi khi không còn field nào dùng được.
+    Các field scoring.py đã tính (local_score) không bắt LLM trả về.
+    """
+    skip = set(local_score.to_result_fields()) if local_score is not None else set()
+    required = [name for name in JobMatchResult.model_fields if name not in skip]
+    with metrics.span("json_parse"):
+        try:
+            parsed = loads_tolerant(text)
+        except JsonRepairError as e:
+            print(f" [LLM] {e}")
+            parsed = ParsedJson({}, repaired=True)
+        data = parsed.value if isinstance(parsed.value, dict) else {}
+        # Output bị cắt: field đang viết dở không đáng tin dù đúng schema -> hỏi lại
+        data.pop(parsed.truncated_key, None)
+        sections, missing = validate_sections(data, JobMatchResult, required)
+    if parsed.repaired:
+        metrics.LLM_OUTPUT_FIXES.inc(kind="repaired")
+    report = {"repaired": parsed.repaired, "truncated": parsed.truncated_key, "reasked": [], "incomplete": []}
+
+    for _ in range(LLM_REASK_ROUNDS):
+        if not missing or len(missing) == len(required):
+            # Không field nào dùng được -> lỗi nặng hơn định dạng, hỏi lại từng phần cũng như chạy lại từ đầu
+            break
+        print(f" [LLM] Re-asking for sections: {missing}")
+        metrics.LLM_OUTPUT_FIXES.inc(kind="reask")
+        report["reasked"].extend(missing)
+        try:
+            extra = reask_sections(missing, chain_input)
+        except Exception as e:
+            print(f" [LLM] Re-ask failed: {e}")
+            break
+        fixed, missing = validate_sections(extra, JobMatchResult, missing)
+        sections.update(fixed)
+
+    if stats is not None:
+        stats["llm_output"] = report
+    if len(missing) == len(required):
+        raise ValueError("LLM không trả về JSON hợp lệ")
+    # Giữ đúng thứ tự field của JobMatchResult
+    result = {name: sections[name] for name in JobMatchResult.model_fields if name in sections}
+    if missing:
+        metrics.LLM_OUTPUT_FIXES.inc(kind="incomplete")
+        report["incomplete"] = missing
+        result["incomplete_sections"] = missing
+    return result
+
+def build_cv_context(retriever, jd_text: str, line_vectors, jd_vector=None, local_score: Optional[LocalScore] = None, stats: Optional[dict] = None) -> str:
+    """
+    Phần CV đưa vào {cv_text}. multi: mỗi dòng JD 1 truy vấn, gộp + cắt theo CONTEXT_TOKEN_BUDGET.
+    Log số token prompt (ước lượng) trước/sau: "trước" = cách cũ (k chunk, ước lượng bằng k chunk dài nhất).
+    """
+    texts = [d.page_content for d in retriever.documents]
+    prompt_tokens = estimate_tokens(NARRATIVE_PROMPT if local_score is not None else CORE_PROMPT) + estimate_tokens(jd_text)
+    if local_score is not None:
+        prompt_tokens += estimate_tokens(local_score.prompt_summary())
+    single_tokens = sum(sorted((estimate_tokens(t) for t in texts), reverse=True)[:RETRIEVER_K])
+
+    if RETRIEVAL_MODE != "multi" or not len(line_vectors):
+        if jd_vector is None:
+            jd_vector = retriever.embeddings.embed_query(jd_text)
+        context = format_docs([retriever.documents[i] for i, _ in retriever.search_by_vector(jd_vector, RETRIEVER_K)])
+        if stats is not None:
+            stats["context"] = {"mode": "single", "tokens": estimate_tokens(context), "prompt_tokens": prompt_tokens + estimate_tokens(context)}
+        return context
+
+    packed = build_context(texts, retriever.matrix, line_vectors, max_overlap=CHUNK_OVERLAP)
+    report = packed.report()
+    report.update(
+        mode="multi",
+        prompt_tokens_before=prompt_tokens + single_tokens,
+        prompt_tokens=prompt_tokens + packed.tokens,
+    )
+    print(
+        f" [CONTEXT] {packed.queries} JD lines -> {len(packed.chunk_indices)}/{len(texts)} chunks, "
+        f"prompt ~{report['prompt_tokens_before']} -> ~{report['prompt_tokens']} tokens "
+        f"(budget {packed.budget}, uncovered lines {report['uncovered_lines']})"
+    )
+    if stats is not None:
+        stats["context"] = report
+    return packed.text
+
+def merge_local_scores(result: dict, local_score: Optional[LocalScore]) -> dict:
+    """Ghép các trường deterministic vào kết quả LLM, giữ đúng thứ tự field của JobMatchResult."""
+    if local_score is None or not isinstance(result, dict):
+        return result
+    local_fields = local_score.to_result_fields()
+    merged = {}
+    for key in JobMatchResult.model_fields:
+        if key in local_fields:
+            merged[key] = local_fields[key]
+        elif key in result:
+            merged[key] = result[key]
+    for key, value in result.items():
+        merged.setdefault(key, value)
+    return merged
+
+def stream_llm_result(chain, chain_input, on_partial: Callable[[dict], None], local_score: Optional[LocalScore] = None, stats: Optional[dict] = None):
+    """
+    chain.stream() trả về từng message chunk; sau mỗi chunk parse JSON cộng dồn (json_repair đóng tạm các ngoặc,
+    O(n) mỗi lần) -> gọi on_partial mỗi khi dict lớn thêm (personal_info xuất hiện trước, bilingual_content sau cùng).
+    Lỗi tạm thời trước chunk đầu tiên -> thử lại có backoff; stream đứt giữa chừng -> giữ phần đã nhận,
+    finalize_llm_output() sửa + hỏi lại phần thiếu. Trả về dict cuối cùng.
+    stats["llm"]: time_to_first_chunk / time_to_first_content (có personal_info) / total, tính từ lúc gọi Gemini
+    (không tính queue_wait - thời gian chờ llm_scheduler cấp phép).
+    """
+    started = time.perf_counter()
+    timing = {"time_to_first_chunk": None, "time_to_first_content": None, "chunks": 0, "queue_wait": 0.0}
+    if local_score is not None:
+        # Điểm local đã có sẵn -> client thấy % và keyword trước cả khi Gemini trả token đầu tiên
+        on_partial(merge_local_scores({}, local_score))
+
+    text = ""
+    message = None
+    last = None
+    parse_seconds = 0.0
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            with llm_scheduler.admit(chain_input) as ticket:
+                timing["queue_wait"] = round(timing["queue_wait"] + ticket.waited, 3)
+                for chunk in chain.stream(chain_input):
+                    # Client bỏ đi giữa chừng -> dừng đọc, không tốn thêm token output
+                    llm_scheduler.check_cancelled()
+                    elapsed = round(time.perf_counter() - started - timing["queue_wait"], 3)
+                    timing["chunks"] += 1
+                    if timing["time_to_first_chunk"] is None:
+                        timing["time_to_first_chunk"] = elapsed
+                        metrics.LLM_FIRST_CHUNK_SECONDS.observe(elapsed)
+                    message = chunk if message is None else message + chunk
+                    text += message_text(chunk.content)
+
+                    t0 = time.perf_counter()
+                    partial = loads_partial(text)
+                    parse_seconds += time.perf_counter() - t0
+                    if not isinstance(partial, dict) or partial == last:
+                        continue
+                    last = partial
+                    if timing["time_to_first_content"] is None and partial.get("personal_info"):
+                        timing["time_to_first_content"] = elapsed
+                    on_partial(merge_local_scores(partial, local_score))
+                ticket.settle(message)
+            break
+        except LlmAdmissionError:
+            raise
+        except Exception as e:
+            if text:
+                # Đã nhận 1 phần: không gọi lại cả bài, phần thiếu sẽ được hỏi lại theo từng field
+                metrics.ERRORS.inc(stage="llm_stream")
+                print(f" [LLM] Stream interrupted after {len(text)} chars: {e}")
+                break
+            if attempt >= LLM_MAX_RETRIES or not is_transient_error(e):
+                raise
+            delay = _backoff_delay(attempt)
+            _log_retry(e, attempt, delay)
+            time.sleep(delay)
+    timing["total"] = round(time.perf_counter() - started - timing["queue_wait"], 3)
+
+    metrics.observe_stage("llm", timing["total"] - parse_seconds)
+    metrics.observe_stage("json_parse_partial", parse_seconds)
+    record_llm_usage(message, stats)
+    result = finalize_llm_output(text, chain_input, local_score=local_score, stats=stats)
+
+    print(
+        f" [LLM] Streamed {timing['chunks']} chunks: first chunk {timing['time_to_first_chunk']}s, "
+        f"first content {timing['time_to_first_content']}s, total {timing['total']}s"
+    )
+    if stats is not None:
+        stats["llm"] = timing
+    return result
+
+def analyze_cv_logic(
+    file_bytes: Optional[bytes],
+    jd_text: str,
+    on_stage: Optional[Callable[[str], None]] = None,
+    source: str = "upload",
+    stats: Optional[dict] = None,
+    on_partial: Optional[Callable[[dict], None]] = None,
+    cv_hash: Optional[str] = None,
+):
+    """
+    file_bytes: nội dung PDF (không cần ghi ra đĩa). Có thể là None nếu truyền cv_hash của CV đã có trong kho artifact.
+    CV đã từng xử lý (cùng sha256) thì lấy chunk + embedding từ artifacts.py, bỏ qua parse và embed CV.
+    on_stage (tùy chọn) được gọi khi chuyển stage: parsing -> embedding -> scoring -> llm (dùng cho job queue).
+    stats (tùy chọn) nhận thêm thông tin đo đạc, vd: stats["ingest"] = thời gian trích từng trang.
+    on_partial (tùy chọn): bật chế độ streaming, nhận kết quả từng phần (dict cộng dồn) trong lúc Gemini đang trả lời.
+    """
     if not os.getenv("GOOGLE_API_KEY"):
         return {"error": "Server chưa nhận được GOOGLE_API_KEY. Hãy kiểm tra Settings trên Hugging Face."}
 
-    # 1. Xử lý PDF
-    try:
-        loader = PDFPlumberLoader(file_path)
-        docs = loader.load()
-        if not docs:
-            return {"error": "Không thể đọc nội dung từ file PDF."}
-        
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
-    except Exception as e:
-        return {"error": f"Lỗi đọc PDF: {str(e)}"}
+    def report(stage: str):
+        if on_stage:
+            on_stage(stage)
+
+    from artifacts import cv_artifact_store
+    from cache import hash_bytes
+
+    # 1. Xử lý PDF (hoặc lấy từ kho artifact)
+    cv_hash = cv_hash or hash_bytes(file_bytes)
+    with metrics.span("artifact_lookup"):
+        artifact = cv_artifact_store.get(cv_hash)
+    if artifact is not None:
+        splits = artifact.splits
+        if stats is not None:
+            stats["artifact"] = "hit"
+    elif file_bytes is None:
+        metrics.ERRORS.inc(stage="artifact_lookup")
+        return {"error": "Không tìm thấy CV đã lưu, hãy upload lại file PDF."}
+    else:
+        report("parsing")
+        try:
+            splits = load_cv_splits(file_bytes, source=source, stats=stats)
+        except IngestError as e:
+            metrics.ERRORS.inc(stage="parsing")
+            return {"error": str(e)}
+        except Exception as e:
+            metrics.ERRORS.inc(stage="parsing")
+            return {"error": f"Lỗi đọc PDF: {str(e)}"}
 
     # 2. Vector Store & Chain
     try:
+        from retriever import NumpyRetriever
+
+        report("embedding")
         embeddings = get_embeddings()
-        llm = get_llm()
 
-        # Nếu lỗi xảy ra ở dòng này -> Code chưa cập nhật (vẫn dùng Google Embeddings)
-        vectorstore = Chroma.from_documents(
-            documents=splits,
-            embedding=embeddings,
-            collection_name=f"cv_analysis_{int(time.time())}",
-        )
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+        # Retriever NumPy in-process: 1 CV chỉ có vài chunk, không cần tạo collection Chroma mỗi request
+        if artifact is not None:
+            retriever = NumpyRetriever.from_documents(splits, embeddings, k=RETRIEVER_K, vectors=artifact.matrix)
+        else:
+            with metrics.span("embedding"):
+                retriever = NumpyRetriever.from_documents(splits, embeddings, k=RETRIEVER_K)
+            cv_artifact_store.put(cv_hash, source, splits, retriever.matrix)
 
-        parser = JsonOutputParser(pydantic_object=JobMatchResult)
-        prompt = ChatPromptTemplate.from_template(CORE_PROMPT)
-        prompt = prompt.partial(format_instructions=parser.get_format_instructions())
-
-        def format_docs(docs):
-            return "\n\n".join(d.page_content for d in docs)
-
-        # [FIX] Định nghĩa chain rõ ràng hơn để tránh lỗi "Missing variables"
-        chain = (
-            {
-                "cv_text": retriever | format_docs, 
-                "jd_text": RunnablePassthrough() 
-            }
-            | prompt
-            | llm
-            | parser
-        )
+        # Các dòng JD được embed 1 lần (1 lời gọi embed_documents), dùng chung cho scoring và retrieval
+        requirements = parse_jd_requirements(jd_text) if (LOCAL_SCORING or RETRIEVAL_MODE == "multi") else []
+        with metrics.span("jd_embedding"):
+            line_vectors = embeddings.embed_documents([r.text for r in requirements]) if requirements else []
+
+        # BƯỚC 2 tính local: tái dùng ma trận embedding của retriever
+        local_score = None
+        if LOCAL_SCORING:
+            report("scoring")
+            with metrics.span("scoring"):
+                local_score = score_requirements(requirements, line_vectors, retriever.matrix, [d.page_content for d in splits])
+
+        chain = build_llm_chain(local_score)
+        with metrics.span("retrieval"):
+            cv_text = build_cv_context(retriever, jd_text, line_vectors, local_score=local_score, stats=stats)
+        chain_input = {"cv_text": cv_text, "jd_text": jd_text}
 
+        report("llm")
         print(" Đang phân tích với Gemini 1.5 Flash...")
-        result = chain.invoke(jd_text)
-        
-        vectorstore.delete_collection() 
-        return result
+        if on_partial is not None:
+            result = stream_llm_result(chain, chain_input, on_partial, local_score=local_score, stats=stats)
+        else:
+            with metrics.span("llm"):
+                message = invoke_with_backoff(chain, chain_input)
+            record_llm_usage(message, stats)
+            result = finalize_llm_output(message_text(message.content), chain_input, local_score=local_score, stats=stats)
+        return merge_local_scores(result, local_score)
 
+    except LlmAdmissionError as e:
+        # Hủy / quá tải hàng đợi: đã đếm trong dss_llm_queue_wait_seconds, không phải lỗi phân tích
+        print(f" [LLM] {e}")
+        return {"error": str(e)}
     except Exception as e:
         # In lỗi chi tiết ra console server để debug
+        metrics.ERRORS.inc(stage="analysis")
         print(f" LỖI PHÂN TÍCH: {str(e)}")
         return {"error": f"Lỗi phân tích AI: {str(e)}"}
+
+# --- WARM-UP (gọi ở background từ lifespan) ---
+# cold -> warming -> warm | error
+_warm_state: Dict[str, Dict[str, Union[str, float, None]]] = {
+    name: {"status": "cold", "seconds": None, "error": None}
+    for name in ("modules", "embeddings", "llm")
+}
+
+def _warm_phase(name: str, fn: Callable[[], None]):
+    state = _warm_state[name]
+    state["status"] = "warming"
+    started = time.perf_counter()
+    try:
+        fn()
+        state["status"] = "warm"
+    except Exception as e:
+        state["status"] = "error"
+        state["error"] = str(e)
+    state["seconds"] = round(time.perf_counter() - started, 3)
+    print(f" [WARMUP] {name}: {state['status']} in {state['seconds']}s" + (f" ({state['error']})" if state["error"] else ""))
+
+def _import_heavy_modules():
+    import langchain_core.prompts  # noqa: F401
+    import langchain_core.output_parsers  # noqa: F401
+    import langchain_google_genai  # noqa: F401
+    if not cpu_pool.enabled:
+        import_backend_modules()
+    import retriever  # noqa: F401
+
+def warm_up():
+    """Nạp module nặng, tải + chạy thử MiniLM 1 lần, khởi tạo client Gemini. Không gọi API Gemini."""
+    started = time.perf_counter()
+    _warm_phase("modules", _import_heavy_modules)
+    if cpu_pool.enabled:
+        _warm_phase("embeddings", lambda: cpu_pool.warm_up(EMBEDDING_MODEL, EMBEDDING_BACKEND))
+    else:
+        _warm_phase("embeddings", lambda: get_embeddings().embed_query("warm up"))
+    _warm_phase("llm", get_llm)
+    print(f" [WARMUP] Finished in {time.perf_counter() - started:.3f}s")
+
+def preload_models():
+    """
+    Gọi trong gunicorn master (preload_app, xem gunicorn.conf.py) trước khi fork worker: module nặng và trọng số
+    MiniLM nằm sẵn trong bộ nhớ master, các worker dùng chung theo copy-on-write thay vì mỗi worker nạp 1 bản.
+    Không chạy inference ở đây: thread pool của torch / ONNX Runtime tạo ra trước fork sẽ treo trong worker.
+    """
+    started = time.perf_counter()
+    try:
+        _import_heavy_modules()
+    except Exception as e:
+        # Worker sẽ thử lại trong warm_up() và báo qua /api/ready
+        print(f" [BOOT] Preload import warning: {e}")
+    if cpu_pool.enabled:
+        pass  # Worker không giữ model: forkserver của cpu_pool nạp 1 bản cho các process con (pool_preload.py)
+    elif EMBEDDING_BACKEND == "hf":
+        get_embeddings()
+    else:
+        # InferenceSession tạo thread pool ngay khi khởi tạo -> chỉ tải sẵn file, mỗi worker tự tạo session sau fork
+        onnx_files(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+    print(f" [BOOT] Preloaded models in {time.perf_counter() - started:.3f}s")
+
+def readiness() -> Dict[str, object]:
+    components = {name: dict(state) for name, state in _warm_state.items()}
+    return {
+        "ready": all(state["status"] == "warm" for state in _warm_state.values()),
+        "components": components,
+    }
@@ -0,0 +1,207 @@
+# backend/cpu_pool.py
+"""
+Process pool riêng cho phần CPU nặng của 1 lần phân tích (bật bằng CPU_WORKERS > 0, mặc định tắt):
+- parse PDF: trích text bằng pdfplumber (ingest._extract_range), gọi qua core_logic.load_cv_splits.
+  PDF ngắn = 1 task, PDF dài chia đoạn trang cho nhiều process con (thay cho pool spawn riêng của ingest.py);
+  đếm trang + text splitter (nhẹ) vẫn chạy ở process server,
+- embedding: get_embeddings() trả về PooledEmbeddings -> mọi embed_documents / embed_query
+  (retriever, scoring, batch, jd_index) chạy trong process con.
+Thread của uvicorn / job worker chỉ gửi bytes/text sang rồi chờ kết quả, không còn giữ GIL
+trong lúc pdfplumber / MiniLM chạy -> request khác (list JD, poll job, SSE) không bị chậm theo.
+
+Process con được tạo từ forkserver (process 1 thread, đã import sẵn các module nặng trong
+FORKSERVER_PRELOAD -> các con dùng chung phần đó theo copy-on-write). Không fork thẳng từ process
+server vì lúc đó đã có thread (job worker, torch, ONNX Runtime).
+Backend hf: forkserver nạp sẵn trọng số MiniLM (pool_preload.py, không chạy inference) -> mỗi worker
+gunicorn có 1 bản model dùng chung cho CPU_WORKERS process con, không phải CPU_WORKERS bản.
+Backend onnx: InferenceSession tạo thread pool ngay khi khởi tạo, không sống qua fork -> mỗi con tự tạo
+session ở lần embed đầu (file model nhỏ, đọc từ page cache dùng chung).
+"""
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ingest import _extract_range, ingest_pdf
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0"))
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "forkserver")
+FORKSERVER_PRELOAD = ["numpy", "pdfplumber", "embedding_backends", "ingest", "core_logic", "pool_preload"]
+
+# --- Phía process con ---
+_in_worker = False
+_worker_threads = 0
+_worker_embeddings: Dict[str, Embeddings] = {}
+
+
+def _init_worker(threads: int):
+    global _in_worker, _worker_threads
+    _in_worker = True
+    _worker_threads = threads
+    # Model hf nạp sẵn trong forkserver chưa đặt số thread (lúc đó chưa biết pool có bao nhiêu process)
+    if threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def preload_worker_embeddings(model_name: str, backend: str):
+    """Chạy trong forkserver (pool_preload.py): nạp trọng số trước khi fork các process con."""
+    if backend != "hf":
+        return
+    try:
+        from embedding_backends import load_embeddings
+
+        _worker_embeddings[f"{backend}:{model_name}"] = load_embeddings(model_name, backend=backend)
+    except Exception as e:
+        # Không để lỗi tải model làm chết forkserver: process con sẽ tự nạp lại ở lần embed đầu
+        print(f" [CPU_POOL] Forkserver preload warning: {e}")
+
+
+def _embeddings_for(model_name: str, backend: str) -> Embeddings:
+    key = f"{backend}:{model_name}"
+    if key not in _worker_embeddings:
+        from embedding_backends import load_embeddings
+
+        _worker_embeddings[key] = load_embeddings(model_name, backend=backend, threads=_worker_threads)
+    return _worker_embeddings[key]
+
+
+def _embed_task(model_name: str, backend: str, texts: List[str]) -> np.ndarray:
+    # ndarray pickle nhanh hơn nhiều so với list[list[float]]
+    return np.asarray(_embeddings_for(model_name, backend).embed_documents(texts), dtype=np.float32)
+
+
+def _warm_task(model_name: str, backend: str) -> int:
+    _embeddings_for(model_name, backend).embed_query("warm up")
+    return os.getpid()
+
+
+# --- Phía server ---
+def _default_threads(workers: int) -> int:
+    from embedding_backends import EMBEDDING_THREADS
+
+    if EMBEDDING_THREADS:
+        return EMBEDDING_THREADS
+    # Chia đều core cho mọi process con của mọi worker gunicorn, tránh oversubscription
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // (workers * web_workers))
+
+
+def _mp_context():
+    if CPU_POOL_START_METHOD == "forkserver" and "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class CpuPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.tasks = {"ingest": 0, "embed": 0}
+        self.task_seconds = 0.0
+        self.broken = 0
+
+    @property
+    def enabled(self) -> bool:
+        # Process con cũng đọc CPU_WORKERS nhưng phải tự làm, không gửi tiếp sang pool
+        return self.workers > 0 and not _in_worker
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                threads = _default_threads(self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=_mp_context(),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+                print(f" [CPU_POOL] Started pool: {self.workers} processes, {threads} embedding threads each")
+            return self._executor
+
+    def _run_many(self, kind: str, calls: List[tuple]) -> List[Any]:
+        executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            futures = [executor.submit(*call) for call in calls]
+            results = [f.result() for f in futures]
+        except BrokenProcessPool:
+            # 1 process con chết (OOM...) làm hỏng cả pool -> bỏ pool này, lần gọi sau tạo pool mới
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                    self.broken += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+            print(" [CPU_POOL] Pool broken (worker process died), will restart on next task")
+            raise
+        with self._lock:
+            self.tasks[kind] += len(calls)
+            self.task_seconds += time.perf_counter() - started
+        return results
+
+    def _run_ranges(self, data: bytes, ranges) -> List[Any]:
+        return self._run_many("ingest", [(_extract_range, data, start, end) for start, end in ranges])
+
+    def ingest_pdf(self, data: bytes, source: str = "upload"):
+        """ingest.ingest_pdf, phần trích text từng trang chạy trong pool. Raise IngestError."""
+        if not self.enabled:
+            return ingest_pdf(data, source=source)
+        return ingest_pdf(data, source=source, run_ranges=self._run_ranges, processes=self.workers)
+
+    def embed(self, model_name: str, backend: str, texts: List[str], batch_size: int) -> np.ndarray:
+        # Lô lớn (vd: /api/analyze/batch embed chunk của nhiều CV 1 lần) -> chia cho nhiều process con
+        parts = max(1, min(self.workers, len(texts) // max(1, batch_size)))
+        step = -(-len(texts) // parts)
+        calls = [(_embed_task, model_name, backend, texts[i:i + step]) for i in range(0, len(texts), step)]
+        return np.concatenate(self._run_many("embed", calls)) if calls else np.empty((0, 0), dtype=np.float32)
+
+    def warm_up(self, model_name: str, backend: str) -> int:
+        """Gửi đồng thời `workers` lượt warm-up -> pool tạo đủ process con, mỗi con nạp model sẵn."""
+        calls = [(_warm_task, model_name, backend)] * self.workers
+        return len(set(self._run_many("embed", calls)))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "tasks": dict(self.tasks),
+            "task_seconds": round(self.task_seconds, 3),
+            "broken": self.broken,
+        }
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings của langchain nhưng tính trong cpu_pool, dùng thay model thật ở process server."""
+
+    def __init__(self, pool: CpuPool, model_name: str, backend: str, batch_size: int):
+        self.pool = pool
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.pool.embed(self.model_name, self.backend, list(texts), self.batch_size).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+cpu_pool = CpuPool(CPU_WORKERS)
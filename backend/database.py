@@ -1,17 +1,60 @@
 import os
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, create_engine, Session
 
-# Lấy biến môi trường DATABASE_URL 
+# Lấy biến môi trường DATABASE_URL
 # Nếu không có (đang chạy local), thì dùng file database.db
 database_url = os.getenv("DATABASE_URL")
 
-if database_url:
+# --- CẤU HÌNH POOL (chỉnh qua biến môi trường) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))        # Giây chờ lấy connection khi pool đầy
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # Đóng connection sống quá N giây
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"    # SELECT 1 trước khi dùng -> bỏ connection chết
+# "queue" (mặc định) hoặc "null" (mỗi request 1 connection mới, để pgbouncer tự pool)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue")
+
+def _is_pgbouncer(url: str) -> bool:
+    # Supabase Transaction Pooler chạy pgbouncer trên port 6543
+    flag = os.getenv("DB_PGBOUNCER")
+    if flag is not None:
+        return flag == "1"
+    return ":6543" in url or "pooler.supabase.com" in url
+
+def _postgres_engine_kwargs(url: str) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"echo": False, "pool_pre_ping": DB_POOL_PRE_PING}
+    if DB_POOL_MODE == "null":
+        kwargs["poolclass"] = NullPool
+    else:
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            # LIFO: giữ ít connection "nóng", connection thừa tự hết hạn theo pool_recycle
+            pool_use_lifo=True,
+        )
+    return kwargs
+
+PGBOUNCER_MODE = False
+
+if database_url and database_url.startswith("sqlite"):
+    # SQLITE qua DATABASE_URL (vd: sqlite:///database.db như README)
+    sqlite_url = database_url
+    database_url = None
+    engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+elif database_url:
     #  CẤU HÌNH CHO RENDER (POSTGRESQL)
     if database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
-    
+
+    PGBOUNCER_MODE = _is_pgbouncer(database_url)
     # Kết nối Postgres
-    engine = create_engine(database_url, echo=False)
+    # psycopg2 không dùng server-side prepared statement nên an toàn với pgbouncer transaction mode
+    engine = create_engine(database_url, **_postgres_engine_kwargs(database_url))
 else:
     # SQLITE - LOCAL TESTING
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -20,9 +63,95 @@ else:
     connect_args = {"check_same_thread": False}
     engine = create_engine(sqlite_url, connect_args=connect_args)
 
+_schema_ready = False
+
 def create_db_and_tables():
+    global _schema_ready
+    # Gunicorn (preload_app) đã chạy ở master trước khi fork -> các worker không chạy migration đua nhau
+    if _schema_ready:
+        return
+    from migrations import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    _schema_ready = True
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+# --- ASYNC ENGINE (tùy chọn: asyncpg cho Postgres, aiosqlite cho SQLite) ---
+_async_engine = None
+
+def _async_url(url: str) -> Tuple[str, Dict[str, Any]]:
+    """Đổi URL sync sang driver async. Trả về (url, connect_args)."""
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1), {}
+    if not url.startswith("postgresql://"):
+        return url, {}
+    # asyncpg không hiểu ?sslmode=... của libpq (Supabase/Render đều gắn sẵn) -> chuyển sang tham số ssl.
+    # asyncpg nhận thẳng các giá trị disable/allow/prefer/require/verify-ca/verify-full.
+    parsed = make_url(url.replace("postgresql://", "postgresql+asyncpg://", 1))
+    connect_args: Dict[str, Any] = {}
+    sslmode = parsed.query.get("sslmode")
+    if sslmode:
+        connect_args["ssl"] = sslmode if isinstance(sslmode, str) else sslmode[-1]
+        parsed = parsed.difference_update_query(["sslmode"])
+    return parsed.render_as_string(hide_password=False), connect_args
+
+def get_async_engine():
+    """Tạo lười async engine cùng DB với engine sync. Cần cài asyncpg hoặc aiosqlite."""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        if database_url:
+            kwargs = _postgres_engine_kwargs(database_url)
+            url, connect_args = _async_url(database_url)
+            if PGBOUNCER_MODE:
+                # asyncpg cache prepared statement theo connection -> vỡ khi pgbouncer đổi backend.
+                # Tắt cache + đặt tên statement ngẫu nhiên để không đụng nhau giữa các client.
+                import uuid
+
+                connect_args.update(
+                    statement_cache_size=0,
+                    prepared_statement_cache_size=0,
+                    prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4().hex}__",
+                )
+            _async_engine = create_async_engine(url, connect_args=connect_args, **kwargs)
+        else:
+            _async_engine = create_async_engine(_async_url(sqlite_url)[0])
+    return _async_engine
+
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+def pool_stats(target_engine=None) -> Optional[Dict[str, Any]]:
+    target_engine = target_engine or engine
+    pool = target_engine.pool
+    stats: Dict[str, Any] = {"pool_class": type(pool).__name__, "status": pool.status()}
+    # Chỉ QueuePool/AsyncAdaptedQueuePool mới có các số liệu này
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    if hasattr(pool, "_max_overflow"):
+        stats["max_overflow"] = pool._max_overflow
+    return stats
+
+def all_pool_stats() -> Dict[str, Any]:
+    return {
+        "dialect": engine.dialect.name,
+        "pgbouncer_mode": PGBOUNCER_MODE,
+        "sync": pool_stats(engine),
+        "async": pool_stats(_async_engine.sync_engine) if _async_engine is not None else None,
+    }
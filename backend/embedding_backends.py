@@ -0,0 +1,178 @@
+# backend/embedding_backends.py
+"""
+Backend embedding cho get_embeddings(), chọn bằng EMBEDDING_BACKEND:
+- "hf" (mặc định): HuggingFaceEmbeddings (sentence-transformers trên PyTorch) như trước.
+- "onnx": cùng all-MiniLM-L6-v2 nhưng chạy bằng ONNX Runtime + tokenizers, không cần PyTorch lúc chạy.
+- "onnx-int8": bản ONNX lượng tử hóa int8 (dynamic quantization): file nhỏ ~4 lần, nhanh hơn trên CPU.
+  Vector lệch nhẹ so với fp32 nên có EMBEDDING_ID riêng -> artifact CV, index JD và cache phân tích được tính lại.
+Mọi backend trả vector đã chuẩn hóa L2 (retriever/scoring dùng tích vô hướng làm cosine).
+
+File ONNX lấy từ thư mục onnx/ của repo model trên Hugging Face Hub (cache theo HF_HOME như bản PyTorch),
+hoặc file local qua EMBEDDING_ONNX_PATH. Tự lượng tử hóa 1 file fp32:
+    python embedding_backends.py quantize model.onnx model_int8.onnx
+"""
+import os
+import argparse
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+BACKENDS = ("hf", "onnx", "onnx-int8")
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hf")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = để PyTorch / ONNX Runtime tự chọn
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH")  # File .onnx local thay cho bản tải từ Hub
+EMBEDDING_MAX_LENGTH = 256  # max_seq_length của all-MiniLM-L6-v2 (sentence-transformers cắt ở đây)
+
+# File trong repo model trên Hub (sentence-transformers xuất sẵn; quint8_avx2 chạy được trên mọi CPU x86-64 hiện đại)
+ONNX_HUB_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+
+class EmbeddingConfigError(ValueError):
+    pass
+
+
+def embedding_id(model_name: str, backend: str = EMBEDDING_BACKEND) -> str:
+    """Định danh không gian vector: hf và onnx (cùng fp32) cho vector như nhau nên dùng chung, int8 thì khác."""
+    return f"{model_name}#int8" if backend == "onnx-int8" else model_name
+
+
+class OnnxEmbeddings(Embeddings):
+    """MiniLM trên ONNX Runtime: tokenizers (Rust) -> last_hidden_state -> mean pooling theo attention mask -> L2."""
+
+    def __init__(
+        self,
+        model_path: str,
+        tokenizer_path: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.model_path = model_path
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.output_name = "last_hidden_state" if "last_hidden_state" in outputs else outputs[0]
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()  # Pad tới câu dài nhất trong batch, không phải max_length
+        self.batch_size = max(1, batch_size)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run([self.output_name], feeds)[0]
+        # Giống Pooling(mean) + Normalize của sentence-transformers
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (pooled / norms).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Sắp theo độ dài -> text trong cùng batch dài gần bằng nhau, ít token padding phải tính
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: Optional[np.ndarray] = None
+        for start in range(0, len(order), self.batch_size):
+            index = order[start:start + self.batch_size]
+            vectors = self._embed_batch([texts[i] for i in index])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[index] = vectors
+        return out.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _load_hf(model_name: str, batch_size: int, threads: int) -> Embeddings:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    # Dùng Hugging Face (CPU) để không cần Key Google ở bước này
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": batch_size},
+    )
+
+
+def onnx_files(model_name: str, backend: str):
+    """(model.onnx, tokenizer.json): tải từ Hub lần đầu, sau đó lấy từ cache HF_HOME."""
+    from huggingface_hub import hf_hub_download
+
+    tokenizer_path = hf_hub_download(model_name, "tokenizer.json")
+    model_path = EMBEDDING_ONNX_PATH or hf_hub_download(model_name, ONNX_HUB_FILES[backend])
+    return model_path, tokenizer_path
+
+
+def load_embeddings(
+    model_name: str,
+    backend: str = EMBEDDING_BACKEND,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    threads: int = EMBEDDING_THREADS,
+) -> Embeddings:
+    if backend not in BACKENDS:
+        raise EmbeddingConfigError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+    print(f" [EMBED] Loading {model_name} with backend={backend}, batch_size={batch_size}, threads={threads or 'auto'}")
+    if backend == "hf":
+        return _load_hf(model_name, batch_size, threads)
+    model_path, tokenizer_path = onnx_files(model_name, backend)
+    return OnnxEmbeddings(model_path, tokenizer_path, batch_size=batch_size, threads=threads)
+
+
+def import_backend_modules(backend: str = EMBEDDING_BACKEND):
+    """Cho warm-up: chỉ nạp thư viện của backend đang dùng (image ONNX có thể không cài PyTorch)."""
+    if backend == "hf":
+        import langchain_huggingface  # noqa: F401
+    else:
+        import onnxruntime  # noqa: F401
+        import tokenizers  # noqa: F401
+
+
+def quantize(source: str, target: str):
+    """Dynamic quantization int8 (weights QUInt8, activation tính lúc chạy) - cần thêm package onnx."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    print(f" [EMBED] Quantized {source} ({os.path.getsize(source) / 1e6:.1f} MB) -> {target} ({os.path.getsize(target) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiện ích cho backend embedding ONNX")
+    sub = parser.add_subparsers(dest="command", required=True)
+    q = sub.add_parser("quantize", help="Lượng tử hóa int8 1 file ONNX fp32")
+    q.add_argument("source")
+    q.add_argument("target")
+    f = sub.add_parser("fetch", help="Tải sẵn file ONNX + tokenizer vào cache (dùng khi build image)")
+    f.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    f.add_argument("--backend", choices=BACKENDS[1:], default=None, help="Mặc định: tải cả onnx và onnx-int8")
+    args = parser.parse_args()
+    if args.command == "quantize":
+        quantize(args.source, args.target)
+    else:
+        for backend in [args.backend] if args.backend else BACKENDS[1:]:
+            print(" [EMBED] Cached:", onnx_files(args.model, backend))
@@ -0,0 +1,57 @@
+# backend/gunicorn.conf.py
+"""
+Chế độ nhiều process: 1 gunicorn master + WEB_CONCURRENCY worker uvicorn, mỗi worker 1 GIL riêng.
+    cd backend
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py server:app
+
+preload_app: master import server, chạy migration và nạp trọng số MiniLM 1 lần (core_logic.preload_models)
+rồi mới fork -> các worker dùng chung model theo copy-on-write, không worker nào chạy migration đua nhau.
+Mỗi worker có job queue, llm_scheduler, cache RAM riêng; cache kết quả / kho artifact dùng chung qua DB.
+Trạng thái job ghi vào DB (ANALYSIS_JOB_STORE=db, jobs.py) nên poll / SSE / DELETE rơi vào worker khác vẫn
+trả lời được. Cache RAM theo user tự làm mới qua DB: jd_index kiểm tra version, guest bị xóa báo qua bảng purgeduser.
+Kết hợp được với CPU_WORKERS (cpu_pool.py) để tách parse PDF + embedding sang process pool: mỗi worker có
+pool + forkserver riêng, model nạp 1 lần trong forkserver -> tổng WEB_CONCURRENCY bản model (backend hf),
+không phải WEB_CONCURRENCY x CPU_WORKERS. Cần tiết kiệm RAM hơn: WEB_CONCURRENCY=1 + CPU_WORKERS=N.
+"""
+import gc
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '7860')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Worker uvicorn là async: timeout chỉ là heartbeat của worker, không giới hạn SSE / request dài
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# File này chạy trước khi import app, nên sửa biến môi trường ở đây là kịp cho các module đọc lúc import.
+os.environ["WEB_CONCURRENCY"] = str(workers)  # cpu_pool chia core theo số worker
+# Job chỉ nằm trong RAM của worker đã nhận POST -> poll rơi vào worker khác sẽ 404
+if workers > 1 and os.getenv("ANALYSIS_JOB_STORE", "db") != "db":
+    raise SystemExit("ANALYSIS_JOB_STORE=memory chỉ dùng được với WEB_CONCURRENCY=1 (job không dùng chung giữa các worker)")
+# Quota Gemini là của cả server nhưng llm_scheduler giữ bucket trong RAM từng process -> chia đều.
+# Giữ giá trị gốc ở *_TOTAL để reload config (SIGHUP) không chia thêm lần nữa.
+for _name in ("LLM_RPM_LIMIT", "LLM_TPM_LIMIT"):
+    _total = int(os.environ.setdefault(f"{_name}_TOTAL", os.getenv(_name, "0")))
+    if _total:
+        os.environ[_name] = str(max(1, _total // workers))
+# Mặc định torch / ONNX Runtime dùng mọi core trong MỖI worker -> N worker tranh nhau, chậm hơn 1 worker
+if not os.getenv("EMBEDDING_THREADS") and int(os.getenv("CPU_WORKERS", "0")) == 0:
+    os.environ["EMBEDDING_THREADS"] = str(max(1, (os.cpu_count() or 1) // workers))
+
+
+def on_starting(server):
+    # Chạy trong master sau khi preload app, trước khi fork worker
+    from core_logic import preload_models
+    from database import create_db_and_tables, engine
+
+    try:
+        create_db_and_tables()
+    except Exception as e:
+        print(f"[DBA] Database connection warning: {e}")
+    # Không để worker thừa kế connection của master (1 socket dùng chung giữa nhiều process)
+    engine.dispose()
+    preload_models()
+    # Object đã có trong master không bị GC của worker quét (ghi refcount/header) -> page dùng chung ít bị copy
+    gc.freeze()
@@ -0,0 +1,168 @@
+# backend/ingest.py
+import io
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Giới hạn upload, kiểm tra TRƯỚC khi parse (chỉnh qua biến môi trường)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "30"))
+# CV dài hơn ngưỡng này mới tách trang ra process pool (CV 1-3 trang thì chạy thẳng nhanh hơn)
+INGEST_PARALLEL_PAGES = int(os.getenv("INGEST_PARALLEL_PAGES", "6"))
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+PageRange = Tuple[int, int]
+# (bytes PDF, các đoạn trang [start, end)) -> kết quả _extract_range của từng đoạn, theo thứ tự
+RangeRunner = Callable[[bytes, List[PageRange]], Iterable[List[Tuple[int, str, float]]]]
+
+
+class IngestError(ValueError):
+    pass
+
+
+@dataclass
+class IngestResult:
+    splits: List[Any]
+    page_count: int
+    page_timings: List[float] = field(default_factory=list)  # Giây cho mỗi trang, theo thứ tự trang
+    total_seconds: float = 0.0
+    split_seconds: float = 0.0  # Phần thời gian của text splitter (còn lại là trích text + mở PDF)
+    parallel: bool = False
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "pages": self.page_count,
+            "chunks": len(self.splits),
+            "parallel": self.parallel,
+            "total_ms": round(self.total_seconds * 1000, 1),
+            "split_ms": round(self.split_seconds * 1000, 1),
+            "page_ms": [round(t * 1000, 1) for t in self.page_timings],
+        }
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn thay vì fork: process cha đang có thread (worker pool, torch) nên fork không an toàn
+        _process_pool = ProcessPoolExecutor(
+            max_workers=INGEST_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def check_upload_size(size: Optional[int]):
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise IngestError(f"File quá lớn ({size // 1024} KB). Giới hạn là {MAX_UPLOAD_BYTES // 1024} KB.")
+
+
+def _extract_range(data: bytes, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """Chạy được trong process con: mở PDF từ bytes và trích text các trang [start, end)."""
+    import pdfplumber
+
+    out = []
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for i in range(start, end):
+            t0 = time.perf_counter()
+            text = pdf.pages[i].extract_text() or ""
+            out.append((i, text, time.perf_counter() - t0))
+    return out
+
+
+def count_pages(data: bytes) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+def page_ranges(page_count: int, parts: int) -> List[PageRange]:
+    step = -(-page_count // max(1, parts))  # ceil
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def _run_in_process_pool(data: bytes, ranges: List[PageRange]) -> Iterator[List[Tuple[int, str, float]]]:
+    pool = get_process_pool()
+    futures = [pool.submit(_extract_range, data, start, end) for start, end in ranges]
+    # Lấy kết quả theo thứ tự range -> splitter nhận trang đầu ngay khi range đầu xong
+    for future in futures:
+        yield future.result()
+
+
+def iter_pages(
+    data: bytes, page_count: int, run_ranges: Optional[RangeRunner] = None, processes: int = INGEST_PROCESSES
+) -> Iterator[Tuple[int, str, float]]:
+    """
+    Yield (page_index, text, seconds) theo đúng thứ tự trang.
+    run_ranges: nơi chạy các đoạn trang, mặc định pool spawn riêng của file này (chỉ khi PDF dài);
+    cpu_pool truyền pool của nó vào -> mọi đoạn (kể cả PDF ngắn = 1 đoạn) chạy trong process con.
+    """
+    parallel = page_count > INGEST_PARALLEL_PAGES and processes > 1
+    if run_ranges is None:
+        if not parallel:
+            yield from _extract_range(data, 0, page_count)
+            return
+        run_ranges = _run_in_process_pool
+    for pages in run_ranges(data, page_ranges(page_count, processes if parallel else 1)):
+        yield from pages
+
+
+def ingest_pdf(
+    data: bytes, source: str = "upload", run_ranges: Optional[RangeRunner] = None, processes: int = INGEST_PROCESSES
+) -> IngestResult:
+    """
+    Parse PDF trực tiếp từ bytes trong RAM (không ghi file tạm), cắt chunk theo từng trang ngay khi trang đó xong.
+    run_ranges / processes: xem iter_pages.
+    Raise IngestError nếu file quá lớn, quá nhiều trang, hoặc không có text.
+    """
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from core_logic import CHUNK_SIZE, CHUNK_OVERLAP
+
+    check_upload_size(len(data))
+    started = time.perf_counter()
+    try:
+        page_count = count_pages(data)
+    except Exception as e:
+        raise IngestError(f"Lỗi đọc PDF: {str(e)}")
+    if page_count == 0:
+        raise IngestError("Không thể đọc nội dung từ file PDF.")
+    if page_count > MAX_PDF_PAGES:
+        raise IngestError(f"PDF có {page_count} trang, vượt giới hạn {MAX_PDF_PAGES} trang.")
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    splits = []
+    page_timings = [0.0] * page_count
+    split_seconds = 0.0
+    for page_index, text, seconds in iter_pages(data, page_count, run_ranges, processes):
+        page_timings[page_index] = seconds
+        if not text.strip():
+            continue
+        page_doc = Document(
+            page_content=text,
+            metadata={"source": source, "page": page_index, "total_pages": page_count},
+        )
+        t0 = time.perf_counter()
+        splits.extend(text_splitter.split_documents([page_doc]))
+        split_seconds += time.perf_counter() - t0
+
+    if not splits:
+        raise IngestError("Không thể đọc nội dung từ file PDF.")
+
+    result = IngestResult(
+        splits=splits,
+        page_count=page_count,
+        page_timings=page_timings,
+        total_seconds=time.perf_counter() - started,
+        split_seconds=split_seconds,
+        parallel=page_count > INGEST_PARALLEL_PAGES and processes > 1,
+    )
+    report = result.report()
+    print(f" [INGEST] {source}: {report['pages']} pages -> {report['chunks']} chunks in {report['total_ms']} ms (per page: {report['page_ms']})")
+    return result
@@ -0,0 +1,248 @@
+# backend/jd_index.py
+"""
+Index vector cho thư viện JD của từng user: "JD nào hợp với CV này nhất" trong vài ms
+thay vì chạy đủ pipeline phân tích cho từng JD.
+- Vector của 1 JD = trung bình (chuẩn hóa L2) embedding các dòng JD -> JD dài không bị MiniLM cắt ở 256 token.
+- Vector của CV = trung bình chunk embedding trong kho artifact (artifacts.py).
+- Postgres có pgvector (migration 0003): truy vấn bằng toán tử <=> trên index HNSW.
+  Còn lại (SQLite, Postgres không có extension): brute-force NumPy trên ma trận JD của user, cache trong RAM.
+
+Index các JD có sẵn:  python jd_index.py backfill [--user <uuid>] [--batch 64]
+"""
+import os
+import time
+import uuid
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, or_, text
+from sqlmodel import Session, select
+
+from cache import LRUCache, normalize_jd_text
+from core_logic import EMBEDDING_ID, get_embeddings
+from database import engine
+from models import JdEmbedding, JobDescription
+from scoring import parse_jd_requirements
+
+JD_INDEX_CACHE_SIZE = int(os.getenv("JD_INDEX_CACHE_SIZE", "256"))  # Số user giữ ma trận JD trong RAM
+JD_MATCH_MAX_K = 50
+
+JD_INDEX_FINGERPRINT = hashlib.sha256(repr((EMBEDDING_ID, "mean-of-jd-lines")).encode("utf-8")).hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_jds(contents: Sequence[str]) -> np.ndarray:
+    """1 lời gọi embed_documents cho mọi dòng của mọi JD, rồi lấy trung bình theo từng JD."""
+    lines_per_jd = [
+        [r.text for r in parse_jd_requirements(content)] or [normalize_jd_text(content) or "-"]
+        for content in contents
+    ]
+    flat = [line for lines in lines_per_jd for line in lines]
+    vectors = np.asarray(get_embeddings().embed_documents(flat), dtype=np.float32)
+    out = np.zeros((len(contents), vectors.shape[1]), dtype=np.float32)
+    offset = 0
+    for i, lines in enumerate(lines_per_jd):
+        out[i] = vectors[offset:offset + len(lines)].mean(axis=0)
+        offset += len(lines)
+    return normalize_rows(out)
+
+
+def cv_vector(matrix: Any) -> np.ndarray:
+    return normalize_rows(np.asarray(matrix, dtype=np.float32).mean(axis=0, keepdims=True))[0]
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+class JdIndex:
+    def __init__(self, cache_size: int):
+        # user_id -> (danh sách jd_id, ma trận float32 n_jds x dim, version lúc đọc - xem _version)
+        self.memory = LRUCache(maxsize=cache_size)
+        self._pgvector: Optional[bool] = None
+        self.indexed = 0
+        self.queries = 0
+
+    def pgvector_enabled(self) -> bool:
+        """Có cột jdembedding.vec (migration 0003 chạy thành công) hay không. Kiểm tra 1 lần."""
+        if self._pgvector is None:
+            self._pgvector = False
+            if engine.dialect.name == "postgresql":
+                try:
+                    with engine.connect() as conn:
+                        self._pgvector = conn.execute(text(
+                            "SELECT 1 FROM information_schema.columns "
+                            "WHERE table_name = 'jdembedding' AND column_name = 'vec'"
+                        )).first() is not None
+                except Exception as e:
+                    print(f" [JD_INDEX] pgvector check warning: {e}")
+        return self._pgvector
+
+    # --- Ghi ---
+    def index_jds(self, session: Session, jds: Sequence[JobDescription]) -> int:
+        if not jds:
+            return 0
+        matrix = embed_jds([jd.content for jd in jds])
+        now = datetime.now()
+        for jd, vector in zip(jds, matrix):
+            session.merge(JdEmbedding(
+                jd_id=jd.id,
+                user_id=jd.user_id,
+                fingerprint=JD_INDEX_FINGERPRINT,
+                jd_updated_at=jd.updated_at,
+                embedding=vector.tobytes(),
+                updated_at=now,
+            ))
+        session.commit()
+        if self.pgvector_enabled():
+            for jd, vector in zip(jds, matrix):
+                session.execute(
+                    text("UPDATE jdembedding SET vec = CAST(:vec AS vector) WHERE jd_id = :jd_id"),
+                    {"vec": _vector_literal(vector), "jd_id": jd.id},
+                )
+            session.commit()
+        for user_id in {jd.user_id for jd in jds}:
+            self.memory.pop(user_id)
+        self.indexed += len(jds)
+        return len(jds)
+
+    def remove(self, session: Session, jd_id: int, user_id):
+        session.execute(delete(JdEmbedding).where(JdEmbedding.jd_id == jd_id))
+        self.memory.pop(user_id)
+
+    def stale_query(self, user_id=None):
+        """JD chưa có vector, vector của model khác, hoặc JD đã sửa sau khi embed."""
+        conditions = [
+            JdEmbedding.jd_id.is_(None),
+            JdEmbedding.fingerprint != JD_INDEX_FINGERPRINT,
+            JdEmbedding.jd_updated_at.is_distinct_from(JobDescription.updated_at),
+        ]
+        if self.pgvector_enabled():
+            conditions.append(text("jdembedding.vec IS NULL"))
+        query = (
+            select(JobDescription)
+            .outerjoin(JdEmbedding, JdEmbedding.jd_id == JobDescription.id)
+            .where(or_(*conditions))
+        )
+        if user_id is not None:
+            query = query.where(JobDescription.user_id == user_id)
+        return query.order_by(JobDescription.id)
+
+    def ensure_user_indexed(self, session: Session, user_id) -> int:
+        """Index bù các JD còn thiếu/cũ của user (vd: tác vụ nền lúc tạo JD chưa kịp chạy)."""
+        return self.index_jds(session, session.exec(self.stale_query(user_id)).all())
+
+    # --- Đọc ---
+    def _version(self, session: Session, user_id) -> Tuple[int, Any]:
+        """Số vector + lần index gần nhất của user: đổi khi có JD được index / xóa ở bất kỳ process nào."""
+        row = session.exec(
+            select(func.count(), func.max(JdEmbedding.updated_at))
+            .where(JdEmbedding.user_id == user_id, JdEmbedding.fingerprint == JD_INDEX_FINGERPRINT)
+        ).one()
+        return row[0], row[1]
+
+    def _user_matrix(self, session: Session, user_id) -> Tuple[List[int], np.ndarray]:
+        # index_jds / remove chỉ bỏ cache của process đang ghi -> worker khác kiểm tra version (1 truy vấn nhẹ
+        # trên index user_id) trước khi dùng ma trận trong RAM
+        version = self._version(session, user_id)
+        cached = self.memory.get(user_id)
+        if cached is not None and cached[2] == version:
+            return cached[0], cached[1]
+        rows = session.exec(
+            select(JdEmbedding.jd_id, JdEmbedding.embedding)
+            .join(JobDescription, JobDescription.id == JdEmbedding.jd_id)
+            .where(JdEmbedding.user_id == user_id, JdEmbedding.fingerprint == JD_INDEX_FINGERPRINT)
+        ).all()
+        ids = [row[0] for row in rows]
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else np.zeros((0, 0), np.float32)
+        self.memory.set(user_id, (ids, matrix, version))
+        return ids, matrix
+
+    def top_k(self, session: Session, user_id, query_vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        self.queries += 1
+        if self.pgvector_enabled():
+            rows = session.execute(
+                text(
+                    "SELECT e.jd_id, 1 - (e.vec <=> CAST(:q AS vector)) AS score FROM jdembedding e "
+                    "JOIN jobdescription j ON j.id = e.jd_id "
+                    "WHERE e.user_id = CAST(:user_id AS uuid) AND e.fingerprint = :fingerprint AND e.vec IS NOT NULL "
+                    "ORDER BY e.vec <=> CAST(:q AS vector) LIMIT :k"
+                ),
+                {"q": _vector_literal(query_vector), "user_id": str(user_id), "fingerprint": JD_INDEX_FINGERPRINT, "k": k},
+            ).all()
+            return [(row.jd_id, round(float(row.score), 4)) for row in rows]
+
+        ids, matrix = self._user_matrix(session, user_id)
+        if not ids:
+            return []
+        scores = matrix @ np.asarray(query_vector, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(ids[i], round(float(scores[i]), 4)) for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "pgvector" if self.pgvector_enabled() else "numpy",
+            "indexed": self.indexed,
+            "queries": self.queries,
+            "cached_users": len(self.memory),
+        }
+
+
+jd_index = JdIndex(cache_size=JD_INDEX_CACHE_SIZE)
+
+
+def index_jd_background(jd_id: int):
+    """Chạy sau khi tạo/sửa JD (BackgroundTasks). Lỗi chỉ log ra: /api/jds/match sẽ index bù."""
+    try:
+        with Session(engine) as session:
+            jd = session.get(JobDescription, jd_id)
+            if jd is not None:
+                jd_index.index_jds(session, [jd])
+    except Exception as e:
+        print(f" [JD_INDEX] Index JD {jd_id} warning: {e}")
+
+
+def backfill(user_id=None, batch_size: int = 64) -> int:
+    """Index mọi JD chưa có vector (hoặc vector cũ), mỗi lô 1 lời gọi embed_documents."""
+    started = time.perf_counter()
+    total = 0
+    last_id = 0
+    with Session(engine) as session:
+        # Phân trang theo id: lô nào index lỗi/vẫn stale thì bỏ qua, không chặn các lô sau
+        while True:
+            jds = session.exec(
+                jd_index.stale_query(user_id)
+                .where(JobDescription.id > last_id)
+                .order_by(JobDescription.id)
+                .limit(batch_size)
+            ).all()
+            if not jds:
+                break
+            last_id = jds[-1].id
+            total += jd_index.index_jds(session, jds)
+            print(f" [JD_INDEX] Backfilled {total} JDs...")
+    print(f" [JD_INDEX] Backfill done: {total} JDs in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JD embedding index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="Index các JD chưa có vector")
+    backfill_parser.add_argument("--user", help="Chỉ index JD của user này (uuid)")
+    backfill_parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    from database import create_db_and_tables
+
+    create_db_and_tables()
+    if args.command == "backfill":
+        backfill(uuid.UUID(args.user) if args.user else None, args.batch)
@@ -0,0 +1,448 @@
+# backend/jobs.py
+"""
+Job phân tích chạy nền: hàng đợi + pool thread trong process nhận POST /api/analyze.
+ANALYSIS_JOB_STORE=db (mặc định): trạng thái job được ghi thêm vào bảng analysisjobrecord, nên với nhiều worker
+gunicorn, worker nào nhận poll / SSE / DELETE cũng trả lời được (đọc snapshot từ DB, hủy + "còn người xem"
+ghi ngược vào DB, process chạy job đọc lại tối đa 1 lần / ANALYSIS_JOB_SYNC_INTERVAL giây).
+ANALYSIS_JOB_STORE=memory: chỉ giữ trong RAM, dùng khi chạy 1 process (gunicorn.conf.py từ chối nhiều worker).
+"""
+import os
+import time
+import uuid
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, update
+from sqlmodel import Session
+
+from database import engine
+from llm_scheduler import llm_scheduler
+from models import AnalysisJobRecord
+
+# Cấu hình worker pool (chỉnh qua biến môi trường)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "16"))
+ANALYSIS_JOB_TTL = int(os.getenv("ANALYSIS_JOB_TTL", "3600"))        # Giây giữ job đã xong để client poll
+ANALYSIS_RETRY_AFTER = int(os.getenv("ANALYSIS_RETRY_AFTER", "15"))  # Gợi ý Retry-After khi hàng đợi đầy
+# Job không còn ai poll / nghe SSE quá số giây này -> coi như client đã bỏ đi, hủy trước khi tốn quota Gemini.
+# Tab nền của trình duyệt có thể chỉ chạy timer 1 lần/phút nên không để quá thấp. 0 = không bao giờ hủy.
+ANALYSIS_ABANDON_AFTER = int(os.getenv("ANALYSIS_ABANDON_AFTER", "120"))
+ANALYSIS_JOB_STORE = os.getenv("ANALYSIS_JOB_STORE", "db")  # db | memory
+# Giây tối thiểu giữa 2 lần đọc/ghi DB cho cùng 1 job (partial khi stream, kiểm tra hủy, heartbeat SSE)
+ANALYSIS_JOB_SYNC_INTERVAL = float(os.getenv("ANALYSIS_JOB_SYNC_INTERVAL", "1"))
+_DB_PURGE_INTERVAL = 60
+
+# Thứ tự các stage mà client sẽ thấy
+STAGES = ("queued", "parsing", "embedding", "scoring", "llm", "done")
+
+# fn nhận callback on_stage(stage), on_partial(dict) và trả về dict kết quả (có key "error" nếu thất bại)
+JobFn = Callable[[Callable[[str], None], Callable[[Dict[str, Any]], None]], Dict[str, Any]]
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class AnalysisJob:
+    id: str
+    user_id: Any
+    status: str = "queued"  # queued | running | done | error
+    stage: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    # Kết quả từng phần khi LLM đang stream (bị bỏ khi job xong)
+    partial: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Tăng mỗi lần job đổi trạng thái -> SSE biết khi nào cần đẩy event mới
+    version: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Lần cuối client hỏi tới job (poll) + số kết nối SSE đang mở
+    last_seen: float = field(default_factory=time.time)
+    watchers: int = 0
+    cancel_requested: bool = False
+    # Snapshot đọc từ DB: job đang chạy ở process (worker gunicorn) khác
+    remote: bool = False
+    # time.monotonic() lần đồng bộ DB gần nhất (đọc với job remote, ghi partial / đọc hủy với job của process này)
+    synced_at: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def abandoned(self, grace: int) -> bool:
+        if self.cancel_requested:
+            return True
+        return grace > 0 and self.watchers == 0 and time.time() - self.last_seen > grace
+
+    def to_record(self) -> AnalysisJobRecord:
+        return AnalysisJobRecord(
+            id=self.id,
+            user_id=self.user_id,
+            status=self.status,
+            stage=self.stage,
+            result=self.result,
+            partial=self.partial,
+            error=self.error,
+            timings=dict(self.timings),
+            version=self.version,
+            cancel_requested=self.cancel_requested,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            last_seen=self.last_seen,
+        )
+
+    @classmethod
+    def from_record(cls, record: AnalysisJobRecord) -> "AnalysisJob":
+        return cls(
+            id=record.id,
+            user_id=record.user_id,
+            status=record.status,
+            stage=record.stage,
+            result=record.result,
+            partial=record.partial,
+            error=record.error,
+            created_at=record.created_at,
+            updated_at=record.updated_at,
+            version=record.version,
+            timings=dict(record.timings or {}),
+            last_seen=record.last_seen,
+            cancel_requested=record.cancel_requested,
+            remote=True,
+            synced_at=time.monotonic(),
+        )
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "timings": self.timings,
+        }
+        if include_result and self.status == "done":
+            data["result"] = self.result
+        elif include_result and self.partial is not None:
+            data["partial"] = self.partial
+        return data
+
+
+class JobManager:
+    """
+    Hàng đợi phân tích có giới hạn + pool thread cố định.
+    Event loop của uvicorn chỉ enqueue rồi trả job_id ngay, phần nặng (pdfplumber, MiniLM, Gemini)
+    chạy trên các worker thread nên /api/jds hay / không bị đứng.
+    shared=True: job được ghi vào DB để process khác đọc được (xem docstring của module).
+    """
+
+    def __init__(self, workers: int, queue_size: int, ttl: int, abandon_after: int = 0, shared: bool = False):
+        self.workers = workers
+        self.ttl = ttl
+        self.abandon_after = abandon_after
+        self.shared = shared
+        self._db_purged_at = 0.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    # --- Vòng đời (gọi từ lifespan) ---
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f" [JOBS] Started {self.workers} analysis workers (queue size {self._queue.maxsize}).")
+
+    def shutdown(self):
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        self._threads = []
+
+    # --- API cho server ---
+    def submit(self, user_id, fn: JobFn) -> AnalysisJob:
+        self._purge_expired()
+        job = AnalysisJob(id=uuid.uuid4().hex, user_id=user_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        # Ghi DB trước khi vào hàng đợi: worker thread không thể cập nhật 1 dòng chưa tồn tại
+        self._insert(job)
+        try:
+            self._queue.put_nowait((job, fn))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self.rejected += 1
+            self._delete(job.id)
+            raise QueueFullError("Analysis queue is full")
+        return job
+
+    def add_completed(self, user_id, result: Dict[str, Any]) -> AnalysisJob:
+        """Đăng ký 1 job đã xong sẵn (vd: trúng cache) để client vẫn poll theo cùng 1 luồng."""
+        job = AnalysisJob(id=uuid.uuid4().hex, user_id=user_id)
+        self._finish(job, result)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._insert(job)
+        return job
+
+    def get(self, job_id: str, user_id=None) -> Optional[AnalysisJob]:
+        """Job của process này, hoặc (shared) snapshot từ DB của job đang chạy ở worker khác."""
+        job = self._jobs.get(job_id)
+        if job is None and self.shared:
+            job = self._load(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        job.last_seen = time.time()
+        if job.remote:
+            self._touch(job)
+        return job
+
+    def refresh(self, job: AnalysisJob) -> AnalysisJob:
+        """
+        Cho SSE: job của process này là object sống, trả lại nguyên. Job remote: đọc lại từ DB (tối đa 1 lần /
+        ANALYSIS_JOB_SYNC_INTERVAL) và báo "còn người xem" để process chạy job không coi là client đã bỏ đi.
+        """
+        if not job.remote or time.monotonic() - job.synced_at < ANALYSIS_JOB_SYNC_INTERVAL:
+            return job
+        fresh = self._load(job.id)
+        if fresh is None:
+            # Hết hạn / đã bị dọn: kết thúc stream thay vì chờ mãi
+            job.status, job.error = "error", "Job not found"
+            job.version += 1
+            return job
+        self._touch(fresh)
+        return fresh
+
+    def cancel(self, job_id: str, user_id=None) -> Optional[AnalysisJob]:
+        """Client chủ động hủy: job đang chờ bị bỏ qua, job đang chạy dừng ở lần xin phép LLM / chunk stream kế tiếp."""
+        job = self.get(job_id, user_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested = True
+        job.version += 1
+        if self.shared:
+            # Job remote: process chạy job thấy cờ này trong lần đọc DB kế tiếp (_abandoned)
+            self._execute(
+                update(AnalysisJobRecord)
+                .where(AnalysisJobRecord.id == job.id)
+                .values(cancel_requested=True)
+            )
+        return job
+
+    @contextmanager
+    def watch(self, job: AnalysisJob):
+        """Giữ job "còn người xem" trong suốt kết nối SSE; ngắt kết nối -> bắt đầu tính ANALYSIS_ABANDON_AFTER."""
+        with self._lock:
+            job.watchers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                job.watchers -= 1
+            job.last_seen = time.time()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": "db" if self.shared else "memory",
+            "workers": self.workers,
+            "queue_depth": self.queue_depth(),
+            "queue_size": self._queue.maxsize,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "tracked_jobs": len(self._jobs),
+        }
+
+    # --- DB (chỉ khi shared). Lỗi DB chỉ log: job vẫn chạy và trả lời được từ process này ---
+    def _execute(self, statement) -> int:
+        try:
+            with Session(engine) as session:
+                rowcount = session.exec(statement).rowcount
+                session.commit()
+                return rowcount
+        except Exception as e:
+            print(f" [JOBS] DB write warning: {e}")
+            return 0
+
+    def _insert(self, job: AnalysisJob):
+        if not self.shared:
+            return
+        try:
+            with Session(engine) as session:
+                session.add(job.to_record())
+                session.commit()
+        except Exception as e:
+            print(f" [JOBS] DB write warning ({job.id}): {e}")
+        job.synced_at = time.monotonic()
+
+    def _save(self, job: AnalysisJob):
+        """Ghi trạng thái do process này quản lý. Không ghi đè cancel_requested / last_seen (worker khác ghi)."""
+        if not self.shared:
+            return
+        job.synced_at = time.monotonic()
+        self._execute(
+            update(AnalysisJobRecord)
+            .where(AnalysisJobRecord.id == job.id)
+            .values(
+                status=job.status,
+                stage=job.stage,
+                result=job.result,
+                partial=job.partial,
+                error=job.error,
+                timings=dict(job.timings),
+                version=job.version,
+                updated_at=job.updated_at,
+            )
+        )
+
+    def _delete(self, job_id: str):
+        if self.shared:
+            self._execute(delete(AnalysisJobRecord).where(AnalysisJobRecord.id == job_id))
+
+    def _load(self, job_id: str) -> Optional[AnalysisJob]:
+        try:
+            with Session(engine) as session:
+                record = session.get(AnalysisJobRecord, job_id)
+        except Exception as e:
+            print(f" [JOBS] DB read warning ({job_id}): {e}")
+            return None
+        return AnalysisJob.from_record(record) if record is not None else None
+
+    def _touch(self, job: AnalysisJob):
+        # Có điều kiện last_seen: poll dồn dập từ nhiều tab chỉ thành 1 lần ghi / ANALYSIS_JOB_SYNC_INTERVAL
+        now = time.time()
+        self._execute(
+            update(AnalysisJobRecord)
+            .where(AnalysisJobRecord.id == job.id, AnalysisJobRecord.last_seen < now - ANALYSIS_JOB_SYNC_INTERVAL)
+            .values(last_seen=now)
+        )
+
+    def _pull(self, job: AnalysisJob):
+        """Job của process này: lấy cờ hủy + last_seen mà worker khác đã ghi vào DB."""
+        job.synced_at = time.monotonic()
+        try:
+            with Session(engine) as session:
+                record = session.get(AnalysisJobRecord, job.id)
+        except Exception as e:
+            print(f" [JOBS] DB read warning ({job.id}): {e}")
+            return
+        if record is not None:
+            job.cancel_requested = job.cancel_requested or record.cancel_requested
+            job.last_seen = max(job.last_seen, record.last_seen)
+
+    def _abandoned(self, job: AnalysisJob) -> bool:
+        if self.shared and time.monotonic() - job.synced_at >= ANALYSIS_JOB_SYNC_INTERVAL:
+            self._pull(job)
+        return job.abandoned(self.abandon_after)
+
+    # --- Nội bộ ---
+    def _set_stage(self, job: AnalysisJob, stage: str):
+        now = time.time()
+        job.timings[job.stage] = round(now - job.updated_at, 3)
+        job.stage = stage
+        job.updated_at = now
+        job.version += 1
+
+    def _set_partial(self, job: AnalysisJob, partial: Dict[str, Any]):
+        if "first_partial" not in job.timings:
+            # TTFB phía người dùng: từ lúc submit tới khi có nội dung đầu tiên để hiển thị
+            job.timings["first_partial"] = round(time.time() - job.created_at, 3)
+        job.partial = partial
+        # Không đụng updated_at: _set_stage dùng nó để tính thời gian của stage llm
+        job.version += 1
+        if time.monotonic() - job.synced_at >= ANALYSIS_JOB_SYNC_INTERVAL:
+            self._save(job)
+
+    def _on_stage(self, job: AnalysisJob, stage: str):
+        self._set_stage(job, stage)
+        self._save(job)
+
+    def _finish(self, job: AnalysisJob, result: Dict[str, Any]):
+        job.partial = None
+        if result and "error" in result:
+            job.status = "error"
+            job.error = str(result["error"])
+            self._set_stage(job, "error")
+        else:
+            job.status = "done"
+            job.result = result
+            self._set_stage(job, "done")
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            job, fn = item
+            with self._lock:
+                self.running += 1
+            job.status = "running"
+            self._save(job)
+            is_cancelled = lambda: self._abandoned(job)
+            try:
+                if is_cancelled():
+                    # Client đã bỏ đi trong lúc job còn trong hàng đợi -> không parse, không gọi Gemini
+                    result = {"error": "Job đã bị hủy"}
+                else:
+                    with llm_scheduler.request_scope(job.user_id, is_cancelled=is_cancelled):
+                        result = fn(
+                            lambda stage: self._on_stage(job, stage),
+                            lambda partial: self._set_partial(job, partial),
+                        )
+            except Exception as e:
+                print(f" [JOBS] Job {job.id} crashed: {e}")
+                result = {"error": f"Lỗi phân tích AI: {str(e)}"}
+            self._finish(job, result)
+            self._save(job)
+            with self._lock:
+                self.running -= 1
+                if job.status == "done":
+                    self.completed += 1
+                elif is_cancelled():
+                    self.cancelled += 1
+                    print(f" [JOBS] Job {job.id} cancelled (client gone)")
+                else:
+                    self.failed += 1
+            self._queue.task_done()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [jid for jid, j in self._jobs.items() if j.finished and j.updated_at < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+        # Dòng DB: gồm cả job của process đã chết (không bao giờ xong) -> xóa theo updated_at, bất kể trạng thái
+        if self.shared and time.monotonic() - self._db_purged_at > _DB_PURGE_INTERVAL:
+            self._db_purged_at = time.monotonic()
+            self._execute(delete(AnalysisJobRecord).where(AnalysisJobRecord.updated_at < cutoff))
+
+
+job_manager = JobManager(
+    workers=ANALYSIS_WORKERS,
+    queue_size=ANALYSIS_QUEUE_SIZE,
+    ttl=ANALYSIS_JOB_TTL,
+    abandon_after=ANALYSIS_ABANDON_AFTER,
+    shared=ANALYSIS_JOB_STORE == "db",
+)
@@ -0,0 +1,346 @@
+# backend/json_repair.py
+"""
+Đọc JSON từ output của LLM mà không fail cả bài phân tích vì lỗi định dạng vặt.
+repair_json() quét 1 lượt (O(n)) và sửa các lỗi hay gặp của Gemini:
+- Bọc trong ```json ... ``` hoặc có chữ trước/sau JSON
+- Dấu phẩy thừa trước } / ], thiếu dấu phẩy giữa 2 phần tử, dấu phẩy lặp
+- Dấu " không escape bên trong string, xuống dòng thô trong string
+- Key không có ngoặc kép, True/False/None kiểu Python, comment // và /* */
+- Bị cắt giữa chừng (hết token / stream đứt): bỏ phần dở dang, đóng các ngoặc còn mở
+Nhờ xử lý được JSON bị cắt, hàm này cũng dùng để parse từng phần khi stream (thay cho
+parse_partial_json của LangChain: thử json.loads sau mỗi lần bỏ 1 ký tự -> O(n^2) mỗi chunk).
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+
+class JsonRepairError(ValueError):
+    pass
+
+
+@dataclass
+class ParsedJson:
+    value: Any
+    repaired: bool = False
+    # Field cấp 1 đang viết dở khi output bị cắt: parse được nhưng nội dung không đủ tin cậy
+    truncated_key: Optional[str] = None
+
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*[ \t]*\n?")
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_LITERALS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "null", "undefined": "null",
+}
+_HEX4_RE = re.compile(r"[0-9a-fA-F]{4}")
+_ESCAPABLE = set('"\\/bfnrt')
+_BARE_TOKEN_END = set(' \t\r\n,:[]{}"')
+_CLOSER = {"{": "}", "[": "]"}
+
+
+def extract_json_block(text: str) -> str:
+    """Bỏ fence Markdown và chữ thừa phía trước JSON (phần thừa phía sau do repair_json tự bỏ)."""
+    text = text or ""
+    fence = _FENCE_RE.search(text)
+    if fence:
+        end = text.find("```", fence.end())
+        text = text[fence.end():] if end < 0 else text[fence.end():end]
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text.strip()
+
+
+class _Repairer:
+    def __init__(self, text: str):
+        self.text = text
+        self.out: List[str] = []
+        # Mỗi phần tử: [loại ngoặc, đang chờ gì ("key"/"colon"/"value"/"comma"), vị trí out trước key hiện tại]
+        self.stack: List[list] = []
+        # Điểm cắt an toàn: out[:pos] + đóng các ngoặc trong kinds là JSON hợp lệ
+        self.safe: Tuple[int, Tuple[str, ...]] = (0, ())
+        self.done = False
+        # Key cấp 1 gần nhất và giá trị của nó đã viết xong chưa
+        self.top_key: Optional[str] = None
+        self.top_key_open = False
+
+    @property
+    def truncated_key(self) -> Optional[str]:
+        return self.top_key if not self.done and self.top_key_open else None
+
+    # --- trạng thái ---
+    def expect(self) -> str:
+        return self.stack[-1][1] if self.stack else "value"
+
+    def in_object(self) -> bool:
+        return bool(self.stack) and self.stack[-1][0] == "{"
+
+    def mark_safe(self):
+        self.safe = (len(self.out), tuple(entry[0] for entry in self.stack))
+
+    def value_done(self):
+        if self.stack:
+            self.stack[-1][1] = "comma"
+        else:
+            self.done = True
+        if len(self.stack) == 1:
+            self.top_key_open = False
+        self.mark_safe()
+
+    def key_done(self, key: str):
+        self.stack[-1][1] = "colon"
+        if len(self.stack) == 1:
+            self.top_key, self.top_key_open = key, True
+
+    def before_value(self) -> str:
+        """Chèn dấu phẩy / hai chấm còn thiếu trước 1 phần tử mới. Trả về vai trò: "key" hoặc "value"."""
+        expect = self.expect()
+        if expect == "comma":
+            self.out.append(",")
+            expect = self.stack[-1][1] = "key" if self.in_object() else "value"
+        if self.in_object() and expect == "key":
+            self.stack[-1][2] = len(self.out) - (1 if self.out and self.out[-1] == "," else 0)
+            return "key"
+        if self.in_object() and expect == "colon":
+            self.out.append(":")
+            self.stack[-1][1] = "value"
+        return "value"
+
+    def drop_dangling_key(self):
+        # {"a": } hoặc {"a" } -> bỏ key "a" (kèm dấu phẩy đứng trước nếu có)
+        if self.in_object() and self.stack[-1][1] in ("colon", "value"):
+            del self.out[self.stack[-1][2]:]
+            self.stack[-1][1] = "comma" if self.out and self.out[-1] not in "{," else "key"
+        while self.out and self.out[-1] == ",":
+            self.out.pop()
+
+    # --- quét ---
+    def run(self) -> str:
+        text, n = self.text, len(self.text)
+        i = 0
+        while i < n and not self.done:
+            c = text[i]
+            if c in " \t\r\n":
+                i += 1
+            elif c == '"' or c == "'" and self.expect() in ("key", "value", "comma"):
+                i = self.read_string(i)
+            elif c in "{[":
+                if self.in_object() and self.expect() == "key":
+                    i += 1  # Object/array ở vị trí key: bỏ qua
+                    continue
+                self.before_value()
+                self.stack.append([c, "key" if c == "{" else "value", len(self.out)])
+                self.out.append(c)
+                self.mark_safe()
+                i += 1
+            elif c in "}]":
+                self.close(c)
+                i += 1
+            elif c == ",":
+                if self.expect() == "comma":
+                    self.out.append(",")
+                    self.stack[-1][1] = "key" if self.in_object() else "value"
+                i += 1
+            elif c == ":":
+                if self.in_object() and self.expect() == "colon":
+                    self.out.append(":")
+                    self.stack[-1][1] = "value"
+                i += 1
+            elif c == "/" and text.startswith("//", i):
+                end = text.find("\n", i)
+                i = n if end < 0 else end + 1
+            elif c == "/" and text.startswith("/*", i):
+                end = text.find("*/", i + 2)
+                i = n if end < 0 else end + 2
+            else:
+                i = self.read_bare(i)
+        return self.finish()
+
+    def read_string(self, start: int) -> int:
+        text, n = self.text, len(self.text)
+        quote = text[start]
+        role = self.before_value()
+        buf = ['"']
+        j = start + 1
+        while j < n:
+            c = text[j]
+            if c == "\\":
+                if j + 1 >= n:
+                    j += 1
+                    break
+                nxt = text[j + 1]
+                if nxt == "u":
+                    digits = text[j + 2:j + 6]
+                    if j + 6 > n:
+                        j = n  # \uXXXX bị cắt giữa chừng
+                        break
+                    buf.append("\\u" + digits if _HEX4_RE.fullmatch(digits) else "\\\\u")
+                    j += 6 if _HEX4_RE.fullmatch(digits) else 2
+                    continue
+                if nxt in _ESCAPABLE:
+                    buf.append(c + nxt)
+                elif nxt == "'":
+                    buf.append("'")
+                else:
+                    buf.append("\\\\" + nxt)
+                j += 2
+                continue
+            if c == quote and self.is_string_end(j + 1, role):
+                buf.append('"')
+                self.out.extend(buf)
+                if role == "key":
+                    self.key_done(json.loads("".join(buf)))
+                else:
+                    self.value_done()
+                return j + 1
+            if c == '"':
+                buf.append('\\"')
+            elif c == "\n":
+                buf.append("\\n")
+            elif c == "\r":
+                buf.append("\\r")
+            elif c == "\t":
+                buf.append("\\t")
+            elif ord(c) < 0x20:
+                buf.append(f"\\u{ord(c):04x}")
+            else:
+                buf.append(c)
+            j += 1
+        # Hết input giữa string: giữ giá trị dở dang (hiển thị được khi stream), bỏ key dở dang
+        if role == "value":
+            buf.append('"')
+            self.out.extend(buf)
+            self.value_done()
+            self.top_key_open = True
+        return n
+
+    def is_string_end(self, k: int, role: str) -> bool:
+        """Dấu nháy ở vị trí k-1 là đóng string hay là dấu nháy quên escape bên trong?"""
+        text, n = self.text, len(self.text)
+        start = k
+        newline = False
+        while k < n and text[k] in " \t\r\n":
+            newline = newline or text[k] == "\n"
+            k += 1
+        if k >= n:
+            return True
+        nxt = text[k]
+        # Comment ngay sau dấu nháy: {"a": "x" // ...} -> string đã đóng
+        if text.startswith("//", k) or text.startswith("/*", k):
+            return True
+        if role == "key":
+            return nxt in ":}"
+        # Xuống dòng rồi tới key tiếp theo: thiếu dấu phẩy, string vẫn kết thúc ở đây
+        if nxt in ",}]" or (newline and nxt in "\"'"):
+            return True
+        # Trong array: ["a" "b"] -> thiếu dấu phẩy giữa 2 phần tử
+        return k > start and nxt in "\"'" and bool(self.stack) and self.stack[-1][0] == "["
+
+    def read_bare(self, start: int) -> int:
+        text, n = self.text, len(self.text)
+        j = start
+        while j < n and text[j] not in _BARE_TOKEN_END:
+            j += 1
+        token = text[start:j]
+        if j >= n:
+            return n  # Token bị cắt (vd: "tru", "12.") -> bỏ, finish() cắt về điểm an toàn
+        role = self.before_value()
+        if role == "key":
+            self.out.append(json.dumps(token))  # Key không có ngoặc kép kiểu JS
+            self.key_done(token)
+        elif token in _LITERALS:
+            self.out.append(_LITERALS[token])
+            self.value_done()
+        elif _NUMBER_RE.fullmatch(token.lstrip("+")):
+            self.out.append(token.lstrip("+"))
+            self.value_done()
+        else:
+            self.out.append(json.dumps(token))
+            self.value_done()
+        return j
+
+    def close(self, closer: str):
+        opener = "{" if closer == "}" else "["
+        if not any(entry[0] == opener for entry in self.stack):
+            return  # Ngoặc đóng thừa
+        while self.stack:
+            self.drop_dangling_key()
+            entry = self.stack.pop()
+            self.out.append(_CLOSER[entry[0]])
+            if entry[0] == opener:
+                break
+            self.stack[-1][1] = "comma"  # Ngoặc bên trong quên đóng: coi như phần tử đã xong
+        self.value_done()
+
+    def finish(self) -> str:
+        if self.done:
+            return "".join(self.out)
+        pos, kinds = self.safe
+        out = self.out[:pos]
+        while out and out[-1] == ",":
+            out.pop()
+        return "".join(out) + "".join(_CLOSER[k] for k in reversed(kinds))
+
+
+def repair_json(text: str) -> str:
+    return _Repairer(extract_json_block(text)).run()
+
+
+def loads_tolerant(text: str) -> ParsedJson:
+    """JSON chuẩn thì json.loads thẳng, không thì sửa rồi parse. Raise JsonRepairError nếu không cứu được gì."""
+    block = extract_json_block(text)
+    try:
+        return ParsedJson(json.loads(block), repaired=block != (text or "").strip())
+    except ValueError:
+        pass
+    repairer = _Repairer(block)
+    try:
+        value = json.loads(repairer.run())
+    except ValueError as e:
+        raise JsonRepairError(f"Không sửa được JSON từ LLM: {e}") from e
+    if value in ({}, [], None, ""):
+        raise JsonRepairError("LLM không trả về JSON hợp lệ")
+    return ParsedJson(value, repaired=True, truncated_key=repairer.truncated_key)
+
+
+def loads_partial(text: str) -> Optional[Any]:
+    """Parse JSON đang stream dở (đã đóng ngoặc tạm). None nếu chưa có gì."""
+    try:
+        return json.loads(repair_json(text))
+    except ValueError:
+        return None
+
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(annotation) -> TypeAdapter:
+    adapter = _adapters.get(annotation)
+    if adapter is None:
+        adapter = _adapters[annotation] = TypeAdapter(annotation)
+    return adapter
+
+
+def validate_sections(data: Any, model, required: Optional[Iterable[str]] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Kiểm tra từng field cấp 1 theo pydantic model (không fail cả object vì 1 field).
+    Trả về (các field hợp lệ theo thứ tự của model, các field trong required bị thiếu/sai/rỗng).
+    """
+    data = data if isinstance(data, dict) else {}
+    required = set(model.model_fields if required is None else required)
+    valid: Dict[str, Any] = {}
+    missing: List[str] = []
+    for name, field in model.model_fields.items():
+        value = data.get(name)
+        if value not in (None, {}, [], ""):
+            try:
+                valid[name] = _adapter(field.annotation).validate_python(value)
+                continue
+            except ValidationError:
+                pass
+        if name in required:
+            missing.append(name)
+    return valid, missing
@@ -0,0 +1,347 @@
+# backend/llm_scheduler.py
+"""
+Admission control cho mọi lời gọi Gemini (invoke, stream, hỏi lại field thiếu, batch).
+- Token bucket theo phút: LLM_RPM_LIMIT request và LLM_TPM_LIMIT token (ước lượng trước, trả lại/bù sau
+  theo usage_metadata thật). 0 = không giới hạn.
+- LLM_MAX_CONCURRENCY lời gọi đang chạy cùng lúc.
+- Xếp hàng công bằng theo user (round-robin giữa các guest User.id): 1 user gửi 50 CV không chặn user khác.
+- Hủy khi client bỏ đi (callback is_cancelled của job) hoặc quá hạn LLM_QUEUE_TIMEOUT -> không tốn quota vô ích.
+- Gemini báo 429 -> tạm dừng cấp phép cho mọi request trong thời gian backoff thay vì để cả đám cùng dính 429.
+
+User + callback hủy đi theo contextvar (request_scope), nên core_logic/batch không phải truyền tham số mới.
+"""
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+import metrics
+from context_builder import estimate_tokens
+
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))  # Giây chờ tối đa trong hàng đợi LLM
+# Ước lượng phần prompt cố định + output (JSON ~ 1-2k token) khi trừ trước vào bucket TPM
+LLM_TOKENS_OVERHEAD = int(os.getenv("LLM_TOKENS_OVERHEAD", "2500"))
+
+_POLL_SECONDS = 0.25  # Chu kỳ kiểm tra hủy / hết hạn khi đang chờ
+
+
+class LlmAdmissionError(Exception):
+    pass
+
+
+class LlmQueueTimeout(LlmAdmissionError):
+    pass
+
+
+class LlmCancelled(LlmAdmissionError):
+    pass
+
+
+class TokenBucket:
+    """capacity token, nạp lại đều capacity token mỗi phút. Số dư có thể âm khi usage thật vượt ước lượng."""
+
+    def __init__(self, per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.clock = clock
+        self.updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """0 nếu lấy được amount ngay. Request lớn hơn capacity chỉ cần bucket đầy (không chờ mãi)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity) - self.level
+        return need / self.rate if need > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= amount
+
+    def available(self) -> Optional[float]:
+        if self.unlimited:
+            return None
+        self._refill(self.clock())
+        return round(self.level, 1)
+
+
+class _Waiter:
+    __slots__ = ("user", "tokens", "enqueued", "granted")
+
+    def __init__(self, user: str, tokens: int, enqueued: float):
+        self.user = user
+        self.tokens = tokens
+        self.enqueued = enqueued
+        self.granted = False
+
+
+class Ticket:
+    """Quyền gọi LLM 1 lần. settle(message) bù chênh lệch token ước lượng/thật; thoát context -> trả slot."""
+
+    def __init__(self, scheduler: "LlmScheduler", tokens: int, waited: float):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.waited = waited
+        self._released = False
+
+    def settle(self, message: Any):
+        usage = getattr(message, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens")
+        if actual:
+            self.scheduler._adjust_tokens(actual - self.tokens)
+            self.tokens = actual
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.scheduler._release()
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Scope:
+    __slots__ = ("user", "is_cancelled", "timeout")
+
+    def __init__(self, user: str, is_cancelled: Optional[Callable[[], bool]], timeout: Optional[float]):
+        self.user = user
+        self.is_cancelled = is_cancelled
+        self.timeout = timeout
+
+
+_scope: contextvars.ContextVar[Optional[_Scope]] = contextvars.ContextVar("llm_scope", default=None)
+
+
+class LlmScheduler:
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int, queue_timeout: float, clock: Callable[[], float] = time.monotonic):
+        # clock: đồng hồ cho bucket / hạn chờ / backoff 429 (test truyền đồng hồ giả)
+        self.clock = clock
+        self.rpm = TokenBucket(rpm, clock)
+        self.tpm = TokenBucket(tpm, clock)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        # user -> hàng FIFO của user đó; _turns: thứ tự round-robin giữa các user đang chờ
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._turns: Deque[str] = deque()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self.granted = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.throttled = 0
+
+    # --- Ngữ cảnh request (gọi từ job worker / endpoint batch) ---
+    @contextmanager
+    def request_scope(self, user_id: Any, is_cancelled: Optional[Callable[[], bool]] = None, timeout: Optional[float] = None):
+        """Mọi lời gọi LLM trong khối with được xếp hàng dưới tên user_id; timeout: giây chờ tối đa mỗi lần xin phép."""
+        token = _scope.set(_Scope(str(user_id), is_cancelled, timeout))
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    def check_cancelled(self):
+        """Gọi giữa các chunk khi stream: client bỏ đi thì dừng luôn, không đọc tiếp output."""
+        scope = _scope.get()
+        if scope is not None and scope.is_cancelled is not None and scope.is_cancelled():
+            raise LlmCancelled("Client đã hủy yêu cầu phân tích")
+
+    # --- Cấp phép ---
+    def _enqueue(self, tokens: int) -> _Waiter:
+        scope = _scope.get()
+        waiter = _Waiter(scope.user if scope else "anonymous", tokens, self.clock())
+        with self._cond:
+            user_queue = self._queues.get(waiter.user)
+            if user_queue is None:
+                user_queue = self._queues[waiter.user] = deque()
+                self._turns.append(waiter.user)
+            user_queue.append(waiter)
+            self._dispatch()
+        return waiter
+
+    def _dispatch(self):
+        """Cấp phép cho các waiter ở đầu lượt round-robin chừng nào còn slot + quota. Gọi khi đang giữ _cond."""
+        now = self.clock()
+        while self._turns and self._in_flight < self.max_concurrency and now >= self._paused_until:
+            user = self._turns[0]
+            waiter = self._queues[user][0]
+            if self.rpm.wait_time(1, now) > 0 or self.tpm.wait_time(waiter.tokens, now) > 0:
+                break  # Không nhảy cóc: request nhỏ phía sau không được vượt request lớn đang chờ quota
+            self.rpm.take(1, now)
+            self.tpm.take(waiter.tokens, now)
+            self._in_flight += 1
+            self.granted += 1
+            waiter.granted = True
+            self._remove(waiter)
+            if self._turns and self._turns[0] == user:
+                self._turns.rotate(-1)  # User vừa được phục vụ xuống cuối lượt
+        self._cond.notify_all()
+
+    def _remove(self, waiter: _Waiter):
+        user_queue = self._queues.get(waiter.user)
+        if user_queue is None or waiter not in user_queue:
+            return
+        user_queue.remove(waiter)
+        if not user_queue:
+            del self._queues[waiter.user]
+            self._turns.remove(waiter.user)
+
+    def _next_wait(self) -> float:
+        """Ngủ tới khi bucket đủ cho waiter đầu lượt (tối đa _POLL_SECONDS để còn kiểm tra hủy)."""
+        now = self.clock()
+        delay = _POLL_SECONDS
+        if self._paused_until > now:
+            delay = min(delay, self._paused_until - now)
+        elif self._turns and self._in_flight < self.max_concurrency:
+            head = self._queues[self._turns[0]][0]
+            quota_wait = max(self.rpm.wait_time(1, now), self.tpm.wait_time(head.tokens, now))
+            if quota_wait > 0:
+                delay = min(delay, quota_wait)
+        return max(0.01, delay)
+
+    def _abandon(self, waiter: _Waiter, error: LlmAdmissionError) -> LlmAdmissionError:
+        self._remove(waiter)
+        if isinstance(error, LlmCancelled):
+            self.cancelled += 1
+            outcome = "cancelled"
+        else:
+            self.timed_out += 1
+            outcome = "timeout"
+        self._dispatch()
+        metrics.LLM_QUEUE_WAIT_SECONDS.observe(self.clock() - waiter.enqueued, outcome=outcome)
+        return error
+
+    def _check(self, waiter: _Waiter) -> Optional[LlmAdmissionError]:
+        scope = _scope.get()
+        if scope is not None and scope.is_cancelled is not None and scope.is_cancelled():
+            return LlmCancelled("Client đã hủy yêu cầu phân tích")
+        timeout = self.queue_timeout if scope is None or scope.timeout is None else scope.timeout
+        if timeout > 0 and self.clock() - waiter.enqueued > timeout:
+            return LlmQueueTimeout("Gemini đang quá tải (hết thời gian chờ trong hàng đợi), hãy thử lại sau")
+        return None
+
+    def _granted(self, waiter: _Waiter) -> Ticket:
+        waited = self.clock() - waiter.enqueued
+        metrics.LLM_QUEUE_WAIT_SECONDS.observe(waited, outcome="granted")
+        metrics.add_server_timing("llm_queue", waited)
+        return Ticket(self, waiter.tokens, waited)
+
+    def acquire(self, tokens: int) -> Ticket:
+        """Chặn thread hiện tại tới khi được gọi LLM. Raise LlmCancelled / LlmQueueTimeout."""
+        waiter = self._enqueue(tokens)
+        with self._cond:
+            while not waiter.granted:
+                error = self._check(waiter)
+                if error is not None:
+                    raise self._abandon(waiter, error)
+                self._cond.wait(self._next_wait())
+                self._dispatch()
+        return self._granted(waiter)
+
+    async def aacquire(self, tokens: int) -> Ticket:
+        """Bản async cho batch: chờ bằng asyncio.sleep, task bị cancel thì rời hàng đợi."""
+        waiter = self._enqueue(tokens)
+        try:
+            while True:
+                with self._cond:
+                    if not waiter.granted:
+                        self._dispatch()
+                    if waiter.granted:
+                        break
+                    error = self._check(waiter)
+                    if error is not None:
+                        raise self._abandon(waiter, error)
+                    delay = self._next_wait()
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            with self._cond:
+                if waiter.granted:
+                    self._release_locked()
+                else:
+                    self._abandon(waiter, LlmCancelled("cancelled"))
+            raise
+        return self._granted(waiter)
+
+    # --- Trả slot / điều chỉnh quota ---
+    def _release_locked(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _release(self):
+        with self._cond:
+            self._release_locked()
+
+    def _adjust_tokens(self, delta: float):
+        with self._cond:
+            self.tpm.take(delta, self.clock())
+            self._dispatch()
+
+    def throttle(self, seconds: float):
+        """Upstream báo hết quota (429): dừng cấp phép cho mọi request trong `seconds` giây."""
+        with self._cond:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+    @contextmanager
+    def admit(self, chain_input: Optional[dict] = None):
+        """with llm_scheduler.admit(chain_input) as ticket: message = chain.invoke(...); ticket.settle(message)"""
+        ticket = self.acquire(estimate_request_tokens(chain_input))
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = self.clock()
+            oldest = min((w.enqueued for q in self._queues.values() for w in q), default=None)
+            return {
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "waiting_users": len(self._queues),
+                "oldest_wait_s": round(now - oldest, 3) if oldest is not None else 0.0,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "rpm_limit": int(self.rpm.capacity),
+                "tpm_limit": int(self.tpm.capacity),
+                "rpm_available": self.rpm.available(),
+                "tpm_available": self.tpm.available(),
+                "paused_s": round(max(0.0, self._paused_until - now), 3),
+                "granted": self.granted,
+                "timed_out": self.timed_out,
+                "cancelled": self.cancelled,
+                "throttled": self.throttled,
+            }
+
+
+def estimate_request_tokens(chain_input: Optional[dict]) -> int:
+    text_tokens = sum(estimate_tokens(v) for v in (chain_input or {}).values() if isinstance(v, str))
+    return text_tokens + LLM_TOKENS_OVERHEAD
+
+
+llm_scheduler = LlmScheduler(
+    rpm=LLM_RPM_LIMIT,
+    tpm=LLM_TPM_LIMIT,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+)
@@ -1,9 +1,7 @@
 # backend/main.py
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
-import os
-from core_logic import run_full_analysis # Import hàm logic của bạn
+from core_logic import analyze_cv_logic
 
 app = FastAPI()
 
@@ -21,23 +19,12 @@ async def analyze_cv(
     file: UploadFile = File(...), 
     jd: str = Form(...)
 ):
-    # 1. Lưu file upload tạm thời
-    temp_filename = f"temp_{file.filename}"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # 2. Gọi logic AI cũ của bạn (cần chỉnh sửa hàm run_full_analysis để nhận path thay vì object gradio)
-    # Giả sử hàm run_full_analysis trả về JSON
+    # Đọc upload thẳng vào RAM, không ghi file tạm theo tên client gửi lên
+    file_bytes = await file.read()
     try:
-        # Bạn cần sửa nhẹ hàm run_full_analysis để trả về Dict (JSON) thay vì HTML/Markdown
-        result = run_full_analysis(temp_filename, jd, {}) 
-        return result
+        return analyze_cv_logic(file_bytes, jd, source=file.filename or "upload.pdf")
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        # Xóa file tạm
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
 
 if __name__ == "__main__":
     import uvicorn
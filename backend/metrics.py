@@ -0,0 +1,258 @@
+# backend/metrics.py
+"""
+Metrics dạng Prometheus (text exposition 0.0.4) tự viết, không thêm dependency.
+- span("embedding"): đo 1 stage -> histogram dss_stage_seconds + header Server-Timing của request hiện tại.
+- instrument_engine(engine): đo mọi câu SQL qua event của SQLAlchemy -> dss_db_query_seconds + Server-Timing "db".
+- register_callback(): số liệu lấy lúc scrape (queue depth, cache hit...) từ các object đã có sẵn.
+"""
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [đếm theo từng bucket (không cộng dồn)..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def totals(self) -> Dict[LabelKey, Tuple[float, int]]:
+        """(sum, count) theo từng bộ label - benchmark lấy hiệu 2 lần gọi để ra thời gian của 1 lượt chạy."""
+        with self._lock:
+            return {key: (state[-2], int(state[-1])) for key, state in self._values.items()}
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(state[-1])}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Giá trị đọc lúc scrape: fn() trả về số, hoặc list (labels dict, số)."""
+
+    def __init__(self, name: str, help_text: str, type_name: str, fn: Callable[[], object]):
+        super().__init__(name, help_text)
+        self.type_name = type_name
+        self.fn = fn
+
+    def collect(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f" [METRICS] Callback {self.name} failed: {e}")
+            return []
+        samples = value if isinstance(value, list) else [({}, value)]
+        return [
+            f"{self.name}{_format_labels(_label_key(labels))} {_format_value(v)}"
+            for labels, v in samples
+            if v is not None
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def register_callback(name: str, help_text: str, fn: Callable[[], object], type_name: str = "gauge"):
+    REGISTRY.register(CallbackMetric(name, help_text, type_name, fn))
+
+
+# --- Metrics dùng chung ---
+STAGE_SECONDS = REGISTRY.register(Histogram("dss_stage_seconds", "Duration of analysis stages"))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "dss_db_query_seconds", "Duration of SQL statements", buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram("dss_http_request_seconds", "HTTP request latency until response headers"))
+ERRORS = REGISTRY.register(Counter("dss_errors_total", "Errors by stage"))
+LLM_TOKENS = REGISTRY.register(Counter("dss_llm_tokens_total", "LLM tokens reported by the provider"))
+LLM_RETRIES = REGISTRY.register(Counter("dss_llm_retries_total", "LLM calls retried after a transient error"))
+LLM_OUTPUT_FIXES = REGISTRY.register(Counter("dss_llm_output_fixes_total", "LLM outputs repaired locally, re-asked or left incomplete"))
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "dss_llm_queue_wait_seconds", "Time spent waiting for LLM admission (rate limits, concurrency, fair queue)"
+))
+LLM_FIRST_CHUNK_SECONDS = REGISTRY.register(Histogram("dss_llm_first_chunk_seconds", "Time from LLM call to first streamed chunk"))
+
+
+# --- Server-Timing theo từng request ---
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> contextvars.Token:
+    return _request_timings.set([])
+
+
+def end_request_timings(token: contextvars.Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def add_server_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    add_server_timing(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+_TOKEN_RE = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+def format_server_timing(timings: Iterable[Tuple[str, float]]) -> str:
+    """Gộp các entry cùng tên (vd: nhiều câu SQL -> 1 entry "db" với tổng thời gian + số lần)."""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        entry = totals.setdefault(_TOKEN_RE.sub("_", name), [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = []
+    for name, (seconds, count) in totals.items():
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count}x"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def instrument_engine(engine):
+    """Đo thời gian mọi câu SQL của engine (sync) qua before/after_cursor_execute."""
+    from sqlalchemy import event
+
+    if getattr(engine, "_dss_instrumented", False):
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("dss_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["dss_query_started"].pop()
+        elapsed = time.perf_counter() - started
+        operation = (statement.split(None, 1)[0] if statement else "other").lower()
+        DB_QUERY_SECONDS.observe(elapsed, operation=operation)
+        add_server_timing("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        ERRORS.inc(stage="db")
+        stack = context.connection.info.get("dss_query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    engine._dss_instrumented = True
@@ -0,0 +1,115 @@
+# backend/migrations.py
+"""
+Migration đơn giản, chạy sau SQLModel.metadata.create_all().
+
+create_all chỉ tạo bảng/index cho bảng MỚI; bảng đã có sẵn trên Supabase sẽ không được thêm index
+hay cột mới. Mỗi migration dưới đây chạy đúng 1 lần (ghi lại trong bảng schema_migrations)
+và câu lệnh đều idempotent (IF NOT EXISTS) để chạy lại an toàn.
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import inspect, text
+
+
+def add_column(table: str, column: str, ddl: str) -> Callable:
+    """ADD COLUMN idempotent cho mọi dialect (SQLite không có ADD COLUMN IF NOT EXISTS)."""
+    def apply(conn):
+        if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    return apply
+
+
+# (id, dialects áp dụng, danh sách câu lệnh SQL hoặc hàm nhận connection)
+MIGRATIONS: List[Tuple[str, Tuple[str, ...], List[Union[str, Callable]]]] = [
+    (
+        "0001_user_created_indexes",
+        ("postgresql", "sqlite"),
+        [
+            "CREATE INDEX IF NOT EXISTS ix_application_user_created ON application (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_jobdescription_user_created ON jobdescription (user_id, created_at)",
+        ],
+    ),
+    (
+        "0002_analysis_result_jsonb_indexes",
+        ("postgresql",),
+        [
+            # GIN trên biểu thức: lọc application theo từ khóa (analysis_result -> 'matched_keywords' ? 'Python'),
+            # dùng bởi tham số ?keyword= của /api/reports/*
+            "CREATE INDEX IF NOT EXISTS ix_application_matched_keywords "
+            "ON application USING GIN ((analysis_result -> 'matched_keywords'))",
+        ],
+    ),
+    (
+        "0003_jd_embedding_pgvector",
+        ("postgresql",),
+        [
+            # Cột vector cho jd_index.py: tìm JD gần nhất bằng HNSW (cosine) thay vì quét NumPy.
+            # 384 = số chiều của all-MiniLM-L6-v2
+            "CREATE EXTENSION IF NOT EXISTS vector",
+            "ALTER TABLE jdembedding ADD COLUMN IF NOT EXISTS vec vector(384)",
+            "CREATE INDEX IF NOT EXISTS ix_jdembedding_vec ON jdembedding USING hnsw (vec vector_cosine_ops)",
+        ],
+    ),
+    (
+        "0004_user_last_seen",
+        ("postgresql", "sqlite"),
+        [
+            # Cho retention.py: tìm guest không hoạt động theo last_seen_at (range scan trên index).
+            # User cũ chưa từng có mốc -> tính từ lúc migrate: được đủ 1 chu kỳ GUEST_RETENTION_DAYS
+            # trước khi bị xóa, không xóa nhầm user tạo từ lâu nhưng vẫn đang dùng.
+            add_column("user", "last_seen_at", "TIMESTAMP"),
+            'UPDATE "user" SET last_seen_at = CURRENT_TIMESTAMP WHERE last_seen_at IS NULL',
+            'CREATE INDEX IF NOT EXISTS ix_user_last_seen_at ON "user" (last_seen_at)',
+        ],
+    ),
+    (
+        "0005_analysis_result_reports_indexes",
+        ("postgresql",),
+        [
+            # GIN jsonb_path_ops trên cả analysis_result: nhỏ hơn jsonb_ops, phục vụ containment @>
+            # (bộ lọc ?keyword= của reports.py: analysis_result @> {"matched_keywords": [...]})
+            "CREATE INDEX IF NOT EXISTS ix_application_analysis_result_path "
+            "ON application USING GIN (analysis_result jsonb_path_ops)",
+            # Btree đúng biểu thức mà score_histogram chia bucket, theo user. INCLUDE cột gốc để
+            # Postgres đọc được index-only scan (expression index không tự mang giá trị cột gốc)
+            "CREATE INDEX IF NOT EXISTS ix_application_user_score "
+            "ON application (user_id, (COALESCE(match_score, 0))) INCLUDE (match_score)",
+        ],
+    ),
+]
+
+# Migration tùy chọn: lỗi (vd: DB không cho tạo extension pgvector) chỉ log ra, không ghi vào
+# schema_migrations (lần khởi động sau thử lại) và không chặn các migration phía sau
+OPTIONAL_MIGRATIONS = {"0003_jd_embedding_pgvector"}
+
+
+def run_migrations(engine):
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(128) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+    for migration_id, dialects, statements in MIGRATIONS:
+        if migration_id in applied or dialect not in dialects:
+            continue
+        # Mỗi migration 1 transaction: lỗi giữa chừng thì rollback toàn bộ migration đó
+        try:
+            with engine.begin() as conn:
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(text(statement))
+                conn.execute(
+                    text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)"),
+                    {"id": migration_id, "applied_at": datetime.now()},
+                )
+        except Exception as e:
+            if migration_id not in OPTIONAL_MIGRATIONS:
+                raise
+            print(f" [DBA] Skipped optional migration {migration_id}: {e}")
+            continue
+        print(f" [DBA] Applied migration {migration_id}")
@@ -2,14 +2,20 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column
+from sqlalchemy import Column, JSON, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import JSONB  # Dùng cái này mới là chuẩn DBA cho Postgres
 
+# JSONB trên Postgres, JSON thường trên SQLite (SQLite không render được kiểu JSONB)
+JSONB_VARIANT = JSON().with_variant(JSONB(), "postgresql")
+
 # Bảng User
 class User(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     is_guest: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.now)
+    # Lần cuối user gửi request (ghi tối đa 1 lần / USER_TOUCH_INTERVAL, xem server.get_current_user).
+    # retention.py xóa guest không hoạt động quá GUEST_RETENTION_DAYS theo cột này.
+    last_seen_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
     
     # Quan hệ: Một User có nhiều App và JD
     applications: List["Application"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
@@ -17,6 +23,9 @@ class User(SQLModel, table=True):
 
 # 2. Bảng JobDescription: Thư viện JD
 class JobDescription(SQLModel, table=True):
+    # Index ghép phục vụ list theo user + sắp xếp created_at (keyset pagination)
+    __table_args__ = (Index("ix_jobdescription_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     # Khóa ngoại trỏ về User
     user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
@@ -35,8 +44,28 @@ class JobDescriptionUpdate(SQLModel):
     company: Optional[str] = None
     content: Optional[str] = None
 
+# Dòng "jd" / "application" trong file NDJSON của /api/import (xem transfer.py).
+# Không có id/user_id: dòng import luôn thuộc user hiện tại và nhận id mới.
+class JobDescriptionImport(SQLModel):
+    title: str
+    company: Optional[str] = None
+    content: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ApplicationImport(SQLModel):
+    job_title: str
+    company_name: str
+    status: str = "new"
+    match_score: int = 0
+    jd_content: Optional[str] = None
+    analysis_result: Dict[str, Any] = {}
+    created_at: Optional[datetime] = None
+
 # 3. Bảng Application
 class Application(SQLModel, table=True):
+    __table_args__ = (Index("ix_application_user_created", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
     
@@ -46,9 +75,85 @@ class Application(SQLModel, table=True):
     match_score: int = Field(default=0)
     jd_content: Optional[str] = Field(default=None)
     
-    # Dùng JSONB để lưu kết quả AI -> Query nhanh hơn text, index được từng key bên trong.
-    analysis_result: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB))
+    # Dùng JSONB để lưu kết quả AI -> Query nhanh hơn text, index được từng key bên trong (xem migrations.py).
+    # SQLite (local) dùng JSON thường.
+    analysis_result: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB_VARIANT))
     
     created_at: datetime = Field(default_factory=datetime.now)
     
     user: Optional[User] = Relationship(back_populates="applications")
+
+# 4. Bảng AnalysisCacheEntry: Tầng cache bền vững cho kết quả /api/analyze
+class AnalysisCacheEntry(SQLModel, table=True):
+    # Khóa = sha256(file bytes + JD đã chuẩn hóa + fingerprint của prompt/model)
+    key: str = Field(primary_key=True, max_length=64)
+    result: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB_VARIANT))
+    hits: int = Field(default=0)
+
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
+# 5. Bảng CvArtifact: CV đã parse + embed, tái dùng khi chấm cùng 1 CV với JD khác
+class CvArtifact(SQLModel, table=True):
+    # Khóa = sha256 của file PDF (client gửi lại hash này thay cho upload lại file)
+    hash: str = Field(primary_key=True, max_length=64)
+    # Cấu hình chunk/embedding đã tạo ra artifact; khác cấu hình hiện tại -> coi như không có
+    fingerprint: str = Field(max_length=64)
+    filename: str = Field(default="")
+    # [{"text": ..., "metadata": {...}}] theo thứ tự chunk
+    chunks: List[Dict[str, Any]] = Field(default=[], sa_column=Column(JSONB_VARIANT))
+    # Ma trận embedding (n_chunks x dim) dạng float16/float32 liền mạch
+    embeddings: bytes = Field(sa_column=Column(LargeBinary))
+    dtype: str = Field(default="float16", max_length=16)
+    dim: int = Field(default=0)
+    size_bytes: int = Field(default=0)
+
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_used_at: datetime = Field(default_factory=datetime.now, index=True)
+
+# 5b. Bảng CvArtifactOwner: user nào đã upload CV nào. Kho artifact dùng chung giữa các user (khóa theo sha256),
+# chỉ user có dòng ở đây mới được dùng lại cv_hash. Không đặt FK, retention.py tự xóa theo user_id.
+class CvArtifactOwner(SQLModel, table=True):
+    hash: str = Field(primary_key=True, max_length=64)
+    user_id: uuid.UUID = Field(primary_key=True, index=True)
+
+    created_at: datetime = Field(default_factory=datetime.now)
+
+# 6. Bảng JdEmbedding: index vector cho thư viện JD (xem jd_index.py)
+# Không đặt FK: đây là dữ liệu dẫn xuất, truy vấn luôn JOIN/lọc theo user nên dòng mồ côi vô hại
+class JdEmbedding(SQLModel, table=True):
+    jd_id: int = Field(primary_key=True)
+    user_id: uuid.UUID = Field(index=True)
+    # Model embedding + cách gộp vector; khác cấu hình hiện tại -> phải index lại
+    fingerprint: str = Field(max_length=64)
+    # updated_at của JD lúc được embed; khác JobDescription.updated_at -> JD đã sửa, vector cũ không còn đúng
+    jd_updated_at: Optional[datetime] = Field(default=None)
+    # float32, đã chuẩn hóa L2. Postgres có pgvector thì có thêm cột vec (migration 0003)
+    embedding: bytes = Field(sa_column=Column(LargeBinary))
+
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+# 7. Bảng AnalysisJobRecord: trạng thái job /api/analyze (xem jobs.py). Worker gunicorn chạy job ghi vào đây,
+# worker nào nhận poll / SSE / DELETE cũng đọc được. Không đặt FK: job hết hạn sau ANALYSIS_JOB_TTL.
+class AnalysisJobRecord(SQLModel, table=True):
+    id: str = Field(primary_key=True, max_length=32)
+    user_id: uuid.UUID = Field(index=True)
+    status: str = Field(default="queued", max_length=16)
+    stage: str = Field(default="queued", max_length=16)
+    result: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONB_VARIANT))
+    partial: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONB_VARIANT))
+    error: Optional[str] = None
+    timings: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB_VARIANT))
+    version: int = Field(default=0)
+    cancel_requested: bool = Field(default=False)
+    # Epoch giây (time.time()) giống AnalysisJob, trả thẳng ra API
+    created_at: float = Field(default=0.0)
+    updated_at: float = Field(default=0.0, index=True)
+    # Lần cuối có client poll / nghe SSE ở bất kỳ worker nào
+    last_seen: float = Field(default=0.0)
+
+# 8. Bảng PurgedUser: guest vừa bị retention.py xóa. Mỗi process đọc định kỳ (PurgeFeed) để bỏ cache RAM theo user,
+# vì lượt dọn chỉ chạy ở 1 worker. Dòng cũ hơn PURGE_FEED_KEEP bị xóa ở lượt dọn sau.
+class PurgedUser(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: uuid.UUID
+    purged_at: datetime = Field(default_factory=datetime.now, index=True)
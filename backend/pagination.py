@@ -0,0 +1,76 @@
+# backend/pagination.py
+import json
+import base64
+import hashlib
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(400, detail="Invalid cursor")
+
+
+def keyset_after(model, cursor: Optional[str]):
+    """Điều kiện WHERE cho trang kế tiếp khi sắp xếp (created_at DESC, id DESC)."""
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < row_id),
+    )
+
+
+def resolve_columns(model, fields: Optional[str], summary_fields: Sequence[str]) -> Optional[List[Any]]:
+    """
+    fields=None        -> None (lấy cả row, như cũ)
+    fields=summary     -> các cột trong summary_fields
+    fields=a,b,c       -> đúng các cột đó (luôn kèm id + created_at để làm cursor)
+    """
+    if not fields:
+        return None
+    if fields == "summary":
+        names = list(summary_fields)
+    else:
+        names = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [n for n in names if n not in model.__table__.columns]
+        if unknown:
+            raise HTTPException(400, detail=f"Unknown fields: {', '.join(unknown)}")
+    for required in ("created_at", "id"):
+        if required not in names:
+            names.append(required)
+    return [getattr(model, n) for n in names]
+
+
+def compute_etag(body: bytes) -> str:
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+
+def list_response(request: Request, items: List[Any], next_cursor: Optional[str]) -> Response:
+    """JSON list + ETag; trả 304 nếu client gửi If-None-Match trùng (list không đổi)."""
+    body = json.dumps(jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = compute_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,13 @@
+# backend/pool_preload.py
+"""
+Chỉ import trong forkserver của cpu_pool (cuối FORKSERVER_PRELOAD), không import ở process server.
+Nạp trọng số model embedding 1 lần, không chạy inference (thread pool của torch tạo ra trước fork sẽ treo
+trong process con), rồi gc.freeze() -> mọi process con fork từ đây dùng chung model theo copy-on-write.
+"""
+import gc
+
+from core_logic import EMBEDDING_BACKEND, EMBEDDING_MODEL
+from cpu_pool import preload_worker_embeddings
+
+preload_worker_embeddings(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+gc.freeze()
@@ -0,0 +1,74 @@
+# backend/profiler.py
+"""
+Sampling profiler nhẹ (bật bằng PROFILER_SAMPLE_INTERVAL_MS > 0, mặc định tắt).
+1 thread nền chụp stack của mọi thread (sys._current_frames) mỗi N ms và đếm theo stack,
+xuất dạng "collapsed stack" (dùng được với flamegraph.pl / speedscope). Bắt được cả worker thread
+của job queue, không cần sửa code đang đo.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", "0"))
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "5000"))
+PROFILER_MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float, max_stacks: int):
+        self.interval = interval_ms / 1000
+        self.max_stacks = max_stacks
+        self.samples: Counter = Counter()
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f" [PROFILER] Sampling every {self.interval * 1000:.0f} ms")
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                key = ";".join(reversed(stack))
+                with self._lock:
+                    if key in self.samples or len(self.samples) < self.max_stacks:
+                        self.samples[key] += 1
+                    else:
+                        self.dropped += 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self._lock:
+            items = self.samples.most_common()
+            if reset:
+                self.samples.clear()
+                self.dropped = 0
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+profiler = SamplingProfiler(PROFILER_SAMPLE_INTERVAL_MS, PROFILER_MAX_STACKS)
@@ -0,0 +1,182 @@
+# backend/reports.py
+"""
+Tổng hợp số liệu cho trang Reports/Dashboard.
+Postgres: tính thẳng bằng SQL trên JSONB (dùng index ở migrations.py).
+SQLite (local): không có hàm JSONB -> lấy các cột cần thiết rồi tính bằng Python, cùng định dạng kết quả.
+"""
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from models import Application
+
+# Thứ tự các bước trong pipeline (khớp STATUS_CONFIG ở frontend); rejected không thuộc phễu
+FUNNEL_STAGES = ["new", "screening", "interview_scheduled", "offer_sent", "hired"]
+RADAR_DIMENSIONS = ["Hard Skills", "Soft Skills", "Experience", "Education", "Domain Knowledge"]
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def _keyword_clause(keyword: Optional[str]) -> str:
+    # Containment @> -> dùng được GIN jsonb_path_ops trên analysis_result (migration 0005)
+    return (
+        " AND analysis_result @> jsonb_build_object('matched_keywords', jsonb_build_array(CAST(:keyword AS text)))"
+        if keyword else ""
+    )
+
+
+def _load_rows(session: Session, user_id: uuid.UUID, keyword: Optional[str], with_result: bool = True):
+    """Đường fallback (SQLite): chỉ lấy các cột cần cho tính toán."""
+    columns = [Application.status, Application.match_score]
+    if with_result or keyword:
+        columns.append(Application.analysis_result)
+    rows = session.exec(select(*columns).where(Application.user_id == user_id)).all()
+    if keyword:
+        rows = [r for r in rows if keyword in ((r.analysis_result or {}).get("matched_keywords") or [])]
+    return rows
+
+
+def _funnel_from_counts(counts: Dict[str, int]) -> Dict[str, Any]:
+    # "reached": số hồ sơ đã tới ít nhất bước này (cộng dồn từ cuối phễu)
+    reached = 0
+    funnel = []
+    for stage in reversed(FUNNEL_STAGES):
+        reached += counts.get(stage, 0)
+        funnel.append({"status": stage, "count": counts.get(stage, 0), "reached": reached})
+    funnel.reverse()
+    return {
+        "total": sum(counts.values()),
+        "rejected": counts.get("rejected", 0),
+        "stages": funnel,
+        "other": {s: n for s, n in counts.items() if s not in FUNNEL_STAGES and s != "rejected"},
+    }
+
+
+def status_funnel(session: Session, user_id: uuid.UUID, keyword: Optional[str] = None) -> Dict[str, Any]:
+    if _is_postgres(session):
+        rows = session.execute(
+            text(
+                "SELECT status, count(*) AS n FROM application "
+                "WHERE user_id = CAST(:user_id AS uuid)" + _keyword_clause(keyword) + " GROUP BY status"
+            ),
+            {"user_id": str(user_id), "keyword": keyword},
+        ).all()
+        counts = {row.status: row.n for row in rows}
+    else:
+        counts = Counter(r.status for r in _load_rows(session, user_id, keyword, with_result=False))
+    return _funnel_from_counts(counts)
+
+
+def score_histogram(session: Session, user_id: uuid.UUID, buckets: int = 10, keyword: Optional[str] = None) -> Dict[str, Any]:
+    width = 100 / buckets
+    if _is_postgres(session):
+        # width_bucket: [0, 100) chia đều; điểm 100 rơi vào bucket buckets+1 -> LEAST đưa về bucket cuối,
+        # điểm âm rơi vào bucket 0 -> GREATEST đưa về bucket 1. NULL tính là 0 như nhánh SQLite bên dưới.
+        rows = session.execute(
+            text(
+                "SELECT GREATEST(LEAST(width_bucket(COALESCE(match_score, 0), 0, 100, :buckets), :buckets), 1) AS bucket, "
+                "count(*) AS n, avg(COALESCE(match_score, 0)) AS avg_score FROM application "
+                "WHERE user_id = CAST(:user_id AS uuid)" + _keyword_clause(keyword) + " GROUP BY 1"
+            ),
+            {"user_id": str(user_id), "buckets": buckets, "keyword": keyword},
+        ).all()
+        counts = {int(row.bucket): row.n for row in rows}
+        total = sum(counts.values())
+        average = sum(float(row.avg_score) * row.n for row in rows) / total if total else None
+    else:
+        scores = [r.match_score or 0 for r in _load_rows(session, user_id, keyword, with_result=False)]
+        counts = Counter(min(max(int(score // width) + 1, 1), buckets) for score in scores)
+        total = len(scores)
+        average = sum(scores) / total if total else None
+
+    return {
+        "total": total,
+        "average": round(average, 2) if average is not None else None,
+        "buckets": [
+            {
+                "from": round((i - 1) * width, 2),
+                "to": round(i * width, 2),
+                "count": counts.get(i, 0),
+            }
+            for i in range(1, buckets + 1)
+        ],
+    }
+
+
+def top_keywords(session: Session, user_id: uuid.UUID, limit: int = 20) -> List[Dict[str, Any]]:
+    if _is_postgres(session):
+        # Gom theo lower(trim()) để "Python" và "python " tính là 1; hiển thị dạng viết gặp nhiều nhất
+        rows = session.execute(
+            text(
+                "SELECT mode() WITHIN GROUP (ORDER BY kw) AS keyword, count(*) AS n "
+                "FROM application, jsonb_array_elements_text("
+                "  CASE WHEN jsonb_typeof(analysis_result -> 'matched_keywords') = 'array' "
+                "  THEN analysis_result -> 'matched_keywords' ELSE '[]'::jsonb END) AS kw "
+                "WHERE user_id = CAST(:user_id AS uuid) AND trim(kw) <> '' "
+                "GROUP BY lower(trim(kw)) ORDER BY n DESC, 1 LIMIT :limit"
+            ),
+            {"user_id": str(user_id), "limit": limit},
+        ).all()
+        return [{"keyword": row.keyword, "count": row.n} for row in rows]
+
+    counts: Counter = Counter()
+    spellings: Dict[str, Counter] = defaultdict(Counter)
+    for r in _load_rows(session, user_id, None):
+        keywords = (r.analysis_result or {}).get("matched_keywords") or []
+        if not isinstance(keywords, list):
+            continue
+        for kw in keywords:
+            if not isinstance(kw, str) or not kw.strip():
+                continue
+            key = kw.strip().lower()
+            counts[key] += 1
+            spellings[key][kw] += 1
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{"keyword": spellings[key].most_common(1)[0][0], "count": n} for key, n in ranked]
+
+
+def radar_averages(session: Session, user_id: uuid.UUID, keyword: Optional[str] = None) -> Dict[str, Any]:
+    if _is_postgres(session):
+        rows = session.execute(
+            text(
+                "SELECT key AS dimension, avg(value::numeric) AS avg_score, count(*) AS n "
+                "FROM application, jsonb_each_text("
+                "  CASE WHEN jsonb_typeof(analysis_result -> 'radar_chart') = 'object' "
+                "  THEN analysis_result -> 'radar_chart' ELSE '{}'::jsonb END) "
+                "WHERE user_id = CAST(:user_id AS uuid) AND value ~ '^-?[0-9]+(\\.[0-9]+)?$'" + _keyword_clause(keyword) +
+                " GROUP BY key"
+            ),
+            {"user_id": str(user_id), "keyword": keyword},
+        ).all()
+        stats = {row.dimension: (float(row.avg_score), row.n) for row in rows}
+    else:
+        sums: Dict[str, float] = defaultdict(float)
+        ns: Dict[str, int] = defaultdict(int)
+        for r in _load_rows(session, user_id, keyword):
+            radar = (r.analysis_result or {}).get("radar_chart") or {}
+            if not isinstance(radar, dict):
+                continue
+            for dim, value in radar.items():
+                try:
+                    sums[dim] += float(value)
+                except (TypeError, ValueError):
+                    continue
+                ns[dim] += 1
+        stats = {dim: (sums[dim] / ns[dim], ns[dim]) for dim in ns}
+
+    dimensions = RADAR_DIMENSIONS + sorted(d for d in stats if d not in RADAR_DIMENSIONS)
+    return {
+        "dimensions": [
+            {
+                "dimension": dim,
+                "average": round(stats[dim][0], 2) if dim in stats else None,
+                "count": stats[dim][1] if dim in stats else 0,
+            }
+            for dim in dimensions
+        ]
+    }
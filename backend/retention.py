@@ -0,0 +1,249 @@
+# backend/retention.py
+"""
+Dọn dữ liệu cũ ở background (thread khởi động từ lifespan, giống profiler/job_manager):
+- Guest không gửi request nào quá GUEST_RETENTION_DAYS ngày (theo User.last_seen_at) bị xóa cùng
+  Application / JobDescription / JdEmbedding / CvArtifactOwner của họ. Xóa theo batch RETENTION_BATCH_SIZE user,
+  mỗi batch 1 transaction ngắn + nghỉ RETENTION_BATCH_PAUSE giây -> không giữ lock / connection lâu.
+  Postgres: SELECT ... FOR UPDATE SKIP LOCKED nên nhiều process/replica chạy cùng lúc không giẫm nhau.
+- File trong TEMP_DIR cũ hơn TEMP_FILE_MAX_AGE giây (upload tạm còn sót lại) bị xóa.
+- user_id vừa xóa được ghi vào bảng purgeduser cùng transaction: lượt dọn chỉ chạy ở 1 process, các worker
+  gunicorn khác đọc bảng này (PurgeFeed.poll) để bỏ cache RAM theo user của mình.
+
+Chạy tay 1 lượt:
+    python retention.py            # xóa thật
+    python retention.py --dry-run  # chỉ đếm
+"""
+import os
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from database import engine
+from models import Application, CvArtifactOwner, JdEmbedding, JobDescription, PurgedUser, User
+
+GUEST_RETENTION_DAYS = float(os.getenv("GUEST_RETENTION_DAYS", "30"))  # 0 = không xóa guest
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))      # Giây giữa 2 lượt dọn, 0 = tắt hẳn
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.5"))
+RETENTION_INITIAL_DELAY = 60  # Không tranh DB với create_all / warm-up lúc khởi động
+TEMP_DIR = os.getenv("TEMP_DIR", "temp_uploads")
+TEMP_FILE_MAX_AGE = int(os.getenv("TEMP_FILE_MAX_AGE", "86400"))
+PURGE_FEED_INTERVAL = float(os.getenv("PURGE_FEED_INTERVAL", "5"))  # Giây giữa 2 lần mỗi process đọc bảng purgeduser
+PURGE_FEED_OVERLAP = timedelta(seconds=60)  # Đọc lùi lại: transaction xóa commit muộn hơn purged_at vẫn được thấy
+PURGE_FEED_KEEP = timedelta(days=1)
+
+PURGED_KINDS = ("users", "applications", "jds", "jd_embeddings", "cv_owners", "temp_files")
+
+
+class RetentionWorker:
+    def __init__(
+        self,
+        retention_days: float,
+        interval: int,
+        batch_size: int,
+        batch_pause: float,
+        temp_dir: str,
+        temp_max_age: int,
+    ):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.temp_dir = temp_dir
+        self.temp_max_age = temp_max_age
+        # Gọi với danh sách user_id vừa xóa (server dùng để bỏ các cache theo user trong RAM)
+        self.on_purged: Optional[Callable[[List[Any]], None]] = None
+        self.runs = 0
+        self.totals: Dict[str, int] = {kind: 0 for kind in PURGED_KINDS}
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+        guests = f"guests idle > {self.retention_days:g} days" if self.retention_days > 0 else "guests kept"
+        print(f" [RETENTION] Every {self.interval}s: {guests}, temp files > {self.temp_max_age}s")
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        delay = min(RETENTION_INITIAL_DELAY, self.interval)
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f" [RETENTION] Run failed: {e}")
+
+    # --- 1 lượt dọn ---
+    def run_once(self) -> Dict[str, Any]:
+        # Không cho 2 lượt chạy chồng nhau trong cùng process (vd: thread nền + gọi tay)
+        with self._lock:
+            started = time.perf_counter()
+            report: Dict[str, Any] = {kind: 0 for kind in PURGED_KINDS}
+            report.update(temp_bytes=0, batches=0)
+            if self.retention_days > 0:
+                self._purge_guests(report)
+                with engine.begin() as conn:
+                    conn.execute(delete(PurgedUser).where(PurgedUser.purged_at < datetime.now() - PURGE_FEED_KEEP))
+            self._clean_temp_dir(report)
+            report["seconds"] = round(time.perf_counter() - started, 3)
+            report["finished_at"] = datetime.now().isoformat()
+
+            self.runs += 1
+            for kind in PURGED_KINDS:
+                self.totals[kind] += report[kind]
+            self.last_run = report
+        print(
+            f" [RETENTION] Purged {report['users']} guests ({report['applications']} applications, {report['jds']} JDs, "
+            f"{report['jd_embeddings']} JD embeddings) in {report['batches']} batches, "
+            f"{report['temp_files']} temp files ({report['temp_bytes'] / 1e6:.1f} MB) in {report['seconds']}s"
+        )
+        return report
+
+    def cutoff(self) -> datetime:
+        return datetime.now() - timedelta(days=self.retention_days)
+
+    def _purge_guests(self, report: Dict[str, Any]):
+        cutoff = self.cutoff()
+        while not self._stop.is_set():
+            ids = self._purge_batch(cutoff, report)
+            if not ids:
+                break
+            report["batches"] += 1
+            if self.on_purged is not None:
+                self.on_purged(ids)
+            if len(ids) < self.batch_size or self._stop.wait(self.batch_pause):
+                break
+
+    def _purge_batch(self, cutoff: datetime, report: Dict[str, Any]) -> List[Any]:
+        with engine.begin() as conn:
+            # Điều kiện last_seen_at được kiểm tra lại trong cùng transaction với lệnh DELETE:
+            # guest quay lại đúng lúc này (last_seen_at vừa được cập nhật) không bị chọn
+            ids = conn.execute(
+                select(User.id)
+                .where(User.is_guest == True, User.last_seen_at < cutoff)  # noqa: E712
+                .order_by(User.last_seen_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not ids:
+                return []
+            # Bảng con trước (FK không có ON DELETE CASCADE ở tầng DB; cascade của Relationship chỉ chạy trong ORM)
+            report["applications"] += conn.execute(delete(Application).where(Application.user_id.in_(ids))).rowcount
+            report["jd_embeddings"] += conn.execute(delete(JdEmbedding).where(JdEmbedding.user_id.in_(ids))).rowcount
+            report["jds"] += conn.execute(delete(JobDescription).where(JobDescription.user_id.in_(ids))).rowcount
+            # Chỉ bỏ quyền dùng lại cv_hash; artifact dùng chung, tự bị đẩy ra theo CV_ARTIFACT_MAX_BYTES
+            report["cv_owners"] += conn.execute(delete(CvArtifactOwner).where(CvArtifactOwner.user_id.in_(ids))).rowcount
+            report["users"] += conn.execute(delete(User).where(User.id.in_(ids))).rowcount
+            now = datetime.now()
+            conn.execute(insert(PurgedUser), [{"user_id": user_id, "purged_at": now} for user_id in ids])
+        return list(ids)
+
+    def count_candidates(self) -> int:
+        if self.retention_days <= 0:
+            return 0
+        with engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(User).where(User.is_guest == True, User.last_seen_at < self.cutoff())  # noqa: E712
+            ).scalar_one()
+
+    def _clean_temp_dir(self, report: Dict[str, Any]):
+        if not self.temp_dir or not os.path.isdir(self.temp_dir):
+            return
+        cutoff = time.time() - self.temp_max_age
+        for root, dirs, files in os.walk(self.temp_dir, topdown=False):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.lstat(path)
+                    if st.st_mtime < cutoff:
+                        os.remove(path)
+                        report["temp_files"] += 1
+                        report["temp_bytes"] += st.st_size
+                except OSError as e:
+                    # File đang được request khác dùng / đã bị xóa -> để lượt sau
+                    print(f" [RETENTION] Could not remove {path}: {e}")
+            if root != self.temp_dir:
+                try:
+                    os.rmdir(root)  # Chỉ xóa được khi thư mục đã rỗng
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "retention_days": self.retention_days,
+            "interval": self.interval,
+            "runs": self.runs,
+            "purged": dict(self.totals),
+            "last_run": self.last_run,
+        }
+
+
+class PurgeFeed:
+    """
+    Đọc user_id mà lượt dọn (ở process bất kỳ) vừa xóa, tối đa 1 truy vấn / interval giây.
+    Kết quả có thể lặp lại trong khoảng PURGE_FEED_OVERLAP -> người gọi phải xử lý idempotent (vd: pop cache).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.since = datetime.now()  # Process mới chưa cache user nào -> bỏ qua các lượt xóa trước đó
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def poll(self) -> List[Any]:
+        if time.monotonic() < self._next_poll:
+            return []
+        with self._lock:
+            if time.monotonic() < self._next_poll:
+                return []
+            self._next_poll = time.monotonic() + self.interval
+            now = datetime.now()
+            try:
+                with engine.connect() as conn:
+                    ids = conn.execute(
+                        select(PurgedUser.user_id).where(PurgedUser.purged_at >= self.since - PURGE_FEED_OVERLAP)
+                    ).scalars().all()
+            except Exception as e:
+                print(f" [RETENTION] Purge feed warning: {e}")
+                return []
+            self.since = now
+        return list(set(ids))
+
+
+retention_worker = RetentionWorker(
+    retention_days=GUEST_RETENTION_DAYS,
+    interval=RETENTION_INTERVAL,
+    batch_size=RETENTION_BATCH_SIZE,
+    batch_pause=RETENTION_BATCH_PAUSE,
+    temp_dir=TEMP_DIR,
+    temp_max_age=TEMP_FILE_MAX_AGE,
+)
+purge_feed = PurgeFeed(interval=PURGE_FEED_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dọn guest không hoạt động + file tạm cũ (1 lượt)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm số guest sẽ bị xóa")
+    args = parser.parse_args()
+    if args.dry_run:
+        print(f" [RETENTION] {retention_worker.count_candidates()} guests idle since before {retention_worker.cutoff():%Y-%m-%d %H:%M}")
+    else:
+        print(retention_worker.run_once())
@@ -0,0 +1,62 @@
+# backend/retriever.py
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Lấy chỉ số của k điểm cao nhất (giảm dần). argpartition O(n) rồi chỉ sort k phần tử."""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class NumpyRetriever(BaseRetriever):
+    """
+    Retriever in-process cho 1 CV: giữ embedding của các chunk trong 1 ma trận float32 (n_chunks x dim).
+    Vì mọi backend embedding (embedding_backends.py) trả vector đã chuẩn hóa L2, cosine similarity = tích vô hướng,
+    nên top-k chỉ là 1 phép nhân ma trận-vector. Không cần tạo/xóa collection Chroma cho mỗi request.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    documents: List[Document]
+    matrix: Any  # np.ndarray, shape (n_chunks, dim)
+    k: int = 5
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Sequence[Document],
+        embedding: Embeddings,
+        k: int = 5,
+        vectors: Optional[Sequence[Sequence[float]]] = None,
+    ) -> "NumpyRetriever":
+        if vectors is None:
+            vectors = embedding.embed_documents([d.page_content for d in documents])
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(documents), -1)
+        return cls(embeddings=embedding, documents=list(documents), matrix=matrix, k=k)
+
+    def search_by_vector(self, query_vector: Sequence[float], k: Optional[int] = None) -> List[Tuple[int, float]]:
+        q = np.asarray(query_vector, dtype=np.float32)
+        scores = self.matrix @ q
+        idx = top_k_indices(scores, k or self.k)
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        hits = self.search_by_vector(self.embeddings.embed_query(query))
+        return [self.documents[i] for i, _ in hits]
@@ -0,0 +1,298 @@
+# backend/scoring.py
+"""
+Engine chấm điểm local, deterministic cho BƯỚC 2 của prompt (thay cho việc để Gemini tự đếm):
+  1. Tách JD thành từng dòng yêu cầu, phân loại Bắt buộc / Ưu tiên bằng đúng bộ từ khóa EN + VI của CORE_PROMPT.
+  2. Cosine similarity (JD line x CV chunk) trên embedding MiniLM đã chuẩn hóa: 1 phép nhân ma trận.
+  3. Tìm từ khóa kỹ năng trong JD và CV bằng automaton Aho-Corasick (1 lượt quét cho cả bộ từ điển).
+Cùng input -> luôn cùng output, không tốn token, vài chục ms.
+"""
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ngưỡng cosine để coi 1 dòng JD là "có bằng chứng" trong CV (MiniLM: cặp liên quan thường 0.45-0.75)
+SCORING_MATCH_THRESHOLD = float(os.getenv("SCORING_MATCH_THRESHOLD", "0.5"))
+
+# Giữ đồng bộ với BƯỚC 2 trong CORE_PROMPT
+NICE_TO_HAVE_MARKERS_EN = ["nice to have", "plus", "preferred", "advantage", "desired", "bonus", "optional", "willing to"]
+NICE_TO_HAVE_MARKERS_VI = ["ưu tiên", "lợi thế", "điểm cộng", "không bắt buộc", "mong muốn", "nếu có"]
+
+_NICE_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(m) for m in NICE_TO_HAVE_MARKERS_EN + NICE_TO_HAVE_MARKERS_VI) + r")(?!\w)",
+    re.IGNORECASE,
+)
+_BULLET_RE = re.compile(r"^\s*(?:[-*•●▪+–]|\d+[.)])\s*")
+
+# Từ điển kỹ năng cứng: tên chuẩn -> các cách viết được nhận diện (chỉ các alias này được match,
+# không phân biệt hoa thường). Tên trùng từ thường / quá ngắn ("excel", "swift", "Go", "R"...) chỉ để
+# dạng viết rõ ràng ở đây ("golang", "microsoft excel"), dạng ngắn nằm ở STRICT_SKILL_PATTERNS.
+SKILL_VOCABULARY: Dict[str, List[str]] = {
+    # Ngôn ngữ
+    "Python": ["python"], "Java": ["java"], "JavaScript": ["javascript", "js"], "TypeScript": ["typescript"],
+    "C++": ["c++", "cpp"], "C#": ["c#", "csharp", ".net", "dotnet"], "Go": ["golang"], "Rust": ["rust"],
+    "PHP": ["php"], "Ruby": ["ruby"], "Kotlin": ["kotlin"], "Swift": ["swiftui"], "Scala": ["scala"],
+    "SQL": ["sql"], "Bash": ["bash", "shell script"], "Dart": ["dart"],
+    # Backend / web
+    "FastAPI": ["fastapi"], "Django": ["django"], "Flask": ["flask"], "Spring Boot": ["spring boot"],
+    "Node.js": ["node.js", "nodejs"], "Express": ["express.js", "expressjs"], "NestJS": ["nestjs"],
+    "Laravel": ["laravel"], "ASP.NET": ["asp.net"], "REST API": ["rest api", "restful"], "GraphQL": ["graphql"],
+    "gRPC": ["grpc"], "Microservices": ["microservices", "microservice"],
+    # Frontend / mobile
+    "React": ["react", "reactjs", "react.js"], "Vue": ["vue", "vuejs", "vue.js"], "Angular": ["angular"],
+    "Next.js": ["next.js", "nextjs"], "HTML": ["html", "html5"], "CSS": ["css", "css3"], "Tailwind CSS": ["tailwind"],
+    "Redux": ["redux"], "Flutter": ["flutter"], "React Native": ["react native"], "Android": ["android"], "iOS": ["ios"],
+    # Dữ liệu
+    "PostgreSQL": ["postgresql", "postgres"], "MySQL": ["mysql"], "SQL Server": ["sql server", "mssql"],
+    "Oracle": ["oracle database", "oracle db", "pl/sql"], "MongoDB": ["mongodb", "mongo"], "Redis": ["redis"], "Elasticsearch": ["elasticsearch"],
+    "Kafka": ["kafka"], "RabbitMQ": ["rabbitmq"], "Spark": ["spark", "pyspark"], "Hadoop": ["hadoop"],
+    "Airflow": ["airflow"], "dbt": ["dbt"], "Snowflake": ["snowflake"], "BigQuery": ["bigquery"],
+    "Pandas": ["pandas"], "NumPy": ["numpy"], "Power BI": ["power bi", "powerbi"], "Tableau": ["tableau"],
+    "Excel": ["microsoft excel", "ms excel"], "ETL": ["etl"], "Data Warehouse": ["data warehouse"],
+    # AI / ML
+    "Machine Learning": ["machine learning"], "Deep Learning": ["deep learning"], "NLP": ["nlp"],
+    "Computer Vision": ["computer vision"], "LLM": ["llm", "llms", "large language model"], "RAG": ["rag"],
+    "LangChain": ["langchain"], "TensorFlow": ["tensorflow"], "PyTorch": ["pytorch"], "scikit-learn": ["scikit-learn", "sklearn"],
+    "Hugging Face": ["hugging face", "huggingface", "transformers"],
+    # DevOps / cloud
+    "Docker": ["docker"], "Kubernetes": ["kubernetes", "k8s"], "AWS": ["aws", "amazon web services"],
+    "Azure": ["azure"], "GCP": ["gcp", "google cloud"], "Terraform": ["terraform"], "Ansible": ["ansible"],
+    "CI/CD": ["ci/cd", "cicd", "ci cd"], "Jenkins": ["jenkins"], "GitHub Actions": ["github actions"],
+    "GitLab CI": ["gitlab ci"], "Git": ["git"], "Linux": ["linux", "ubuntu"], "Nginx": ["nginx"],
+    "Prometheus": ["prometheus"], "Grafana": ["grafana"],
+    # Quy trình / kiểm thử
+    "Agile": ["agile"], "Scrum": ["scrum"], "Jira": ["jira"], "Unit Testing": ["unit test", "unit testing"],
+    "Selenium": ["selenium"], "OOP": ["oop", "object-oriented"], "Design Patterns": ["design patterns", "design pattern"],
+    "System Design": ["system design"], "Figma": ["figma"],
+}
+
+# Kỹ năng có tên là từ thường / 1-2 chữ cái: phân biệt hoa thường + loại ngữ cảnh văn xuôi.
+# "excel at", "swift delivery", "Oracle of ...", "TS/SCI", "R&D", "C-level", "Go to" không phải kỹ năng.
+_TOKEN_START = r"(?<![\w+#&'’])"
+_TOKEN_END = r"(?![\w+#&'’])"
+STRICT_SKILL_PATTERNS: Dict[str, List[str]] = {
+    "Go": [_TOKEN_START + r"Go" + _TOKEN_END + r"(?!\s+(?:to|for|ahead|back|live|beyond)\b)"],
+    "R": [_TOKEN_START + r"R" + _TOKEN_END + r"(?!\s*&)"],
+    "C": [r"(?<![\w+#&'’-])C(?![\w+#&'’-])"],
+    "Excel": [_TOKEN_START + r"Excel" + _TOKEN_END + r"(?!\s+(?:at|in)\b)"],
+    "Swift": [_TOKEN_START + r"Swift" + _TOKEN_END],
+    "Oracle": [_TOKEN_START + r"Oracle" + _TOKEN_END + r"(?!\s+of\b)"],
+    "TypeScript": [r"(?<![\w/])TS(?![\w/])"],
+    "Machine Learning": [r"(?<!\w)ML(?!\w)"],
+}
+_STRICT_SKILL_RES = [(re.compile(p), skill) for skill, patterns in STRICT_SKILL_PATTERNS.items() for p in patterns]
+
+
+class AhoCorasick:
+    """
+    Automaton Aho-Corasick không phân biệt hoa thường, chỉ nhận match trọn từ
+    (tránh "java" trong "javascript", "go" trong "google").
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]  # (độ dài pattern, giá trị)
+        self._built = False
+
+    def add(self, pattern: str, value: str):
+        node = 0
+        for ch in pattern.lower():
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern.lower()), value))
+        self._built = False
+
+    def build(self):
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """Trả về [(vị trí bắt đầu, giá trị)] theo thứ tự xuất hiện."""
+        if not self._built:
+            self.build()
+        lowered = text.lower()
+        found = []
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start = i - length + 1
+                end = i + 1
+                if _is_boundary(lowered, start - 1) and _is_boundary(lowered, end):
+                    found.append((start, value))
+        found.sort()
+        return found
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    if pos < 0 or pos >= len(text):
+        return True
+    ch = text[pos]
+    return not (ch.isalnum() or ch in "+#_")
+
+
+def build_skill_matcher(vocabulary: Optional[Dict[str, List[str]]] = None) -> AhoCorasick:
+    matcher = AhoCorasick()
+    for canonical, aliases in (vocabulary or SKILL_VOCABULARY).items():
+        for pattern in aliases:
+            matcher.add(pattern, canonical)
+    matcher.build()
+    return matcher
+
+
+_skill_matcher: Optional[AhoCorasick] = None
+
+
+def get_skill_matcher() -> AhoCorasick:
+    global _skill_matcher
+    if _skill_matcher is None:
+        _skill_matcher = build_skill_matcher()
+    return _skill_matcher
+
+
+def find_skills(text: str) -> List[str]:
+    """Danh sách kỹ năng (tên chuẩn, không trùng) theo thứ tự xuất hiện đầu tiên."""
+    found = get_skill_matcher().find_all(text)
+    found.extend((m.start(), skill) for pattern, skill in _STRICT_SKILL_RES for m in pattern.finditer(text))
+    found.sort()
+    seen = []
+    for _, skill in found:
+        if skill not in seen:
+            seen.append(skill)
+    return seen
+
+
+@dataclass
+class JdRequirement:
+    text: str
+    kind: str  # "must_have" | "nice_to_have"
+    skills: List[str] = field(default_factory=list)
+
+
+def parse_jd_requirements(jd_text: str) -> List[JdRequirement]:
+    """Mỗi dòng không rỗng của JD là 1 yêu cầu (quy tắc "1 ĐỀU" của prompt)."""
+    requirements = []
+    for raw in (jd_text or "").splitlines():
+        line = _BULLET_RE.sub("", raw).strip()
+        if not line:
+            continue
+        kind = "nice_to_have" if _NICE_RE.search(line) else "must_have"
+        requirements.append(JdRequirement(text=line, kind=kind, skills=find_skills(line)))
+    return requirements
+
+
+@dataclass
+class LocalScore:
+    requirements: List[JdRequirement]
+    matched: List[bool]
+    similarity: List[float]
+    evidence: List[str]
+    matched_keywords: List[str]
+
+    def to_result_fields(self) -> Dict[str, Any]:
+        """Các trường deterministic của JobMatchResult."""
+        total = len(self.requirements)
+        matched_total = sum(self.matched)
+        must = [m for r, m in zip(self.requirements, self.matched) if r.kind == "must_have"]
+        nice = [m for r, m in zip(self.requirements, self.matched) if r.kind == "nice_to_have"]
+        return {
+            "matching_score": {
+                "percentage": round(matched_total * 100 / total) if total else 0,
+                "explanation": f"Matched {matched_total}/{total} requirements",
+            },
+            "requirements_breakdown": {
+                "must_have_ratio": f"{sum(must)}/{len(must)}",
+                "nice_to_have_ratio": f"{sum(nice)}/{len(nice)}",
+            },
+            "matched_keywords": self.matched_keywords,
+        }
+
+    def prompt_summary(self) -> str:
+        """Bảng trạng thái từng dòng JD để đưa vào NARRATIVE_PROMPT."""
+        lines = []
+        for req, ok in zip(self.requirements, self.matched):
+            kind = "Bắt buộc" if req.kind == "must_have" else "Ưu tiên"
+            lines.append(f"- [{'Matched' if ok else 'Not Matched'}] ({kind}) {req.text}")
+        if self.matched_keywords:
+            lines.append(f"- Matched keywords: {', '.join(self.matched_keywords)}")
+        return "\n".join(lines)
+
+
+def score_requirements(
+    requirements: Sequence[JdRequirement],
+    line_vectors: Any,
+    chunk_matrix: Any,
+    chunk_texts: Sequence[str],
+    threshold: Optional[float] = None,
+) -> LocalScore:
+    """
+    line_vectors: (n_lines, dim), chunk_matrix: (n_chunks, dim) - đều đã chuẩn hóa L2.
+    1 dòng JD được tính Matched khi:
+      - cosine lớn nhất với 1 chunk CV >= threshold, hoặc
+      - dòng có kỹ năng cứng và MỌI kỹ năng đó đều xuất hiện trong CV.
+    """
+    threshold = SCORING_MATCH_THRESHOLD if threshold is None else threshold
+    cv_text = "\n".join(chunk_texts)
+    cv_skills = set(find_skills(cv_text))
+
+    lines = np.asarray(line_vectors, dtype=np.float32).reshape(len(requirements), -1)
+    chunks = np.asarray(chunk_matrix, dtype=np.float32)
+    if len(requirements) and chunks.size:
+        sims = lines @ chunks.T
+        best_idx = sims.argmax(axis=1)
+        best = sims[np.arange(len(requirements)), best_idx]
+    else:
+        best_idx = np.zeros(len(requirements), dtype=np.int64)
+        best = np.zeros(len(requirements), dtype=np.float32)
+
+    matched, similarity, evidence = [], [], []
+    for i, req in enumerate(requirements):
+        skills_ok = bool(req.skills) and all(s in cv_skills for s in req.skills)
+        ok = bool(best[i] >= threshold) or skills_ok
+        matched.append(ok)
+        similarity.append(round(float(best[i]), 4))
+        evidence.append(chunk_texts[int(best_idx[i])] if ok and chunk_texts else "")
+
+    jd_skills: List[str] = []
+    for req in requirements:
+        for s in req.skills:
+            if s not in jd_skills:
+                jd_skills.append(s)
+    matched_keywords = [s for s in jd_skills if s in cv_skills]
+
+    return LocalScore(
+        requirements=list(requirements),
+        matched=matched,
+        similarity=similarity,
+        evidence=evidence,
+        matched_keywords=matched_keywords,
+    )
+
+
+def scoring_fingerprint() -> str:
+    """Mô tả cấu hình scoring, đưa vào PROMPT_VERSION để cache tự đổi khi từ điển/ngưỡng đổi."""
+    return repr((SCORING_MATCH_THRESHOLD, NICE_TO_HAVE_MARKERS_EN, NICE_TO_HAVE_MARKERS_VI, sorted(SKILL_VOCABULARY.items()), sorted(STRICT_SKILL_PATTERNS.items())))
@@ -1,35 +1,79 @@
 # backend/server.py
+import time
+_BOOT_STARTED = time.perf_counter()
+
 import os
-import shutil
+import json
+import tempfile
+import threading
+import asyncio
 import uvicorn
 import uuid
 from contextlib import asynccontextmanager
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Response, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from core_logic import analyze_cv_logic
-from database import create_db_and_tables, get_session
+from core_logic import analyze_cv_logic, warm_up, readiness
+from cache import LRUCache, analysis_cache, hash_bytes, make_cache_key_for_hash
+from artifacts import cv_artifact_store
+from jd_index import JD_MATCH_MAX_K, cv_vector, index_jd_background, jd_index
+from jobs import job_manager, QueueFullError, ANALYSIS_RETRY_AFTER
+from llm_scheduler import llm_scheduler
+from cpu_pool import cpu_pool
+from batch import run_batch_analysis, BATCH_MAX_FILES
+from ingest import IngestError, check_upload_size
+from database import create_db_and_tables, get_session, get_async_session, dispose_async_engine, all_pool_stats, engine
+import reports
+import transfer
+import metrics
+from profiler import profiler
+from retention import PURGED_KINDS, TEMP_DIR, purge_feed, retention_worker
+from pagination import MAX_PAGE_SIZE, encode_cursor, keyset_after, list_response, resolve_columns
 # Import models mới với cấu trúc JSONB
 from models import JobDescription, Application, User, JobDescriptionUpdate
 
-TEMP_DIR = "temp_uploads"
+# Upload giờ được parse thẳng trong RAM; thư mục này chỉ còn giữ lại cho tương thích (Dockerfile tạo sẵn).
+# File sót lại trong đó được retention_worker dọn định kỳ.
 os.makedirs(TEMP_DIR, exist_ok=True)
 
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+# Stream kết quả từng phần của Gemini tới client (SSE event "partial" / field "partial" khi poll)
+ANALYSIS_STREAMING = os.getenv("ANALYSIS_STREAMING", "1") == "1"
+
 # LIFESPAN: Quản lý vòng đời DB
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    print(f" [BOOT] Modules imported in {time.perf_counter() - _BOOT_STARTED:.3f}s")
     print(" [DBA] Server init...")
+    phase_started = time.perf_counter()
     try:
         # Thử tạo bảng. Nếu DB chưa connect được thì bỏ qua để Server vẫn lên (tránh lỗi No Open Ports)
         create_db_and_tables()
-        print(" [DBA] Database schema verified.")
+        print(f" [DBA] Database schema verified in {time.perf_counter() - phase_started:.3f}s.")
     except Exception as e:
         print(f"[DBA] Database connection warning: {e}")
+    job_manager.start()
+    profiler.start()
+    retention_worker.start()
+    if WARMUP_ON_STARTUP:
+        # Nạp MiniLM + client Gemini ở background, server nhận request ngay (xem /api/ready)
+        threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+    print(f" [BOOT] Server ready to accept requests after {time.perf_counter() - _BOOT_STARTED:.3f}s")
     yield
+    retention_worker.stop()
+    profiler.stop()
+    job_manager.shutdown()
+    cpu_pool.shutdown()
+    await dispose_async_engine()
     print(" Server shutting down...")
 
 app = FastAPI(title="CareerFlow Enterprise API", version="3.0", lifespan=lifespan)
@@ -40,22 +84,132 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Cache", "Retry-After", "Server-Timing"],
 )
 
+metrics.instrument_engine(engine)
+
+# METRICS MIDDLEWARE: latency theo route + header Server-Timing (db, các stage chạy trong request)
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    token = metrics.start_request_timings()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = metrics.end_request_timings(token)
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            elapsed,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+    header = metrics.format_server_timing(timings + [("total", elapsed)])
+    existing = response.headers.get("Server-Timing")
+    response.headers["Server-Timing"] = f"{existing}, {header}" if existing else header
+    return response
+
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "CareerFlow Database System is Operational"}
 
+@app.get("/api/ready")
+def read_readiness(response: Response):
+    """Readiness: 200 khi model embedding + client LLM đã warm, 503 khi còn đang nạp."""
+    state = readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
 # SECURITY: QUẢN LÝ PHIÊN NGƯỜI DÙNG (Lazy Registration)
-async def get_current_user(
+# Cache các user_id đã chắc chắn có trong DB -> request sau không cần round trip tới Supabase
+KNOWN_USER_CACHE_SIZE = int(os.getenv("KNOWN_USER_CACHE_SIZE", "10000"))
+KNOWN_USER_CACHE_TTL = int(os.getenv("KNOWN_USER_CACHE_TTL", "3600"))
+_known_users = LRUCache(maxsize=KNOWN_USER_CACHE_SIZE, ttl=KNOWN_USER_CACHE_TTL)
+# Ghi User.last_seen_at tối đa 1 lần / USER_TOUCH_INTERVAL giây cho mỗi user (mỗi process),
+# retention.py chỉ cần độ chính xác cỡ ngày nên không phải UPDATE ở mọi request
+USER_TOUCH_INTERVAL = int(os.getenv("USER_TOUCH_INTERVAL", "3600"))
+_touched_users = LRUCache(maxsize=KNOWN_USER_CACHE_SIZE, ttl=USER_TOUCH_INTERVAL)
+_session_stats = {"db_lookups": 0, "users_created": 0, "touches": 0}
+
+def _create_guest_user(session: Session, user_uuid: uuid.UUID):
+    """
+    INSERT ... ON CONFLICT DO NOTHING: 2 request song song đầu tiên của cùng 1 trình duyệt
+    không còn đua nhau và làm 1 request lỗi khóa chính.
+    """
+    now = datetime.now()
+    values = {"id": user_uuid, "is_guest": True, "created_at": now, "last_seen_at": now}
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        result = session.exec(insert(User).values(**values).on_conflict_do_nothing(index_elements=["id"]))
+        session.commit()
+        created = result.rowcount == 1
+    else:
+        # DB khác: insert thường, trùng khóa thì coi như user đã được request kia tạo rồi
+        try:
+            session.add(User(**values))
+            session.commit()
+            created = True
+        except IntegrityError:
+            session.rollback()
+            created = False
+    if created:
+        _session_stats["users_created"] += 1
+        print(f" [DBA] Detected new visitor. Created Guest User: {user_uuid}")
+    _touched_users.set(user_uuid, True)
+
+def _touch_user(session: Session, user_uuid: uuid.UUID):
+    """
+    Cập nhật last_seen_at nếu lần ghi trước đã quá USER_TOUCH_INTERVAL. Điều kiện nằm trong câu UPDATE
+    nên nhiều process cùng chạy cũng chỉ 1 process thực sự ghi. Lỗi không làm hỏng request.
+    """
+    if _touched_users.get(user_uuid):
+        return
+    now = datetime.now()
+    try:
+        session.exec(
+            update(User)
+            .where(User.id == user_uuid)
+            .where(or_(User.last_seen_at == None, User.last_seen_at < now - timedelta(seconds=USER_TOUCH_INTERVAL)))  # noqa: E711
+            .values(last_seen_at=now)
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f" [DBA] last_seen_at update warning: {e}")
+        return
+    _session_stats["touches"] += 1
+    _touched_users.set(user_uuid, True)
+
+def _forget_users(user_ids):
+    # retention_worker (process này, hoặc worker khác qua purge_feed) vừa xóa các guest này -> bỏ cache trong RAM,
+    # request sau (nếu có) tạo lại user
+    for user_id in user_ids:
+        _known_users.pop(user_id)
+        _touched_users.pop(user_id)
+        jd_index.memory.pop(user_id)
+    cv_artifact_store.forget_users(user_ids)
+
+retention_worker.on_purged = _forget_users
+
+def get_current_user(
     x_session_id: str = Header(...), 
     session: Session = Depends(get_session)
 ) -> User:
     """
     Hàm này đóng vai trò như 'Cổng Hải Quan'.
     1. Kiểm tra session_id gửi lên có hợp lệ UUID không.
-    2. Tìm trong DB xem User này tồn tại chưa.
-    3. Nếu chưa -> Tự động cấp 'Hộ chiếu' (Tạo User mới) ngay lập tức.
+    2. Nếu user_id đã có trong cache -> cho qua luôn, không chạm DB.
+    3. Chưa có -> Tìm trong DB; nếu chưa tồn tại thì tự động cấp 'Hộ chiếu' (upsert User mới).
+    Các endpoint chỉ dùng current_user.id nên trả về User tạm (không gắn session) là đủ.
     """
     if not x_session_id:
         raise HTTPException(status_code=400, detail="Missing Session ID")
@@ -65,31 +219,85 @@ async def get_current_user(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid Session ID format (Must be UUID)")
 
+    # Guest vừa bị lượt dọn ở worker khác xóa -> bỏ cache RAM của process này trước khi tin _known_users
+    purged = purge_feed.poll()
+    if purged:
+        _forget_users(purged)
+
+    if _known_users.get(user_uuid):
+        _touch_user(session, user_uuid)
+        return User(id=user_uuid, is_guest=True)
+
+    _session_stats["db_lookups"] += 1
     user = session.get(User, user_uuid)
     
     if not user:
-        print(f" [DBA] Detected new visitor. Creating Guest User: {user_uuid}")
+        _create_guest_user(session, user_uuid)
         user = User(id=user_uuid, is_guest=True)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        
+    else:
+        _touch_user(session, user_uuid)
+
+    _known_users.set(user_uuid, True)
     return user
 
+def session_cache_stats() -> dict:
+    known = _known_users.stats()
+    return {
+        "cache_hits": known["hits"],
+        "cache_size": known["size"],
+        "db_lookups": _session_stats["db_lookups"],
+        "users_created": _session_stats["users_created"],
+        "last_seen_updates": _session_stats["touches"],
+    }
+
+# PAGINATION HELPERS
+JD_SUMMARY_FIELDS = ("id", "user_id", "title", "company", "created_at", "updated_at")
+APPLICATION_SUMMARY_FIELDS = ("id", "user_id", "job_title", "company_name", "status", "match_score", "created_at")
+
+async def _paginate(request: Request, session: AsyncSession, query, limit: Optional[int], projected: bool):
+    # Lấy dư 1 dòng để biết còn trang sau hay không
+    if limit:
+        query = query.limit(limit + 1)
+    rows = (await session.exec(query)).all()
+    items = [dict(row._mapping) for row in rows] if projected else list(rows)
+
+    next_cursor = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        last_created, last_id = (last["created_at"], last["id"]) if projected else (last.created_at, last.id)
+        next_cursor = encode_cursor(last_created, last_id)
+    return list_response(request, items, next_cursor)
+
 # API: JD LIBRARY (Đã áp dụng User Isolation)
 
-@app.get("/api/jds", response_model=List[JobDescription])
-def read_jds(
-    session: Session = Depends(get_session),
+@app.get("/api/jds")
+async def read_jds(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Keyset pagination trên (created_at, id): ?limit=20&cursor=<X-Next-Cursor của trang trước>.
+    ?fields=summary bỏ cột content ngay ở tầng SQL. Hỗ trợ ETag / If-None-Match -> 304.
+    """
     # CHỈ trả về dữ liệu của chính user đó (Isolation)
-    query = select(JobDescription).where(JobDescription.user_id == current_user.id).order_by(JobDescription.created_at.desc())
-    return session.exec(query).all()
+    columns = resolve_columns(JobDescription, fields, JD_SUMMARY_FIELDS)
+    query = select(*columns) if columns else select(JobDescription)
+    query = query.where(JobDescription.user_id == current_user.id)
+    after = keyset_after(JobDescription, cursor)
+    if after is not None:
+        query = query.where(after)
+    query = query.order_by(JobDescription.created_at.desc(), JobDescription.id.desc())
+    return await _paginate(request, session, query, limit, projected=bool(columns))
 
 @app.post("/api/jds", response_model=JobDescription)
 def create_jd(
     jd: JobDescription, 
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -100,12 +308,77 @@ def create_jd(
     session.add(jd)
     session.commit()
     session.refresh(jd)
+    # Embed JD cho /api/jds/match sau khi đã trả response
+    background_tasks.add_task(index_jd_background, jd.id)
     return jd
 
+@app.post("/api/jds/match")
+async def match_jds(
+    file: Optional[UploadFile] = File(None),
+    cv_hash: Optional[str] = Form(None),
+    k: int = Form(5, ge=1, le=JD_MATCH_MAX_K),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Top-k JD trong thư viện của user gần với CV nhất (cosine giữa vector CV và vector JD).
+    Chỉ dùng embedding, không gọi LLM. Gửi file PDF hoặc cv_hash của CV đã upload.
+    """
+    started = time.perf_counter()
+    if file is not None:
+        file_bytes = await _read_upload(file)
+        cv_hash = hash_bytes(file_bytes)
+        filename = file.filename
+    elif cv_hash:
+        file_bytes, filename = None, "upload.pdf"
+    else:
+        raise HTTPException(400, detail="Must provide file OR cv_hash")
+
+    def run():
+        # cv_hash của người khác -> 404 như CV không tồn tại
+        if file_bytes is not None:
+            cv_artifact_store.add_owners(current_user.id, [cv_hash])
+        elif not cv_artifact_store.is_owner(current_user.id, cv_hash):
+            raise HTTPException(404, detail="CV not found, please upload the PDF again")
+        try:
+            artifact = cv_artifact_store.get_or_build(cv_hash, file_bytes, os.path.basename(filename or "upload.pdf"))
+        except IngestError as e:
+            raise HTTPException(400, detail=str(e))
+        if artifact is None:
+            raise HTTPException(404, detail="CV not found, please upload the PDF again")
+        indexed = jd_index.ensure_user_indexed(session, current_user.id)
+        hits = jd_index.top_k(session, current_user.id, cv_vector(artifact.matrix), k)
+        jds = {
+            jd.id: jd
+            for jd in session.exec(
+                select(JobDescription).where(
+                    JobDescription.id.in_([jd_id for jd_id, _ in hits]),
+                    JobDescription.user_id == current_user.id,
+                )
+            ).all()
+        }
+        matches = [
+            {"jd_id": jd_id, "title": jds[jd_id].title, "company": jds[jd_id].company, "similarity": score}
+            for jd_id, score in hits
+            if jd_id in jds
+        ]
+        return indexed, matches
+
+    # Parse/embed + index bù + đọc JD đều là I/O blocking trên session sync -> chạy hết trên threadpool,
+    # event loop không đụng tới session
+    indexed, matches = await run_in_threadpool(run)
+    return {
+        "cv_hash": cv_hash,
+        "matches": matches,
+        "indexed_now": indexed,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
 @app.patch("/api/jds/{jd_id}")
 def update_jd(
     jd_id: int, 
     payload: JobDescriptionUpdate, # Dùng Pydantic model để validate input
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -125,6 +398,8 @@ def update_jd(
     session.add(db_jd)
     session.commit()
     session.refresh(db_jd)
+    # updated_at đổi -> vector cũ tự bị coi là cũ (stale); embed lại ở background
+    background_tasks.add_task(index_jd_background, db_jd.id)
     return db_jd
 
 @app.delete("/api/jds/{jd_id}")
@@ -140,19 +415,51 @@ def delete_jd(
     if not db_jd:
         raise HTTPException(status_code=404, detail="JD not found or access denied")
         
+    jd_index.remove(session, db_jd.id, current_user.id)
     session.delete(db_jd)
     session.commit()
     return {"ok": True}
 
 # API: APPLICATIONS (Kết quả AI)
 
-@app.get("/api/applications", response_model=List[Application])
-def read_applications(
+@app.get("/api/applications")
+async def read_applications(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = Query(None, description="Lọc theo status, nhiều giá trị cách nhau bởi dấu phẩy"),
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    ?fields=summary chỉ lấy title/company/status/score (không kéo analysis_result JSONB về).
+    Không truyền limit -> trả toàn bộ như trước (tương thích frontend cũ).
+    """
+    columns = resolve_columns(Application, fields, APPLICATION_SUMMARY_FIELDS)
+    query = select(*columns) if columns else select(Application)
+    query = query.where(Application.user_id == current_user.id)
+    if status:
+        query = query.where(Application.status.in_([s.strip() for s in status.split(",") if s.strip()]))
+    after = keyset_after(Application, cursor)
+    if after is not None:
+        query = query.where(after)
+    query = query.order_by(Application.created_at.desc(), Application.id.desc())
+    return await _paginate(request, session, query, limit, projected=bool(columns))
+
+@app.get("/api/applications/{app_id}", response_model=Application)
+def read_application(
+    app_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    query = select(Application).where(Application.user_id == current_user.id).order_by(Application.created_at.desc())
-    return session.exec(query).all()
+    """Chi tiết 1 application (kèm analysis_result) cho màn hình dùng list ở chế độ summary."""
+    app = session.exec(
+        select(Application).where(Application.id == app_id, Application.user_id == current_user.id)
+    ).first()
+    if not app:
+        raise HTTPException(404, detail="Not found or access denied")
+    return app
 
 @app.post("/api/applications", response_model=Application)
 def create_application(
@@ -209,16 +516,165 @@ def update_application(
     session.refresh(app)
     return app
 
-# ANALYZE ENDPOINT
-@app.post("/api/analyze")
-async def analyze_endpoint(
-    file: UploadFile = File(...), 
-    jd_text: Optional[str] = Form(None),
-    jd_id: Optional[int] = Form(None),
+# API: EXPORT / IMPORT NDJSON (chuyển dữ liệu giữa môi trường, seed thư viện JD - xem transfer.py)
+@app.get("/api/export")
+def export_data(
+    types: str = Query("jds,applications", description="jds, applications hoặc cả hai (cách nhau bởi dấu phẩy)"),
+    current_user: User = Depends(get_current_user)
+):
+    kinds = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = set(kinds) - set(transfer.EXPORT_KEYS)
+    if not kinds or unknown:
+        raise HTTPException(400, detail=f"types must be a subset of {', '.join(transfer.EXPORT_KEYS)}")
+    filename = f"careerflow-export-{datetime.now():%Y%m%d-%H%M%S}.ndjson"
+    return StreamingResponse(
+        transfer.iter_export(current_user.id, kinds),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/api/import")
+async def import_data(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Body là NDJSON (định dạng của /api/export, hoặc tự viết: {"type": "jd", "title": ..., "content": ...}).
+    Body được ghi tạm ra SpooledTemporaryFile (RAM tới 1 MB, quá thì ra đĩa) trước khi xử lý, vì StreamingResponse
+    của Starlette đọc receive() để phát hiện client ngắt kết nối -> không đọc tiếp request body được khi đã trả response.
+    Response là NDJSON: "error" cho từng dòng hỏng, "progress" sau mỗi batch đã commit, "summary" ở cuối.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > transfer.IMPORT_MAX_BYTES:
+            spool.close()
+            raise HTTPException(413, detail=f"Import file too large (max {transfer.IMPORT_MAX_BYTES} bytes)")
+        spool.write(chunk)
+    spool.seek(0)
+
+    def ndjson_stream():
+        try:
+            yield from transfer.iter_import(spool, current_user.id)
+        finally:
+            spool.close()
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+# API: REPORTS (tính tổng hợp ở DB thay vì tải toàn bộ application về trình duyệt)
+@app.get("/api/reports/funnel")
+def read_report_funnel(
+    keyword: Optional[str] = None,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user) # Bắt buộc phải có User mới cho phân tích
+    current_user: User = Depends(get_current_user)
 ):
-    final_jd_text = ""
+    return reports.status_funnel(session, current_user.id, keyword=keyword)
+
+@app.get("/api/reports/score-histogram")
+def read_report_score_histogram(
+    buckets: int = Query(10, ge=1, le=100),
+    keyword: Optional[str] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    return reports.score_histogram(session, current_user.id, buckets=buckets, keyword=keyword)
+
+@app.get("/api/reports/keywords")
+def read_report_keywords(
+    limit: int = Query(20, ge=1, le=200),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    return reports.top_keywords(session, current_user.id, limit=limit)
+
+@app.get("/api/reports/radar")
+def read_report_radar(
+    keyword: Optional[str] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    return reports.radar_averages(session, current_user.id, keyword=keyword)
+
+# API: CACHE STATS
+@app.get("/api/cache/stats")
+def read_cache_stats():
+    return {**analysis_cache.stats(), "sessions": session_cache_stats(), "cv_artifacts": cv_artifact_store.stats(), "jd_index": jd_index.stats()}
+
+# API: METRICS (Prometheus text format)
+def _labelled(stats: dict, label: str, keys) -> list:
+    return [({label: key}, stats.get(key)) for key in keys]
+
+def _lookup_samples(stats: dict) -> list:
+    # Dạng stats() chung của AnalysisCache / CvArtifactStore: RAM (LRUCache) rồi DB
+    return [
+        ({"result": "memory_hit"}, stats["memory"]["hits"]),
+        ({"result": "db_hit"}, stats["db_hits"]),
+        ({"result": "miss"}, stats["db_misses"]),
+    ]
+
+metrics.register_callback(
+    "dss_jobs", "Analysis job queue state",
+    lambda: _labelled(job_manager.stats(), "state", ("queue_depth", "running", "workers", "tracked_jobs")),
+)
+metrics.register_callback(
+    "dss_jobs_finished_total", "Analysis jobs by outcome",
+    lambda: _labelled(job_manager.stats(), "outcome", ("completed", "failed", "rejected", "cancelled")),
+    type_name="counter",
+)
+metrics.register_callback(
+    "dss_llm_scheduler", "LLM admission queue state",
+    lambda: _labelled(llm_scheduler.stats(), "state", ("waiting", "waiting_users", "in_flight", "rpm_available", "tpm_available", "paused_s")),
+)
+metrics.register_callback(
+    "dss_llm_admissions_total", "LLM admission requests by outcome",
+    lambda: _labelled(llm_scheduler.stats(), "outcome", ("granted", "timed_out", "cancelled", "throttled")),
+    type_name="counter",
+)
+metrics.register_callback(
+    "dss_analysis_cache_lookups_total", "Analysis cache lookups by result",
+    lambda: _lookup_samples(analysis_cache.stats()),
+    type_name="counter",
+)
+metrics.register_callback("dss_analysis_cache_hit_rate", "Analysis cache hit rate", lambda: analysis_cache.stats()["hit_rate"])
+metrics.register_callback(
+    "dss_cv_artifact_lookups_total", "CV artifact store lookups by result",
+    lambda: _lookup_samples(cv_artifact_store.stats()),
+    type_name="counter",
+)
+metrics.register_callback(
+    "dss_cpu_pool_tasks_total", "Tasks run in the CPU process pool by kind",
+    lambda: _labelled(cpu_pool.stats()["tasks"], "kind", ("ingest", "embed")),
+    type_name="counter",
+)
+metrics.register_callback(
+    "dss_retention_purged_total", "Rows and temp files removed by the retention job",
+    lambda: _labelled(retention_worker.stats()["purged"], "kind", PURGED_KINDS),
+    type_name="counter",
+)
+metrics.register_callback(
+    "dss_session_cache_hits_total", "Session lookups served from memory",
+    lambda: session_cache_stats()["cache_hits"], type_name="counter",
+)
+
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# API: PROFILER (collapsed stacks cho flamegraph, bật bằng PROFILER_SAMPLE_INTERVAL_MS)
+@app.get("/debug/profile")
+def read_profile(reset: bool = False):
+    if not profiler.enabled:
+        raise HTTPException(404, detail="Profiler disabled (set PROFILER_SAMPLE_INTERVAL_MS)")
+    return PlainTextResponse(profiler.collapsed(reset=reset))
+
+# API: DB POOL STATS (checked-out / overflow connection)
+@app.get("/api/db/pool")
+def read_pool_stats():
+    return all_pool_stats()
+
+# ANALYZE ENDPOINT
+def _resolve_jd_text(session: Session, current_user: User, jd_text: Optional[str], jd_id: Optional[int]) -> str:
     if jd_id:
         # Lấy JD từ DB, đảm bảo đúng chủ sở hữu
         jd_record = session.exec(
@@ -227,24 +683,213 @@ async def analyze_endpoint(
         
         if not jd_record: 
             raise HTTPException(404, detail="JD ID not found in your library")
-        final_jd_text = jd_record.content
+        return jd_record.content
     elif jd_text:
-        final_jd_text = jd_text
+        return jd_text
     else:
         raise HTTPException(400, detail="Must provide jd_text OR jd_id")
 
-    temp_path = os.path.join(TEMP_DIR, file.filename)
+def _run_analysis(file_bytes: Optional[bytes], filename: str, jd_text: str, cache_key: str, on_stage=None, on_partial=None, cv_hash: Optional[str] = None) -> dict:
+    """Chạy trên worker thread của job_manager (blocking: pdfplumber + MiniLM + Gemini)."""
+    # Parse thẳng từ bytes trong RAM, không ghi file tạm -> 2 upload trùng tên không đè nhau
+    result = analyze_cv_logic(
+        file_bytes,
+        jd_text,
+        on_stage=on_stage,
+        source=os.path.basename(filename or "upload.pdf"),
+        on_partial=on_partial if ANALYSIS_STREAMING else None,
+        cv_hash=cv_hash,
+    )
+    analysis_cache.set(cache_key, result)
+    return result
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """Kiểm tra dung lượng trước khi đọc vào RAM (file.size có sẵn từ multipart parser)."""
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Gọi Core Logic (đã chuyển sang HuggingFace + Gemini 1.5 Flash)
-        result = analyze_cv_logic(temp_path, final_jd_text)
-        
-        if "error" in result: raise HTTPException(500, detail=result["error"])
-        return result
-    finally:
-        if os.path.exists(temp_path): os.remove(temp_path)
+        check_upload_size(file.size)
+        data = await file.read()
+        check_upload_size(len(data))
+    except IngestError as e:
+        raise HTTPException(413, detail=str(e))
+    return data
+
+@app.post("/api/analyze", status_code=202)
+async def analyze_endpoint(
+    response: Response,
+    file: Optional[UploadFile] = File(None),
+    cv_hash: Optional[str] = Form(None),
+    jd_text: Optional[str] = Form(None),
+    jd_id: Optional[int] = Form(None),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user) # Bắt buộc phải có User mới cho phân tích
+):
+    """
+    Trả về job_id ngay lập tức, phần phân tích chạy trên worker pool.
+    Client poll GET /api/analyze/{job_id} hoặc nghe SSE ở GET /api/analyze/{job_id}/events.
+    Gửi file PDF, hoặc cv_hash (có trong response lần trước) để chấm lại CV đã upload với JD khác.
+    Handler là async (đọc upload không chặn), nên mọi lời gọi DB bên dưới chạy qua run_in_threadpool
+    để không làm đứng event loop (và các stream SSE đang mở).
+    """
+    final_jd_text = await run_in_threadpool(_resolve_jd_text, session, current_user, jd_text, jd_id)
+
+    if file is not None:
+        file_bytes = await _read_upload(file)
+        cv_hash = hash_bytes(file_bytes)
+        filename = file.filename
+        await run_in_threadpool(cv_artifact_store.add_owners, current_user.id, [cv_hash])
+    elif cv_hash:
+        artifact = await run_in_threadpool(cv_artifact_store.get_for_user, current_user.id, cv_hash)
+        if artifact is None:
+            raise HTTPException(404, detail="CV not found, please upload the PDF again")
+        file_bytes = None
+        filename = artifact.filename
+    else:
+        raise HTTPException(400, detail="Must provide file OR cv_hash")
+
+    # CACHE: cùng CV + cùng JD + cùng prompt -> trả kết quả cũ, không gọi LLM
+    cache_key = make_cache_key_for_hash(cv_hash, final_jd_text)
+    cached = await run_in_threadpool(analysis_cache.get, cache_key)
+    if cached is not None:
+        response.status_code = 200
+        response.headers["X-Cache"] = "HIT"
+        job = await run_in_threadpool(job_manager.add_completed, current_user.id, cached)
+        return {**job.to_dict(), "cv_hash": cv_hash}
+    response.headers["X-Cache"] = "MISS"
+
+    try:
+        job = await run_in_threadpool(
+            job_manager.submit,
+            current_user.id,
+            lambda on_stage, on_partial: _run_analysis(
+                file_bytes, filename, final_jd_text, cache_key, on_stage, on_partial, cv_hash=cv_hash
+            ),
+        )
+    except QueueFullError:
+        raise HTTPException(
+            429,
+            detail="Analysis queue is full, please retry later",
+            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)},
+        )
+    return {**job.to_dict(), "cv_hash": cv_hash}
+
+@app.get("/api/cvs/{cv_hash}")
+def read_cv_artifact(
+    cv_hash: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Kiểm tra CV đã có trong kho chưa (client quyết định gửi cv_hash hay upload lại file). Chỉ thấy CV mình đã upload."""
+    artifact = cv_artifact_store.get_for_user(current_user.id, cv_hash)
+    if artifact is None:
+        raise HTTPException(404, detail="CV not found")
+    return artifact.summary()
+
+@app.post("/api/analyze/batch")
+async def analyze_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    jd_text: Optional[str] = Form(None),
+    jd_id: Optional[int] = Form(None),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Chấm nhiều CV với 1 JD trong 1 request. Trả về NDJSON (mỗi dòng 1 event):
+    kết quả từng ứng viên ngay khi xong, dòng cuối là bảng xếp hạng ("type": "summary").
+    """
+    if not files:
+        raise HTTPException(400, detail="No files uploaded")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(413, detail=f"Too many files (max {BATCH_MAX_FILES})")
+    final_jd_text = await run_in_threadpool(_resolve_jd_text, session, current_user, jd_text, jd_id)
+    payloads = [(f.filename, await _read_upload(f)) for f in files]
+    await run_in_threadpool(cv_artifact_store.add_owners, current_user.id, [hash_bytes(data) for _, data in payloads])
+
+    async def ndjson_stream():
+        async for event in run_batch_analysis(payloads, final_jd_text, user_id=current_user.id):
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+@app.get("/api/analyze/{job_id}")
+def read_analysis_job(
+    job_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    job = job_manager.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(404, detail="Job not found or access denied")
+    if job.timings:
+        # Thời gian từng stage của job (chạy trên worker thread, ngoài request này)
+        response.headers["Server-Timing"] = metrics.format_server_timing(
+            (f"job-{stage}", seconds) for stage, seconds in job.timings.items()
+        )
+    return job.to_dict()
+
+@app.delete("/api/analyze/{job_id}")
+def cancel_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Hủy job chưa xong: bỏ khỏi hàng đợi / dừng lời gọi Gemini đang stream, không tốn thêm quota."""
+    job = job_manager.cancel(job_id, current_user.id)
+    if not job:
+        raise HTTPException(404, detail="Job not found or access denied")
+    return job.to_dict(include_result=False)
+
+@app.get("/api/analyze/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """
+    Server-Sent Events: đẩy 1 event mỗi khi job đổi stage (parsing, embedding, llm, done/error),
+    và event "partial" (JobMatchResult từng phần) trong lúc Gemini đang stream ở stage llm.
+    EventSource của trình duyệt không gửi được header x-session-id, nên job_id (uuid4 ngẫu nhiên) đóng vai trò token.
+    Client ngắt kết nối và không quay lại (poll / SSE) trong ANALYSIS_ABANDON_AFTER giây -> job bị hủy.
+    Job chạy ở worker gunicorn khác: đọc lại từ DB (job_manager.refresh), đọc DB qua threadpool.
+    """
+    job = await run_in_threadpool(job_manager.get, job_id)
+    if not job:
+        raise HTTPException(404, detail="Job not found")
+
+    async def event_stream():
+        last_version = -1
+        last_stage = None
+        last_partial = None
+        last_sent = time.monotonic()
+        with job_manager.watch(job):
+            # Job của worker khác: mỗi lần refresh là 1 snapshot mới đọc từ DB
+            current = job
+            while True:
+                if current.remote:
+                    current = await run_in_threadpool(job_manager.refresh, current)
+                if current.version != last_version:
+                    last_version = current.version
+                    if current.finished:
+                        yield f"event: result\ndata: {json.dumps(current.to_dict(), default=str)}\n\n"
+                        return
+                    if current.stage != last_stage:
+                        last_stage = current.stage
+                        yield f"event: stage\ndata: {json.dumps(current.to_dict(include_result=False), default=str)}\n\n"
+                    partial = current.partial
+                    if partial is not None and partial is not last_partial:
+                        # Chỉ gửi bản mới nhất (mỗi bản là dict cộng dồn) -> client chậm không bị dồn event
+                        last_partial = partial
+                        payload = {"job_id": current.id, "stage": current.stage, "partial": partial}
+                        yield f"event: partial\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent > 15:
+                    # Heartbeat để proxy không cắt kết nối
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/jobs/stats")
+def read_job_stats():
+    return {**job_manager.stats(), "llm_scheduler": llm_scheduler.stats(), "cpu_pool": cpu_pool.stats(), "retention": retention_worker.stats()}
 
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,139 @@
+# backend/tests/test_context_builder.py
+"""
+context_builder.py: ngân sách token, chọn xoay vòng giữa các dòng JD, bỏ chunk trùng, nối chunk overlap,
+và chuyển chế độ single/multi ở core_logic.build_cv_context. Vector one-hot dựng tay, không cần model embedding.
+"""
+import os
+import string
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core_logic  # noqa: E402
+from benchmarks.fakes import HashingEmbeddings  # noqa: E402
+from context_builder import build_context, estimate_tokens, merge_chunks  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from retriever import NumpyRetriever  # noqa: E402
+
+
+def _rows(*rows):
+    m = np.asarray(rows, dtype=np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def _chunks(n, size):
+    # Mỗi chunk 1 chữ cái lặp lại -> không chunk nào overlap với chunk khác
+    return [string.ascii_lowercase[i] * size for i in range(n)]
+
+
+def test_budget_enforced():
+    texts = _chunks(4, 400)
+    packed = build_context(texts, np.eye(4), np.eye(4), max_overlap=200, budget=250, k_per_line=1)
+    assert packed.chunk_indices == [0, 1]
+    assert packed.tokens <= packed.budget == 250
+    assert packed.skipped == 2
+    assert packed.covered == [True, True, False, False]
+    assert packed.report()["uncovered_lines"] == 2
+
+
+def test_budget_skips_large_chunk_but_keeps_smaller_ones():
+    texts = ["a" * 2000, "b" * 100, "c" * 100]
+    packed = build_context(texts, np.eye(3), np.eye(3), max_overlap=200, budget=100, k_per_line=1)
+    assert packed.chunk_indices == [1, 2]
+    assert packed.skipped == 1
+    assert packed.covered == [False, True, True]
+
+
+def test_round_robin_gives_every_line_its_best_chunk_first():
+    texts = _chunks(4, 400)
+    chunk_matrix = np.eye(4)
+    # Dòng 0 thích chunk 0 rồi 1, dòng 1 thích chunk 2 rồi 3
+    lines = _rows([1, 0.5, 0, 0], [0, 0, 1, 0.5])
+    packed = build_context(texts, chunk_matrix, lines, max_overlap=200, budget=210, k_per_line=2)
+    assert packed.chunk_indices == [0, 2]
+    assert packed.covered == [True, True]
+    assert packed.skipped == 2
+
+    packed = build_context(texts, chunk_matrix, lines, max_overlap=200, budget=1000, k_per_line=2)
+    assert packed.chunk_indices == [0, 1, 2, 3]
+    assert packed.skipped == 0
+
+
+def test_shared_chunk_selected_once():
+    texts = _chunks(3, 400)
+    lines = _rows([1, 0.1, 0], [1, 0, 0.1], [0, 0, 1])
+    packed = build_context(texts, np.eye(3), lines, max_overlap=200, budget=1000, k_per_line=1)
+    assert packed.chunk_indices == [0, 2]
+    assert packed.text == texts[0] + "\n\n" + texts[2]
+    assert packed.covered == [True, True, True]
+
+
+def test_adjacent_chunks_merged_without_overlap():
+    source = "".join(f"word{i} " for i in range(60))
+    texts = [source[0:150], source[110:260], source[220:]]
+    assert merge_chunks(texts, [0, 1, 2], max_overlap=50) == source
+    # Chunk không liền kề: giữ nguyên, ngăn bằng dòng trống
+    assert merge_chunks(texts, [2, 0], max_overlap=50) == texts[0] + "\n\n" + texts[2]
+    # Chọn trùng chỉ số không làm lặp nội dung
+    assert merge_chunks(texts, [1, 0, 1], max_overlap=50) == source[0:260]
+
+
+def test_short_or_absent_overlap_not_cut():
+    texts = ["intro text ends with abc", "abc starts the next chunk"]
+    assert merge_chunks(texts, [0, 1], max_overlap=200) == texts[0] + "\n\n" + texts[1]
+
+
+def test_merged_context_counts_real_tokens():
+    source = "".join(f"word{i} " for i in range(60))
+    texts = [source[0:150], source[110:260]]
+    packed = build_context(texts, np.eye(2), np.eye(2), max_overlap=50, budget=1000, k_per_line=1)
+    assert packed.text == source[0:260]
+    assert packed.tokens == estimate_tokens(source[0:260])
+
+
+def test_empty_inputs():
+    packed = build_context([], np.empty((0, 2)), np.eye(2), max_overlap=200, budget=100)
+    assert packed.text == "" and packed.covered == [False, False]
+    packed = build_context(["a"], np.eye(1), np.empty((0, 1)), max_overlap=200, budget=100)
+    assert packed.text == "" and packed.queries == 0
+
+
+@pytest.fixture
+def retriever():
+    texts = _chunks(8, 400)
+    return NumpyRetriever.from_documents(
+        [Document(page_content=t) for t in texts], HashingEmbeddings(dim=8), vectors=np.eye(8).tolist()
+    )
+
+
+def test_single_mode_uses_jd_vector_top_k(retriever, monkeypatch):
+    monkeypatch.setattr(core_logic, "RETRIEVAL_MODE", "single")
+    stats = {}
+    jd_vector = np.arange(8, 0, -1, dtype=np.float32)  # chunk 0 cao nhất, giảm dần
+    context = core_logic.build_cv_context(retriever, "JD", _rows([0, 0, 0, 0, 0, 0, 0, 1]), jd_vector=jd_vector, stats=stats)
+    expected = [retriever.documents[i].page_content for i in range(core_logic.RETRIEVER_K)]
+    assert context == "\n\n".join(expected)
+    assert stats["context"]["mode"] == "single"
+
+
+def test_multi_mode_packs_per_line(retriever, monkeypatch):
+    monkeypatch.setattr(core_logic, "RETRIEVAL_MODE", "multi")
+    stats = {}
+    lines = _rows([0, 0, 0, 0, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0, 0])
+    context = core_logic.build_cv_context(retriever, "JD", lines, jd_vector=np.ones(8), stats=stats)
+    texts = [d.page_content for d in retriever.documents]
+    assert context == build_context(texts, retriever.matrix, lines, max_overlap=core_logic.CHUNK_OVERLAP).text
+    assert texts[3] in context and texts[7] in context
+    assert stats["context"]["mode"] == "multi"
+    assert stats["context"]["queries"] == 2
+    assert stats["context"]["tokens"] <= stats["context"]["budget"]
+
+
+def test_multi_mode_without_lines_falls_back_to_single(retriever, monkeypatch):
+    monkeypatch.setattr(core_logic, "RETRIEVAL_MODE", "multi")
+    stats = {}
+    core_logic.build_cv_context(retriever, "JD", np.empty((0, 8)), jd_vector=np.ones(8), stats=stats)
+    assert stats["context"]["mode"] == "single"
@@ -0,0 +1,87 @@
+# backend/tests/test_json_repair.py
+"""
+Các lỗi định dạng liệt kê trong docstring của json_repair.py, mỗi dòng 1 ca: (output của LLM, JSON mong đợi).
+    cd backend
+    python -m pytest -q tests
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import JsonRepairError, loads_partial, loads_tolerant, repair_json  # noqa: E402
+
+REPAIR_CASES = [
+    # Bọc trong ```json ... ``` hoặc có chữ trước/sau JSON
+    ("fence", '```json\n{"a": 1}\n```', {"a": 1}),
+    ("fence no lang", '```\n{"a": 1}\n```', {"a": 1}),
+    ("text around", 'Here is the result: {"a": 1} Hope this helps!', {"a": 1}),
+    # Dấu phẩy thừa / thiếu / lặp
+    ("trailing comma object", '{"a": 1, "b": 2,}', {"a": 1, "b": 2}),
+    ("trailing comma array", '{"a": [1, 2, ]}', {"a": [1, 2]}),
+    ("missing comma between keys", '{"a": 1\n"b": 2}', {"a": 1, "b": 2}),
+    ("missing comma between strings", '{"a": "x"\n"b": "y"}', {"a": "x", "b": "y"}),
+    ("missing comma in array", '["a" "b"]', ["a", "b"]),
+    ("missing comma in array newline", '["a"\n"b", "c"]', ["a", "b", "c"]),
+    ("missing comma numbers", "[1 2 3]", [1, 2, 3]),
+    ("repeated comma", '{"a": 1,, "b": 2}', {"a": 1, "b": 2}),
+    # Dấu " không escape, xuống dòng thô trong string
+    ("unescaped quote", '{"a": "He said "hi" to me"}', {"a": 'He said "hi" to me'}),
+    ("unescaped quote in array", '["He said "hi" ok"]', ['He said "hi" ok']),
+    ("raw newline", '{"a": "line 1\nline 2"}', {"a": "line 1\nline 2"}),
+    ("raw tab", '{"a": "x\ty"}', {"a": "x\ty"}),
+    ("invalid escape", '{"a": "C:\\path"}', {"a": "C:\\path"}),
+    # Key không ngoặc kép, literal kiểu Python, nháy đơn
+    ("unquoted key", '{a: 1, b_c: "x"}', {"a": 1, "b_c": "x"}),
+    ("python literals", '{"a": True, "b": False, "c": None}', {"a": True, "b": False, "c": None}),
+    ("single quotes", "{'a': 'x'}", {"a": "x"}),
+    # Comment // và /* */
+    ("line comment", '{"a": 1, // note\n"b": 2}', {"a": 1, "b": 2}),
+    ("block comment", '{"a": 1, /* note */ "b": 2}', {"a": 1, "b": 2}),
+    ("line comment after string", '{"a": "x" // c\n, "b": 1}', {"a": "x", "b": 1}),
+    ("block comment after string", '{"a": "x" /* c */, "b": 1}', {"a": "x", "b": 1}),
+    ("comment after key", '{"a" /* c */ : 1}', {"a": 1}),
+    # Bị cắt giữa chừng: bỏ phần dở dang, đóng ngoặc
+    ("truncated string value", '{"a": 1, "b": "hel', {"a": 1, "b": "hel"}),
+    ("truncated key", '{"a": 1, "b', {"a": 1}),
+    ("truncated after colon", '{"a": 1, "b": ', {"a": 1}),
+    ("truncated literal", '{"a": 1, "b": tru', {"a": 1}),
+    ("truncated number", '{"a": [1, 2, 3.', {"a": [1, 2]}),
+    ("truncated nested", '{"a": {"b": [1, {"c": "d"', {"a": {"b": [1, {"c": "d"}]}}),
+    ("truncated escape", '{"a": "x\\u00', {"a": "x"}),
+    # Ngoặc đóng thừa / thiếu
+    ("extra closer", '{"a": [1, 2]]}', {"a": [1, 2]}),
+    ("unclosed inner", '{"a": [1, 2}', {"a": [1, 2]}),
+]
+
+
+@pytest.mark.parametrize("raw, expected", [case[1:] for case in REPAIR_CASES], ids=[case[0] for case in REPAIR_CASES])
+def test_repair_json(raw, expected):
+    assert json.loads(repair_json(raw)) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [case[1:] for case in REPAIR_CASES], ids=[case[0] for case in REPAIR_CASES])
+def test_loads_partial(raw, expected):
+    assert loads_partial(raw) == expected
+
+
+def test_valid_json_untouched():
+    parsed = loads_tolerant('{"a": [1, "x"], "b": {"c": null}}')
+    assert parsed.value == {"a": [1, "x"], "b": {"c": None}}
+    assert not parsed.repaired
+
+
+def test_truncated_key_reported():
+    parsed = loads_tolerant('{"personal_info": {"name": "A"}, "bilingual_content": {"general_assessment": {"en": "Go')
+    assert parsed.repaired
+    assert parsed.truncated_key == "bilingual_content"
+    assert parsed.value["personal_info"] == {"name": "A"}
+
+
+@pytest.mark.parametrize("raw", ["", "{", "```json\n```"])
+def test_nothing_to_recover(raw):
+    with pytest.raises(JsonRepairError):
+        loads_tolerant(raw)
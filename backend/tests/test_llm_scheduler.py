@@ -0,0 +1,292 @@
+# backend/tests/test_llm_scheduler.py
+"""
+llm_scheduler.py với đồng hồ giả: token bucket nạp lại, giới hạn RPM/TPM, round-robin giữa user,
+hết hạn chờ, hủy qua request_scope, tạm dừng khi Gemini báo 429 (FakeChatModel quota_rpm).
+Thread chỉ dùng để có 1 lời gọi đang chờ; thời gian chờ/nạp quota do test tự tua đồng hồ.
+"""
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core_logic  # noqa: E402
+from benchmarks import fakes  # noqa: E402
+from benchmarks.fakes import FakeChatModel, FakeQuotaError  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate  # noqa: E402
+from llm_scheduler import LlmCancelled, LlmQueueTimeout, LlmScheduler, TokenBucket  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _scheduler(clock, rpm=0, tpm=0, max_concurrency=4, queue_timeout=0):
+    return LlmScheduler(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency, queue_timeout=queue_timeout, clock=clock)
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "scheduler state not reached"
+        time.sleep(0.005)
+
+
+class Caller(threading.Thread):
+    """acquire() trong 1 thread riêng (có request_scope riêng), ghi user vào log khi được cấp rồi trả slot ngay."""
+
+    def __init__(self, scheduler, user="u", tokens=1, is_cancelled=None, timeout=None, log=None):
+        super().__init__(daemon=True)
+        self.scheduler, self.user, self.tokens = scheduler, user, tokens
+        self.is_cancelled, self.timeout, self.log = is_cancelled, timeout, log
+        self.ticket = None
+        self.error = None
+
+    def run(self):
+        with self.scheduler.request_scope(self.user, self.is_cancelled, self.timeout):
+            try:
+                self.ticket = self.scheduler.acquire(self.tokens)
+            except Exception as e:
+                self.error = e
+                return
+            if self.log is not None:
+                self.log.append(self.user)
+            self.ticket.release()
+
+
+def _start_waiting(scheduler, caller):
+    """Bắt đầu caller và chờ tới khi nó thật sự nằm trong hàng đợi (thứ tự xếp hàng xác định)."""
+    before = scheduler.stats()["waiting"]
+    caller.start()
+    _wait_until(lambda: scheduler.stats()["waiting"] == before + 1 or caller.ticket is not None or caller.error)
+    return caller
+
+
+# --- TokenBucket ---
+
+def test_bucket_refills_linearly_up_to_capacity(clock):
+    bucket = TokenBucket(60, clock)  # 1 token / giây
+    bucket.take(60, clock())
+    assert bucket.wait_time(1, clock()) == pytest.approx(1.0)
+    clock.advance(30)
+    assert bucket.available() == 30
+    assert bucket.wait_time(40, clock()) == pytest.approx(10.0)
+    clock.advance(3600)
+    assert bucket.available() == 60
+
+
+def test_bucket_oversized_request_waits_for_full_bucket_only(clock):
+    bucket = TokenBucket(60, clock)
+    assert bucket.wait_time(500, clock()) == 0
+    bucket.take(500, clock())  # Âm: lần sau phải chờ nạp lại
+    assert bucket.available() == -440
+    assert bucket.wait_time(500, clock()) == pytest.approx(500.0)
+
+
+def test_unlimited_bucket(clock):
+    bucket = TokenBucket(0, clock)
+    bucket.take(10 ** 9, clock())
+    assert bucket.wait_time(10 ** 9, clock()) == 0
+    assert bucket.available() is None
+
+
+# --- RPM / TPM ---
+
+def test_rpm_limit_blocks_until_refill(clock):
+    scheduler = _scheduler(clock, rpm=2)
+    scheduler.acquire(1).release()
+    scheduler.acquire(1).release()
+    caller = _start_waiting(scheduler, Caller(scheduler))
+    time.sleep(0.05)
+    assert caller.ticket is None and scheduler.stats()["granted"] == 2
+
+    clock.advance(30)  # 2 request/phút -> 1 request sau 30 giây
+    caller.join(5)
+    assert caller.ticket is not None and caller.error is None
+    assert caller.ticket.waited == pytest.approx(30)
+    assert scheduler.stats()["granted"] == 3
+
+
+def test_tpm_limit_and_settle_refund(clock):
+    scheduler = _scheduler(clock, tpm=1000)
+    first = scheduler.acquire(600)
+    caller = _start_waiting(scheduler, Caller(scheduler, tokens=600))
+    time.sleep(0.05)
+    assert caller.ticket is None
+
+    # Usage thật (FakeChatModel báo usage_metadata) thấp hơn ước lượng -> trả lại token, caller được cấp ngay
+    message = FakeChatModel(latency=0, response='{"a": 1}').invoke("hi")
+    assert message.usage_metadata["total_tokens"] < 200
+    first.settle(message)
+    first.release()
+    caller.join(5)
+    assert caller.ticket is not None
+    assert caller.ticket.waited == 0
+
+
+def test_max_concurrency(clock):
+    scheduler = _scheduler(clock, max_concurrency=1)
+    held = scheduler.acquire(1)
+    caller = _start_waiting(scheduler, Caller(scheduler))
+    assert scheduler.stats()["in_flight"] == 1
+    held.release()
+    caller.join(5)
+    assert caller.ticket is not None
+    assert scheduler.stats()["in_flight"] == 0
+
+
+# --- Công bằng giữa user ---
+
+def test_round_robin_between_users(clock):
+    scheduler = _scheduler(clock, max_concurrency=1)
+    held = scheduler.acquire(1)
+    order = []
+    callers = [
+        _start_waiting(scheduler, Caller(scheduler, user=user, log=order))
+        for user in ["heavy", "heavy", "heavy", "light", "other"]
+    ]
+    assert scheduler.stats()["waiting_users"] == 3
+    held.release()
+    for caller in callers:
+        caller.join(5)
+    # FIFO thuần sẽ là heavy x3 trước; round-robin xen kẽ theo user
+    assert order == ["heavy", "light", "other", "heavy", "heavy"]
+
+
+def test_head_of_line_not_skipped_by_smaller_request(clock):
+    scheduler = _scheduler(clock, tpm=1000)
+    scheduler.acquire(1000).release()
+    big = _start_waiting(scheduler, Caller(scheduler, user="a", tokens=900))
+    small = _start_waiting(scheduler, Caller(scheduler, user="b", tokens=10))
+    time.sleep(0.05)
+    assert big.ticket is None and small.ticket is None
+    clock.advance(60)
+    big.join(5)
+    small.join(5)
+    assert big.ticket is not None and small.ticket is not None
+
+
+# --- Hết hạn / hủy ---
+
+def test_queue_timeout(clock):
+    scheduler = _scheduler(clock, max_concurrency=1, queue_timeout=30)
+    held = scheduler.acquire(1)
+    caller = _start_waiting(scheduler, Caller(scheduler))
+    clock.advance(29)
+    time.sleep(0.05)
+    assert caller.error is None
+    clock.advance(2)
+    caller.join(5)
+    assert isinstance(caller.error, LlmQueueTimeout)
+    stats = scheduler.stats()
+    assert stats["timed_out"] == 1 and stats["waiting"] == 0
+    held.release()
+
+
+def test_scope_timeout_overrides_default(clock):
+    scheduler = _scheduler(clock, max_concurrency=1, queue_timeout=0)
+    held = scheduler.acquire(1)
+    caller = _start_waiting(scheduler, Caller(scheduler, timeout=5))
+    clock.advance(6)
+    caller.join(5)
+    assert isinstance(caller.error, LlmQueueTimeout)
+    held.release()
+
+
+def test_cancel_via_request_scope(clock):
+    scheduler = _scheduler(clock, max_concurrency=1)
+    held = scheduler.acquire(1)
+    cancelled = threading.Event()
+    caller = _start_waiting(scheduler, Caller(scheduler, is_cancelled=cancelled.is_set))
+    cancelled.set()
+    caller.join(5)
+    assert isinstance(caller.error, LlmCancelled)
+    stats = scheduler.stats()
+    assert stats["cancelled"] == 1 and stats["waiting"] == 0
+    # Slot không bị giữ bởi request đã hủy
+    held.release()
+    scheduler.acquire(1).release()
+
+
+def test_check_cancelled_uses_current_scope(clock):
+    scheduler = _scheduler(clock)
+    scheduler.check_cancelled()  # Ngoài scope: không làm gì
+    with scheduler.request_scope("u", is_cancelled=lambda: False):
+        scheduler.check_cancelled()
+    with scheduler.request_scope("u", is_cancelled=lambda: True):
+        with pytest.raises(LlmCancelled):
+            scheduler.check_cancelled()
+    scheduler.check_cancelled()  # Scope đã được reset
+
+
+# --- 429 ---
+
+def test_throttle_pauses_all_grants(clock):
+    scheduler = _scheduler(clock)
+    scheduler.throttle(10)
+    caller = _start_waiting(scheduler, Caller(scheduler))
+    time.sleep(0.05)
+    assert caller.ticket is None and scheduler.stats()["paused_s"] == 10
+    clock.advance(10)
+    caller.join(5)
+    assert caller.ticket is not None
+    assert scheduler.stats()["throttled"] == 1
+
+
+def test_quota_error_throttles_scheduler_and_retries(clock, monkeypatch):
+    scheduler = _scheduler(clock)
+    seen = []
+
+    def fake_sleep(seconds):
+        seen.append(scheduler.stats()["paused_s"])
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(core_logic, "llm_scheduler", scheduler)
+    monkeypatch.setattr(core_logic, "time", types.SimpleNamespace(sleep=fake_sleep, perf_counter=time.perf_counter))
+    monkeypatch.setattr(core_logic.random, "uniform", lambda a, b: b)
+    monkeypatch.setattr(core_logic, "LLM_BACKOFF_BASE", 61.0)
+    monkeypatch.setattr(core_logic, "LLM_BACKOFF_MAX", 120.0)
+    # Cửa sổ quota của FakeChatModel chạy theo cùng đồng hồ giả
+    monkeypatch.setattr(fakes, "time", types.SimpleNamespace(monotonic=clock, sleep=lambda seconds: None))
+
+    model = FakeChatModel(latency=0, quota_rpm=1, response='{"a": 1}')
+    chain = ChatPromptTemplate.from_template("{jd_text}") | model
+    core_logic.invoke_with_backoff(chain, {"jd_text": "first"})
+    message = core_logic.invoke_with_backoff(chain, {"jd_text": "second"})
+
+    assert message.content == '{"a": 1}'
+    assert model.quota_errors == 1
+    assert clock.sleeps == [61.0]
+    assert seen == [61.0]  # Trong lúc backoff, scheduler dừng cấp phép cho mọi request
+    stats = scheduler.stats()
+    assert stats["throttled"] == 1 and stats["granted"] == 3 and stats["in_flight"] == 0
+
+
+def test_fake_quota_error_is_429():
+    model = FakeChatModel(latency=0, quota_rpm=1)
+    model.invoke("a")
+    with pytest.raises(FakeQuotaError) as info:
+        model.invoke("b")
+    assert info.value.code == 429
+    assert core_logic._is_quota_error(info.value)
@@ -0,0 +1,119 @@
+# backend/tests/test_scoring.py
+"""
+scoring.py: nhận diện kỹ năng (find_skills), tách/phân loại dòng JD (parse_jd_requirements)
+và chấm Matched từng dòng (score_requirements) với vector dựng tay, không cần model embedding.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import find_skills, parse_jd_requirements, score_requirements  # noqa: E402
+
+FIND_SKILLS_CASES = [
+    ("plain", "Python, FastAPI and PostgreSQL", ["Python", "FastAPI", "PostgreSQL"]),
+    ("aliases", "k8s, golang, postgres, sklearn", ["Kubernetes", "Go", "PostgreSQL", "scikit-learn"]),
+    ("first occurrence order, no duplicates", "Docker then Python then docker", ["Docker", "Python"]),
+    ("whole words only", "javascript developer at google", ["JavaScript"]),
+    ("c++ and c#", "C++ and C# (.NET)", ["C++", "C#"]),
+    # Từ thường trùng tên kỹ năng
+    (
+        "prose false positives",
+        "Candidates who excel at swift delivery; Oracle of team knowledge; TS/SCI clearance",
+        [],
+    ),
+    ("R&D and C-level", "Work with the R&D team and C-level executives", []),
+    ("go to", "Go to market with the sales team", []),
+    ("volume", "Drink 500ml of water", []),
+    # Tên ngắn viết rõ
+    ("short names vi", "Thành thạo Go và R, làm việc với C", ["Go", "R", "C"]),
+    ("short names list", "Languages: C/C++, Java/C, R.", ["C", "C++", "Java", "R"]),
+    ("case-sensitive strict names", "Swift, Excel, Oracle, TS, AI/ML", ["Swift", "Excel", "Oracle", "TypeScript", "Machine Learning"]),
+    ("explicit long forms", "Oracle Database, PL/SQL, MS Excel, SwiftUI", ["Oracle", "SQL", "Excel", "Swift"]),
+]
+
+
+@pytest.mark.parametrize("text, expected", [c[1:] for c in FIND_SKILLS_CASES], ids=[c[0] for c in FIND_SKILLS_CASES])
+def test_find_skills(text, expected):
+    assert find_skills(text) == expected
+
+
+JD_LINE_CASES = [
+    ("3+ years of Python", "must_have"),
+    ("Docker is a plus", "nice_to_have"),
+    ("Kubernetes preferred", "nice_to_have"),
+    ("AWS experience is an advantage", "nice_to_have"),
+    ("Nice to have: GraphQL", "nice_to_have"),
+    ("Bonus: open-source contributions", "nice_to_have"),
+    ("Willing to travel", "nice_to_have"),
+    ("Surplus budget management", "must_have"),  # "plus" trong "surplus" không tính
+    ("Ưu tiên ứng viên biết Kafka", "nice_to_have"),
+    ("Biết Redis là một lợi thế", "nice_to_have"),
+    ("Có chứng chỉ AWS là điểm cộng", "nice_to_have"),
+    ("Tiếng Anh giao tiếp (không bắt buộc)", "nice_to_have"),
+    ("Kinh nghiệm Go nếu có", "nice_to_have"),
+    ("Thành thạo SQL", "must_have"),
+]
+
+
+@pytest.mark.parametrize("line, kind", JD_LINE_CASES)
+def test_requirement_kind(line, kind):
+    [req] = parse_jd_requirements(line)
+    assert req.kind == kind
+
+
+def test_parse_jd_requirements_lines_and_bullets():
+    jd = "Requirements:\n- 3+ years of Python\n\n  * Docker is a plus\n1. SQL\n2) Kubernetes preferred\n• Git\n"
+    reqs = parse_jd_requirements(jd)
+    assert [r.text for r in reqs] == [
+        "Requirements:", "3+ years of Python", "Docker is a plus", "SQL", "Kubernetes preferred", "Git",
+    ]
+    assert [r.kind for r in reqs] == ["must_have", "must_have", "nice_to_have", "must_have", "nice_to_have", "must_have"]
+    assert reqs[1].skills == ["Python"]
+    assert parse_jd_requirements("") == []
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_score_requirements_similarity_and_skills():
+    reqs = parse_jd_requirements("Build REST API services\nKubernetes in production\nPython and Docker\nFigma is a plus")
+    chunks = ["Designed REST api services in Python", "Shipped containers with Docker"]
+    chunk_matrix = np.stack([_unit(1, 0, 0), _unit(0, 1, 0)])
+    line_vectors = np.stack([
+        _unit(1, 0.1, 0),   # gần chunk 0 -> Matched theo cosine
+        _unit(0, 0, 1),     # không gần chunk nào, không có kỹ năng trong CV
+        _unit(0, 0, 1),     # cosine thấp nhưng mọi kỹ năng (Python, Docker) có trong CV
+        _unit(0.2, 0, 1),   # nice-to-have, không khớp
+    ])
+    score = score_requirements(reqs, line_vectors, chunk_matrix, chunks, threshold=0.5)
+
+    assert score.matched == [True, False, True, False]
+    assert score.evidence[0] == chunks[0]
+    assert score.evidence[1] == ""
+    assert score.similarity[0] == pytest.approx(float(_unit(1, 0.1, 0) @ _unit(1, 0, 0)), abs=1e-4)
+    assert score.matched_keywords == ["REST API", "Python", "Docker"]
+
+    fields = score.to_result_fields()
+    assert fields["matching_score"] == {"percentage": 50, "explanation": "Matched 2/4 requirements"}
+    assert fields["requirements_breakdown"] == {"must_have_ratio": "2/3", "nice_to_have_ratio": "0/1"}
+
+
+def test_score_requirements_partial_skills_not_enough():
+    # Dòng có 2 kỹ năng, CV chỉ có 1 -> không được tính Matched nhờ kỹ năng
+    reqs = parse_jd_requirements("Python and Kafka")
+    score = score_requirements(reqs, np.stack([_unit(0, 1)]), np.stack([_unit(1, 0)]), ["Python scripts"], threshold=0.5)
+    assert score.matched == [False]
+    assert score.matched_keywords == ["Python"]
+
+
+def test_score_requirements_empty_cv():
+    reqs = parse_jd_requirements("Python")
+    score = score_requirements(reqs, np.stack([_unit(1, 0)]), np.empty((0, 2), dtype=np.float32), [], threshold=0.5)
+    assert score.matched == [False]
+    assert score.to_result_fields()["matching_score"]["percentage"] == 0
@@ -0,0 +1,222 @@
+# backend/transfer.py
+"""
+Export / import hàng loạt JD + application của 1 user dưới dạng NDJSON (mỗi dòng 1 object JSON):
+    {"type": "meta", "format": "careerflow-ndjson", "version": 1, "exported_at": "..."}
+    {"type": "jd", "id": 12, "title": "...", "company": "...", "content": "...", "created_at": "...", ...}
+    {"type": "application", "id": 40, "job_title": "...", "analysis_result": {...}, ...}
+    {"type": "summary", "jds": 1, "applications": 1}
+
+- Export: đọc bằng server-side cursor (yield_per -> psycopg2 named cursor trên Postgres), mỗi lần giữ
+  tối đa EXPORT_BATCH_SIZE dòng trong RAM dù user có bao nhiêu application.
+- Import: validate từng dòng (JobDescriptionImport / ApplicationImport), gom IMPORT_BATCH_SIZE dòng
+  -> 1 câu INSERT nhiều dòng trong 1 transaction. Batch lỗi ở DB -> chèn lại từng dòng để chỉ ra đúng dòng hỏng.
+  Dòng "meta"/"summary" bỏ qua; id/user_id trong file bị bỏ qua (dòng mới thuộc user hiện tại).
+"""
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from database import engine
+from models import Application, ApplicationImport, JobDescription, JobDescriptionImport
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))  # Quá số lỗi này thì dừng import
+
+FORMAT_NAME = "careerflow-ndjson"
+FORMAT_VERSION = 1
+
+# type trong file -> (bảng, schema validate, cột export theo thứ tự)
+RECORD_TYPES = {
+    "jd": (JobDescription, JobDescriptionImport, ("id", "title", "company", "content", "created_at", "updated_at")),
+    "application": (
+        Application,
+        ApplicationImport,
+        ("id", "job_title", "company_name", "status", "match_score", "jd_content", "analysis_result", "created_at"),
+    ),
+}
+EXPORT_KEYS = {"jds": "jd", "applications": "application"}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def _line(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, default=_json_default) + "\n"
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# --- EXPORT ---
+def iter_export(user_id: uuid.UUID, kinds: Sequence[str] = ("jds", "applications")) -> Iterator[str]:
+    """
+    Generator các dòng NDJSON. Dùng connection riêng (không phải session của request): StreamingResponse
+    chạy generator sau khi dependency get_session đã đóng.
+    """
+    counts = {kind: 0 for kind in kinds}
+    yield _line({
+        "type": "meta",
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "exported_at": datetime.now(),
+        "kinds": list(kinds),
+    })
+    with engine.connect() as conn:
+        for kind in kinds:
+            record_type = EXPORT_KEYS[kind]
+            model, _, fields = RECORD_TYPES[record_type]
+            table = model.__table__
+            query = (
+                select(*(table.c[name] for name in fields))
+                .where(table.c.user_id == user_id)
+                .order_by(table.c.created_at, table.c.id)
+            )
+            # yield_per bật stream_results: psycopg2 dùng server-side cursor, fetch từng EXPORT_BATCH_SIZE dòng
+            result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(query)
+            for row in result.mappings():
+                counts[kind] += 1
+                yield _line({"type": record_type, **row})
+    yield _line({"type": "summary", **counts})
+
+
+# --- IMPORT ---
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.inserted = {"jds": 0, "applications": 0}
+        self.skipped = 0
+        self.error_count = 0
+        self.batches = 0
+
+    def error(self, line: int, message: str) -> Dict[str, Any]:
+        self.error_count += 1
+        return {"type": "error", "line": line, "error": message}
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "type": "progress",
+            "lines": self.lines,
+            "inserted": dict(self.inserted),
+            "errors": self.error_count,
+            "batches": self.batches,
+        }
+
+    def summary(self, aborted: Optional[str] = None) -> Dict[str, Any]:
+        data = {**self.progress(), "type": "summary", "skipped": self.skipped}
+        if aborted:
+            data["aborted"] = aborted
+        return data
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def parse_line(raw: bytes, user_id: uuid.UUID, now: datetime) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """1 dòng NDJSON -> (record_type, dict cột để INSERT) hoặc None nếu là dòng bỏ qua. Raise ImportRowError."""
+    text = raw.decode("utf-8").strip()
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ImportRowError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ImportRowError("Each line must be a JSON object")
+    record_type = data.get("type")
+    if record_type in ("meta", "summary"):
+        return None
+    if record_type not in RECORD_TYPES:
+        raise ImportRowError(f"Unknown type {record_type!r} (expected 'jd' or 'application')")
+    _, schema, _ = RECORD_TYPES[record_type]
+    try:
+        record = schema.model_validate(data)
+    except ValidationError as e:
+        raise ImportRowError(_format_validation_error(e))
+    values = record.model_dump()
+    values["user_id"] = user_id
+    values["created_at"] = values.get("created_at") or now
+    if record_type == "jd":
+        values["updated_at"] = values.get("updated_at") or values["created_at"]
+    return record_type, values
+
+
+def _insert_batch(batch: List[Tuple[int, str, Dict[str, Any]]], report: ImportReport) -> List[Dict[str, Any]]:
+    """1 transaction cho cả batch (executemany); lỗi DB -> thử lại từng dòng, trả về các dòng lỗi."""
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for _, record_type, values in batch:
+        by_type.setdefault(record_type, []).append(values)
+    try:
+        with engine.begin() as conn:
+            for record_type, rows in by_type.items():
+                conn.execute(insert(RECORD_TYPES[record_type][0].__table__), rows)
+    except Exception as e:
+        print(f" [IMPORT] Batch of {len(batch)} rows failed ({type(e).__name__}), retrying row by row")
+        return _insert_rows(batch, report)
+    for record_type, rows in by_type.items():
+        report.inserted[f"{record_type}s"] += len(rows)
+    return []
+
+
+def _insert_rows(batch: List[Tuple[int, str, Dict[str, Any]]], report: ImportReport) -> List[Dict[str, Any]]:
+    errors = []
+    with engine.connect() as conn:
+        for line_no, record_type, values in batch:
+            try:
+                with conn.begin():
+                    conn.execute(insert(RECORD_TYPES[record_type][0].__table__), [values])
+                report.inserted[f"{record_type}s"] += 1
+            except Exception as e:
+                errors.append(report.error(line_no, f"Database error: {str(e).splitlines()[0]}"))
+    return errors
+
+
+def iter_import(source: IO[bytes], user_id: uuid.UUID) -> Iterator[str]:
+    """
+    Đọc NDJSON từ file (đã spool từ request body), yield các dòng NDJSON báo tiến độ:
+    "error" cho từng dòng hỏng, "progress" sau mỗi batch đã commit, "summary" ở cuối.
+    Batch đã commit không bị rollback khi batch sau lỗi -> chạy lại cùng file sẽ tạo bản trùng.
+    Quá IMPORT_MAX_ERRORS lỗi (file sai định dạng) -> dừng, batch đang gom dở không được ghi.
+    """
+    report = ImportReport()
+    now = datetime.now()
+    batch: List[Tuple[int, str, Dict[str, Any]]] = []
+    for line_no, raw in enumerate(source, start=1):
+        report.lines = line_no
+        try:
+            parsed = parse_line(raw, user_id, now)
+        except (ImportRowError, UnicodeDecodeError) as e:
+            yield _line(report.error(line_no, str(e)))
+            if report.error_count >= IMPORT_MAX_ERRORS:
+                break
+            continue
+        if parsed is None:
+            report.skipped += 1
+            continue
+        batch.append((line_no, *parsed))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            for entry in _insert_batch(batch, report):
+                yield _line(entry)
+            report.batches += 1
+            batch = []
+            yield _line(report.progress())
+    if batch and report.error_count < IMPORT_MAX_ERRORS:
+        for entry in _insert_batch(batch, report):
+            yield _line(entry)
+        report.batches += 1
+    aborted = f"Too many errors (>= {IMPORT_MAX_ERRORS})" if report.error_count >= IMPORT_MAX_ERRORS else None
+    print(f" [IMPORT] User {user_id}: {report.inserted} in {report.batches} batches, {report.error_count} errors")
+    yield _line(report.summary(aborted))
@@ -17,8 +17,18 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
 
   if (!data) return null;
 
+  // Khi đang stream, data là kết quả từng phần -> các section chưa tới thì dùng giá trị rỗng
+  const percentage = data.matching_score?.percentage ?? 0;
+  const breakdown = data.requirements_breakdown || {};
+  const bilingual = data.bilingual_content || {};
+  const localized = (section, fallback = []) => {
+    const value = bilingual[section];
+    if (!value) return fallback;
+    return value[language] || value['en'] || fallback;
+  };
+
   // Radar handlers
-  const radarData = Object.entries(data.radar_chart).map(([subject, score]) => {
+  const radarData = Object.entries(data.radar_chart || {}).map(([subject, score]) => {
     let reasonText = "No explanation provided.";
     if (data.radar_reasoning && data.radar_reasoning[subject]) {
         const reasonObj = data.radar_reasoning[subject];
@@ -38,8 +48,8 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
   });
 
   const scoreData = [
-    { name: 'Matched', value: data.matching_score.percentage, color: '#137fec' },
-    { name: 'Unmatched', value: 100 - data.matching_score.percentage, color: '#f1f5f9' }
+    { name: 'Matched', value: percentage, color: '#137fec' },
+    { name: 'Unmatched', value: 100 - percentage, color: '#f1f5f9' }
   ];
 
   const getScoreColor = (score) => {
@@ -48,9 +58,9 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
       return "bg-red-50 text-red-700 border-red-200";
   };
 
-  const comparisonTable = Array.isArray(data.bilingual_content.comparison_table) 
-    ? data.bilingual_content.comparison_table 
-    : (data.bilingual_content.comparison_table[language] || []);
+  const comparisonTable = Array.isArray(bilingual.comparison_table)
+    ? bilingual.comparison_table
+    : localized('comparison_table');
 
   return (
     <div className="space-y-6 animate-in fade-in slide-in-from-bottom-4 duration-500 pb-10">
@@ -79,17 +89,17 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
                         </PieChart>
                     </ResponsiveContainer>
                     <div className="absolute inset-0 flex flex-col items-center justify-center">
-                        <span className="text-5xl font-black text-text-light dark:text-text-dark tracking-tighter">{data.matching_score.percentage}%</span>
+                        <span className="text-5xl font-black text-text-light dark:text-text-dark tracking-tighter">{percentage}%</span>
                         <span className="text-sm font-medium text-slate-400">{t('result.confidence')}</span>
                     </div>
                 </div>
                 <div className="flex w-full gap-4">
                     <div className="flex-1 bg-slate-50 dark:bg-slate-800/50 rounded-xl p-4 flex flex-col items-center border border-slate-100 dark:border-slate-800">
-                        <span className="text-2xl font-bold text-text-light dark:text-text-dark">{data.requirements_breakdown.must_have_ratio}</span>
+                        <span className="text-2xl font-bold text-text-light dark:text-text-dark">{breakdown.must_have_ratio}</span>
                         <span className="text-[10px] font-bold text-slate-400 uppercase tracking-wide">{t('result.must_have')}</span>
                     </div>
                     <div className="flex-1 bg-slate-50 dark:bg-slate-800/50 rounded-xl p-4 flex flex-col items-center border border-slate-100 dark:border-slate-800">
-                        <span className="text-2xl font-bold text-text-light dark:text-text-dark">{data.requirements_breakdown.nice_to_have_ratio}</span>
+                        <span className="text-2xl font-bold text-text-light dark:text-text-dark">{breakdown.nice_to_have_ratio}</span>
                         <span className="text-[10px] font-bold text-slate-400 uppercase tracking-wide">{t('result.nice_to_have')}</span>
                     </div>
                 </div>
@@ -170,7 +180,7 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
                   <Icon name="label" className="text-lg" /> {t('result.matched_keywords')}
               </h3>
               <div className="flex flex-wrap gap-2">
-                  {data.matched_keywords.map((keyword, index) => (
+                  {(data.matched_keywords || []).map((keyword, index) => (
                       <span key={index} className="px-3 py-1.5 rounded-full bg-blue-50 dark:bg-blue-900/20 text-blue-700 dark:text-blue-300 text-sm font-semibold border border-blue-100 dark:border-blue-800/30">
                           {keyword}
                       </span>
@@ -183,7 +193,7 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
                   <Icon name="psychology" className="text-lg" /> {t('result.ai_assessment')}
               </h3>
               <p className="text-slate-700 dark:text-slate-300 leading-relaxed text-sm">
-                  {data.bilingual_content.general_assessment[language] || data.bilingual_content.general_assessment['en']}
+                  {localized('general_assessment', '')}
               </p>
             </div>
       </div>
@@ -228,7 +238,7 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
                   <div className="p-1.5 bg-green-100 dark:bg-green-900/30 rounded-lg"><Icon name="thumb_up" className="text-xl" /></div>{t('result.strengths')}
               </h4>
               <ul className="space-y-4">
-                  {(data.bilingual_content.strengths[language] || data.bilingual_content.strengths['en']).map((item, i) => (
+                  {localized('strengths').map((item, i) => (
                       <li key={i} className="flex items-start gap-3 p-3 bg-green-50/50 dark:bg-green-900/10 rounded-lg">
                           <div className="mt-0.5 text-green-600 dark:text-green-400"><Icon name="check_circle" className="text-xl" fill /></div>
                           <span className="text-sm text-slate-700 dark:text-slate-300 font-medium leading-relaxed">{item}</span>
@@ -241,7 +251,7 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
                   <div className="p-1.5 bg-orange-100 dark:bg-orange-900/30 rounded-lg"><Icon name="warning" className="text-xl" /></div>{t('result.weaknesses')}
               </h4>
               <ul className="space-y-4">
-                  {(data.bilingual_content.weaknesses_missing_skills[language] || data.bilingual_content.weaknesses_missing_skills['en']).map((item, i) => (
+                  {localized('weaknesses_missing_skills').map((item, i) => (
                       <li key={i} className="flex items-start gap-3 p-3 bg-orange-50/50 dark:bg-orange-900/10 rounded-lg">
                           <div className="mt-0.5 text-orange-500 dark:text-orange-400"><Icon name="remove_circle" className="text-xl" fill /></div>
                           <span className="text-sm text-slate-700 dark:text-slate-300 font-medium leading-relaxed">{item}</span>
@@ -256,7 +266,7 @@ export const AnalysisResultView = ({ customTitle, customSubtitle, data }) => {
               <Icon name="question_answer" className="text-primary" /> {t('result.interview_questions')}
           </h3>
           <div className="grid grid-cols-1 gap-4">
-              {(data.bilingual_content.interview_questions[language] || data.bilingual_content.interview_questions['en']).map((question, index) => (
+              {localized('interview_questions').map((question, index) => (
                   <div key={index} className="flex gap-4 p-4 rounded-xl border border-border-light dark:border-border-dark bg-white dark:bg-card-dark transition-colors">
                       <span className="flex items-center justify-center size-8 rounded-lg bg-slate-100 dark:bg-slate-800 text-slate-600 dark:text-slate-300 text-sm font-bold shrink-0 shadow-inner">{index + 1}</span>
                       <p className="pt-1 text-slate-700 dark:text-slate-300 font-medium leading-relaxed">{question}</p>
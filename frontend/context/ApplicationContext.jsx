@@ -284,6 +284,8 @@ export const ApplicationProvider = ({ children }) => {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [analysisSuccess, setAnalysisSuccess] = useState(false);
   const [lastAnalysisResult, setLastAnalysisResult] = useState(null);
+  // Kết quả từng phần khi backend đang stream (null khi không có phân tích nào đang chạy)
+  const [partialAnalysisResult, setPartialAnalysisResult] = useState(null);
   const [lastJdSource, setLastJdSource] = useState(null);
 
   const [notifications, setNotifications] = useState([]);
@@ -370,9 +372,33 @@ export const ApplicationProvider = ({ children }) => {
     setNotifications(prev => prev.filter(n => n.id !== id));
   };
 
+  // /api/analyze trả về job_id ngay, kết quả lấy bằng cách poll /api/analyze/{job_id}
+  const waitForAnalysisJob = async (job) => {
+    let current = job;
+    while (current.status !== 'done') {
+      if (current.status === 'error') {
+        throw new Error(current.error || t('notif.generic_error'));
+      }
+      await new Promise(resolve => setTimeout(resolve, 1500));
+      const res = await fetch(`${API_BASE}/api/analyze/${current.job_id}`, {
+        headers: { 'x-session-id': getSessionId() }
+      });
+      if (!res.ok) {
+        const errorData = await res.json().catch(() => ({}));
+        throw new Error(errorData.detail || res.statusText);
+      }
+      current = await res.json();
+      if (current.partial) {
+        setPartialAnalysisResult(current.partial);
+      }
+    }
+    return current.result;
+  };
+
   const runBackgroundAnalysis = async (file, jdText, jdId) => {
     setIsAnalyzing(true);
     setAnalysisSuccess(false);
+    setPartialAnalysisResult(null);
     
     try {
       const formData = new FormData();
@@ -395,9 +421,11 @@ export const ApplicationProvider = ({ children }) => {
         throw new Error(errorData.detail || response.statusText);
       }
 
-      const result = await response.json();
+      const job = await response.json();
+      const result = await waitForAnalysisJob(job);
       
       setLastAnalysisResult(result);
+      setPartialAnalysisResult(null);
       setLastJdSource({
          type: jdId ? 'library' : 'manual',
          id: jdId,
@@ -422,6 +450,7 @@ export const ApplicationProvider = ({ children }) => {
     } catch (error) {
       console.error("Background Analysis Failed:", error);
       setIsAnalyzing(false);
+      setPartialAnalysisResult(null);
       addNotification(t('notif.analysis_failed_title'), error.message || t('notif.generic_error'));
       alert(`${t('notif.analysis_failed_title')}: ${error.message}`);
       throw error;
@@ -536,6 +565,7 @@ export const ApplicationProvider = ({ children }) => {
       isAnalyzing,
       analysisSuccess,
       lastAnalysisResult,
+      partialAnalysisResult,
       lastJdSource,
       runBackgroundAnalysis,
       notifications,
@@ -7,7 +7,7 @@ import { useJdContext } from "../context/JdContext";
 import { AnalysisResultView } from "../components/AnalysisResultView";
 
 export const CompareCandidates = () => {
-  const { lastAnalysisResult, lastJdSource, addApplication, t } = useApplicationContext();
+  const { lastAnalysisResult, partialAnalysisResult, lastJdSource, addApplication, t } = useApplicationContext();
   
   // Lấy danh sách JD và hàm thêm mới
   const { jds, addJd } = useJdContext(); 
@@ -91,6 +91,17 @@ export const CompareCandidates = () => {
       return displayResult.personal_info.name || "Unknown Candidate";
   };
 
+  // Phân tích mới đang stream -> hiển thị dần từng phần (chưa cho lưu tới khi có kết quả đầy đủ)
+  if (partialAnalysisResult) {
+    return (
+        <Layout title={t('sidebar.compare')}>
+          <div className="p-6 md:p-8">
+            <AnalysisResultView data={partialAnalysisResult} />
+          </div>
+        </Layout>
+    );
+  }
+
   if (!displayResult) {
     return (
         <Layout title={t('sidebar.compare')}>